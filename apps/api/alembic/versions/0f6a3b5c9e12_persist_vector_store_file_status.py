@@ -0,0 +1,41 @@
+"""Persist vector store file status on file_metadata
+
+Revision ID: 0f6a3b5c9e12
+Revises: e4b8d0f1a7c3
+Create Date: 2026-02-12 16:05:33.918247
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f6a3b5c9e12'
+down_revision: Union[str, None] = 'e4b8d0f1a7c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('file_metadata', sa.Column('vector_store_file_status', sa.String(), nullable=True))
+    op.add_column('file_metadata', sa.Column('status_checked_at', sa.DateTime(), nullable=True))
+    # Existing attachments have never been checked: let the poller pick them up once.
+    op.execute(
+        "UPDATE file_metadata SET vector_store_file_status = 'in_progress' "
+        "WHERE vector_store_file_id IS NOT NULL"
+    )
+    op.create_index(
+        'ix_file_metadata_pending_status',
+        'file_metadata',
+        ['status_checked_at'],
+        unique=False,
+        postgresql_where=sa.text("vector_store_file_status = 'in_progress'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_metadata_pending_status', table_name='file_metadata')
+    op.drop_column('file_metadata', 'status_checked_at')
+    op.drop_column('file_metadata', 'vector_store_file_status')
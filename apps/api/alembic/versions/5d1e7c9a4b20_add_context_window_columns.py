@@ -0,0 +1,32 @@
+"""Add token counts, rolling summaries and per-project context budget
+
+Revision ID: 5d1e7c9a4b20
+Revises: bc69df8c5c7d
+Create Date: 2026-02-03 11:20:41.512904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1e7c9a4b20'
+down_revision: Union[str, None] = 'bc69df8c5c7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('token_count', sa.Integer(), nullable=True))
+    op.add_column('conversations', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('conversations', sa.Column('summarized_through', sa.DateTime(), nullable=True))
+    op.add_column('projects', sa.Column('context_token_budget', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'context_token_budget')
+    op.drop_column('conversations', 'summarized_through')
+    op.drop_column('conversations', 'summary')
+    op.drop_column('messages', 'token_count')
@@ -0,0 +1,36 @@
+"""Add lookup indexes for chat, conversation, prompt and file queries
+
+Revision ID: 9c3f2a6e8d41
+Revises: 5d1e7c9a4b20
+Create Date: 2026-02-05 09:12:07.334120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f2a6e8d41'
+down_revision: Union[str, None] = '5d1e7c9a4b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (created_at, id) matches the keyset pagination order, so pages are
+    # served straight from the index.
+    op.create_index('ix_messages_conversation_id_created_at', 'messages', ['conversation_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_conversations_project_id_created_at', 'conversations', ['project_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_prompts_project_id', 'prompts', ['project_id'], unique=False)
+    op.create_index('ix_prompts_project_id_active', 'prompts', ['project_id'], unique=False, postgresql_where=sa.text('is_active'))
+    op.create_index('ix_file_metadata_project_id_created_at', 'file_metadata', ['project_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_metadata_project_id_created_at', table_name='file_metadata')
+    op.drop_index('ix_prompts_project_id_active', table_name='prompts')
+    op.drop_index('ix_prompts_project_id', table_name='prompts')
+    op.drop_index('ix_conversations_project_id_created_at', table_name='conversations')
+    op.drop_index('ix_messages_conversation_id_created_at', table_name='messages')
@@ -0,0 +1,26 @@
+"""Add response_cache_enabled to projects
+
+Revision ID: a83d5f0e2b17
+Revises: 7b2e9d4c1f58
+Create Date: 2026-02-20 13:48:19.240561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83d5f0e2b17'
+down_revision: Union[str, None] = '7b2e9d4c1f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('projects', sa.Column('response_cache_enabled', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'response_cache_enabled')
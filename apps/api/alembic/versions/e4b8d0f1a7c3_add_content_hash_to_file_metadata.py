@@ -0,0 +1,31 @@
+"""Add content hash and dedup counter to file_metadata
+
+Revision ID: e4b8d0f1a7c3
+Revises: 9c3f2a6e8d41
+Create Date: 2026-02-09 14:41:52.870316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b8d0f1a7c3'
+down_revision: Union[str, None] = '9c3f2a6e8d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('file_metadata', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.add_column('file_metadata', sa.Column('dedup_hits', sa.Integer(), server_default='0', nullable=False))
+    # Existing rows have no hash (NULL), which Postgres treats as distinct.
+    op.create_index('uq_file_metadata_project_id_sha256', 'file_metadata', ['project_id', 'sha256'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_file_metadata_project_id_sha256', table_name='file_metadata')
+    op.drop_column('file_metadata', 'dedup_hits')
+    op.drop_column('file_metadata', 'sha256')
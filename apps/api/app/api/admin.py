@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.db.database import get_db
+from app.db.models import FileMetadata
+from app.schemas.schemas import (
+    DedupStatsResponse,
+    LLMSchedulerStatsResponse,
+    ProfileSummaryResponse,
+    TraceResponse,
+    TraceSummaryResponse,
+)
+from app.core.auth import require_admin
+from app.core.config import settings
+from app.services import profiler, tracing
+from app.services.llm_scheduler import scheduler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/files/dedup-stats", response_model=DedupStatsResponse)
+async def file_dedup_stats(
+    project_id: Optional[str] = None,
+    admin_id: str = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Uploads answered from an existing file instead of re-uploading, and the bytes that saved."""
+    query = select(
+        func.coalesce(func.sum(FileMetadata.dedup_hits), 0),
+        func.coalesce(func.sum(FileMetadata.dedup_hits * func.coalesce(FileMetadata.size_bytes, 0)), 0),
+    )
+    if project_id:
+        query = query.where(FileMetadata.project_id == project_id)
+    hits, bytes_saved = (await db.execute(query)).one()
+    return DedupStatsResponse(deduplicated_uploads=hits, bytes_saved=bytes_saved)
+
+
+@router.get("/llm-scheduler", response_model=LLMSchedulerStatsResponse)
+async def llm_scheduler_stats(admin_id: str = Depends(require_admin)):
+    """Upstream slots in use, queue depth, and recent queue wait times on this worker."""
+    return LLMSchedulerStatsResponse(**scheduler.stats())
+
+
+@router.get("/debug/traces", response_model=List[TraceSummaryResponse])
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0.0, ge=0),
+    name: Optional[str] = None,
+    admin_id: str = Depends(require_admin),
+):
+    """Most recent sampled traces on this worker, newest first."""
+    return [trace.to_dict(spans=False) for trace in tracing.recent(limit, min_duration_ms, name)]
+
+
+@router.get("/debug/traces/{trace_id}", response_model=TraceResponse)
+async def get_trace(trace_id: str, admin_id: str = Depends(require_admin)):
+    """One trace's span timeline (offsets in ms from the request start)."""
+    trace = tracing.find(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not sampled, or evicted from the buffer)")
+    return trace.to_dict()
+
+
+def _require_profiler() -> None:
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+
+
+def _collapsed_response(session: profiler.ProfileSession) -> PlainTextResponse:
+    return PlainTextResponse(
+        session.collapsed(),
+        headers={profiler.PROFILE_ID_HEADER: session.id, "X-Profile-Samples": str(session.samples)},
+    )
+
+
+@router.post("/debug/profile", response_class=PlainTextResponse)
+async def run_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    all_threads: bool = False,
+    lines: bool = False,
+    admin_id: str = Depends(require_admin),
+):
+    """
+    Sample this worker for `seconds` and return collapsed stacks (feed them to
+    flamegraph.pl or speedscope). Only the worker that serves this request is
+    profiled.
+    """
+    _require_profiler()
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.PROFILER_MAX_SECONDS:g}")
+    try:
+        session = await profiler.profile_for(
+            seconds, interval_ms=interval_ms, all_threads=all_threads, lines=lines
+        )
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _collapsed_response(session)
+
+
+@router.get("/debug/profiles", response_model=List[ProfileSummaryResponse])
+async def list_profiles(admin_id: str = Depends(require_admin)):
+    """Finished profiles kept on this worker, newest first."""
+    _require_profiler()
+    return [session.summary() for session in profiler.recent()]
+
+
+@router.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, admin_id: str = Depends(require_admin)):
+    """Collapsed stacks of a finished profile (e.g. one started with X-Profile: 1)."""
+    _require_profiler()
+    session = profiler.find(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _collapsed_response(session)
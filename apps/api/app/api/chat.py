@@ -1,154 +1,194 @@
 from __future__ import annotations
 
-import json
+import time
+from datetime import datetime
 from typing import AsyncGenerator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.conversation_context import load_conversation_context
 from app.core.auth import get_current_user
 from app.db.database import get_db
-from app.db.models import Conversation, Message, Project, Prompt
 from app.schemas.schemas import ChatRequest
-from app.services.openai_service import stream_chat_completion
+from app.services import metrics, response_cache, retrieval, tracing
+from app.services.chat_generation import (
+    Generation,
+    find_generation,
+    join_or_start_turn,
+    parse_last_event_id,
+    start_generation,
+    turn_key,
+)
+from app.services.context_service import build_context, compose_instructions, schedule_summary_refresh
+from app.services.openai_service import CHAT_MODEL
+from app.services.stream_events import encode_sse
 
 router = APIRouter(prefix="/conversations/{conversation_id}/chat", tags=["chat"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # helps with nginx proxy buffering
+}
 
-def save_messages_after_stream(
-    conversation_id: str,
-    user_message: str,
-    assistant_message: str,
-    db: Session,
-) -> None:
-    """
-    Persist the user + assistant messages after the stream completes.
 
-    Note: This is intentionally a normal (sync) function.
-    Declaring it async but calling it without await means it will never execute.
+def _stream_generation(generation: Generation, request: Request, after_seq: int = -1) -> StreamingResponse:
+    """
+    Relay a generation to one client. Disconnecting only ends this relay;
+    the generation keeps running and is still persisted.
     """
-    db.add(
-        Message(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_message,
-        )
-    )
-
-    db.add(
-        Message(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=assistant_message,
-        )
-    )
 
-    db.commit()
+    async def event_generator() -> AsyncGenerator[str, None]:
+        metrics.sse_connections.inc()
+        started = time.perf_counter()
+        frames = sent = 0
+        try:
+            async for seq, event in generation.subscribe(after_seq):
+                frame = encode_sse(event, generation.event_id(seq))
+                size = len(frame.encode())
+                metrics.sse_bytes.inc(size)
+                frames += 1
+                sent += size
+                yield frame
+                # If the client disconnects, stop relaying (checked once per frame)
+                if await request.is_disconnected():
+                    break
+        finally:
+            metrics.sse_connections.dec()
+            tracing.record("sse.relay", started, time.perf_counter(), frames=frames, bytes=sent)
 
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
 
-@router.post("")
-async def chat_stream(
-    conversation_id: str,
-    chat_request: ChatRequest,
-    request: Request,
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    # 1) Verify conversation exists
-    conversation = (
-        db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    )
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-
-    # 2) Verify ownership via project
-    project = (
-        db.query(Project)
-        .filter(Project.id == conversation.project_id, Project.user_id == user_id)
-        .first()
-    )
-    if not project:
-        raise HTTPException(status_code=404, detail="Not authorized")
-
-    # 3) Get active prompt as system prompt (optional)
-    active_prompt: Optional[Prompt] = (
-        db.query(Prompt)
-        .filter(Prompt.project_id == conversation.project_id, Prompt.is_active == True)  # noqa: E712
-        .first()
-    )
-    system_prompt = active_prompt.content if active_prompt else None
 
-    vector_store_id = project.vector_store_id
+def _resumable_generation(
+    conversation_id: str, user_id: str, last_event_id: Optional[str]
+) -> Optional[tuple[Generation, int]]:
+    parsed = parse_last_event_id(last_event_id)
+    if parsed is None:
+        return None
+    generation = find_generation(parsed[0], conversation_id, user_id)
+    if generation is None:
+        return None
+    return generation, parsed[1]
 
-    # 4) Load conversation history
-    previous_messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-        .all()
-    )
 
-    messages = [{"role": msg.role, "content": msg.content} for msg in previous_messages]
-    messages.append({"role": "user", "content": chat_request.message})
+async def _start_turn(
+    conversation_id: str,
+    chat_request: ChatRequest,
+    user_id: str,
+    db: AsyncSession,
+    key: str,
+) -> Generation:
+    received_at = datetime.utcnow()
+    started = time.perf_counter()
+
+    # 1) Conversation + ownership + active prompt + vector store in one query
+    with tracing.span("chat.load_context"):
+        ctx = await load_conversation_context(conversation_id, user_id, db)
+    conversation = ctx.conversation
+    vector_store_id = ctx.vector_store_id
+
+    # Local retrieval: search the project's own index and hand the excerpts to
+    # the model in the instructions instead of attaching hosted file_search.
+    chunks = []
+    if not retrieval.uses_hosted_file_search():
+        with tracing.span("chat.retrieve"):
+            chunks = await retrieval.retrieve(ctx.project.id, chat_request.message)
+        vector_store_id = None
+
+    # 2) Load the newest turns that fit the token budget next to the
+    # instructions and excerpts (+ rolling summary)
+    with tracing.span("chat.build_context"):
+        context = await build_context(
+            db,
+            conversation,
+            ctx.project,
+            chat_request.message,
+            instructions=retrieval.augment_instructions(ctx.system_prompt, chunks),
+        )
+    messages = context.messages
+    system_prompt = retrieval.augment_instructions(compose_instructions(ctx.system_prompt, context.summary), chunks)
 
     # If this is the first message in the conversation, auto-title it
-    if len(previous_messages) == 0:
+    if context.is_first_turn:
         if not conversation.title or conversation.title.strip().lower() in ("new chat", "untitled"):
             conversation.title = chat_request.message.strip()[:60]
-            db.commit()
-
 
-    # We'll accumulate assistant text so we can save it after streaming finishes
-    full_response = ""
+    # Title and backfilled token counts go out in a single commit
+    if db.dirty:
+        with tracing.span("db.commit"):
+            await db.commit()
+    # Older turns fold into the summary while this one streams.
+    schedule_summary_refresh(context.summary_refresh)
+
+    # Opted-in projects may answer a byte-identical turn from the cache
+    cache_key = None
+    if ctx.project.response_cache_enabled:
+        cache_key = response_cache.make_key(
+            instructions=system_prompt,
+            messages=messages,
+            vector_store_id=vector_store_id,
+            model=CHAT_MODEL,
+        )
 
-    async def event_generator() -> AsyncGenerator[str, None]:
-        nonlocal full_response
+    metrics.chat_prepare_duration.observe(time.perf_counter() - started)
+
+    # 3) Generate server-side; this request is just the first subscriber
+    return start_generation(
+        conversation_id=conversation_id,
+        user_id=user_id,
+        messages=messages,
+        system_prompt=system_prompt,
+        vector_store_id=vector_store_id,
+        user_message=chat_request.message,
+        user_message_at=received_at,
+        project_id=ctx.project.id,
+        cache_key=cache_key,
+        turn_key=key,
+    )
 
-        # Optional: send an initial event so the client knows the stream is open
-        yield f"data: {json.dumps({'type': 'start'})}\n\n"
 
-        try:
-            async for event in stream_chat_completion(
-                messages,
-                system_prompt,
-                vector_store_id=vector_store_id,
-            ):
-                # If the client disconnects, stop work early
-                if await request.is_disconnected():
-                    break
-
-                # Accumulate assistant text from token events
-                # event is SSE formatted like: "data: {...}\n\n"
-                if event.startswith("data: "):
-                    raw = event[6:].strip()
-                    try:
-                        payload = json.loads(raw)
-                        if payload.get("type") == "token":
-                            full_response += payload.get("content", "")
-                    except json.JSONDecodeError:
-                        # Ignore malformed SSE payloads
-                        pass
+@router.post("")
+async def chat_stream(
+    conversation_id: str,
+    chat_request: ChatRequest,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    key = turn_key(conversation_id, user_id, chat_request.message)
+
+    # A retry of this same message carrying Last-Event-ID resumes the existing
+    # answer instead of paying for a second generation. A new message is
+    # always answered, whatever id the client still has.
+    resumable = _resumable_generation(conversation_id, user_id, last_event_id)
+    if resumable and resumable[0].turn_key == key:
+        return _stream_generation(resumable[0], request, resumable[1])
+
+    # An identical turn already in flight (double-click, blind retry) is
+    # joined from its first event rather than generated and saved twice.
+    with tracing.span("chat.prepare"):
+        generation = await join_or_start_turn(
+            key, lambda: _start_turn(conversation_id, chat_request, user_id, db, key)
+        )
+    return _stream_generation(generation, request)
 
-                yield event
 
-        finally:
-            # Save only if we actually have an assistant response
-            # (if disconnected very early, you might not want to save an empty assistant msg)
-            if full_response:
-                save_messages_after_stream(
-                    conversation_id=conversation_id,
-                    user_message=chat_request.message,
-                    assistant_message=full_response,
-                    db=db,
-                )
-
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # helps with nginx proxy buffering
-        },
-    )
+@router.get("/resume")
+async def resume_chat_stream(
+    conversation_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user),
+):
+    """
+    Reattach to an in-progress (or recently finished) answer on this worker,
+    replaying every event after Last-Event-ID from the replay buffer.
+    """
+    resumable = _resumable_generation(conversation_id, user_id, last_event_id)
+    if not resumable:
+        raise HTTPException(status_code=404, detail="No resumable response")
+    return _stream_generation(resumable[0], request, resumable[1])
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Conversation, Project, Prompt
+from app.services.project_cache import (
+    ProjectMeta,
+    conversation_project_cache,
+    project_meta_cache,
+)
+
+
+@dataclass
+class ConversationContext:
+    conversation: Conversation
+    project: ProjectMeta
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        return self.project.system_prompt
+
+    @property
+    def vector_store_id(self) -> Optional[str]:
+        return self.project.vector_store_id
+
+
+async def load_conversation_context(
+    conversation_id: str,
+    user_id: str,
+    db: AsyncSession,
+) -> ConversationContext:
+    """
+    Resolve conversation, owning project, active prompt and vector store in a
+    single round trip, raising the same 404s the endpoints always have.
+
+    When the project's metadata is cached only the conversation row is read;
+    otherwise one joined query fetches everything and refills the cache.
+    """
+    project_id = conversation_project_cache.get(conversation_id)
+    meta = project_meta_cache.get(project_id) if project_id else None
+
+    if meta is not None:
+        conversation = await db.scalar(
+            select(Conversation).where(Conversation.id == conversation_id)
+        )
+        if conversation is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    else:
+        row = (
+            await db.execute(
+                select(Conversation, Project, Prompt.content)
+                .join(Project, Project.id == Conversation.project_id)
+                .outerjoin(
+                    Prompt,
+                    (Prompt.project_id == Conversation.project_id) & (Prompt.is_active == True),  # noqa: E712
+                )
+                .where(Conversation.id == conversation_id)
+                .limit(1)
+            )
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        conversation, project, system_prompt = row
+        meta = ProjectMeta(
+            id=project.id,
+            user_id=project.user_id,
+            vector_store_id=project.vector_store_id,
+            context_token_budget=project.context_token_budget,
+            response_cache_enabled=project.response_cache_enabled,
+            system_prompt=system_prompt,
+        )
+        project_meta_cache.set(project.id, meta)
+        conversation_project_cache.set(conversation_id, project.id)
+
+    if meta.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Not authorized")
+
+    return ConversationContext(conversation=conversation, project=meta)
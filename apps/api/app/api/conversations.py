@@ -1,36 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from app.db.database import get_db
 from app.db.models import Project, Conversation
 from app.schemas.schemas import ConversationCreate, ConversationResponse
 from app.core.auth import get_current_user
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from app.api.prompts import verify_project_ownership
 
 router = APIRouter(prefix="/projects/{project_id}/conversations", tags=["conversations"])
 
 @router.post("", response_model=ConversationResponse, status_code=201)
-def create_conversation(
+async def create_conversation(
     project_id: str,
     conversation: ConversationCreate,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
+    await verify_project_ownership(project_id, user_id, db)
     db_conversation = Conversation(
         project_id=project_id,
         title=conversation.title or "New Conversation"
     )
     db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
     return db_conversation
 
 @router.get("", response_model=List[ConversationResponse])
-def list_conversations(
+async def list_conversations(
     project_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
-    return db.query(Conversation).filter(Conversation.project_id == project_id).all()
\ No newline at end of file
+    """Newest first. Pass the X-Next-Cursor header back as `cursor` for the next page."""
+    await verify_project_ownership(project_id, user_id, db)
+
+    query = select(Conversation).where(Conversation.project_id == project_id)
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(tuple_(Conversation.created_at, Conversation.id) < after)
+
+    result = await db.scalars(
+        query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    )
+    conversations = result.all()
+
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return conversations
@@ -1,65 +1,202 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import IO, Callable, Coroutine, Dict, List, Optional
 
 from app.core.auth import get_current_user
+from app.core.config import settings
 from app.db.database import get_db
-from app.db.models import FileMetadata, Project
-from app.schemas.schemas import FileUploadResponse
+from app.db.models import FileMetadata, IngestionJob, Project, generate_uuid
+from app.schemas.schemas import (
+    BatchUploadItem,
+    BatchUploadResponse,
+    FileUploadResponse,
+    IngestionJobResponse,
+)
+from app.services import ingestion_queue, retrieval
+from app.services.file_service import (
+    discard_openai_file,
+    ensure_vector_store,
+    find_duplicate,
+    record_dedup_hit,
+    record_dedup_hits,
+)
 from app.services.openai_service import (
     add_file_to_vector_store,
-    create_vector_store,
-    get_vector_store_file,
+    create_vector_store_file_batch,
     upload_file_to_openai,
 )
+from app.services.project_cache import invalidate_project
+
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_BYTES
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # 1 MB
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # boundaries and part headers, per file
+
+
+def _body_limit(path: str) -> int:
+    files = settings.FILE_BATCH_MAX_FILES if path.endswith("/batch") else 1
+    return files * (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
+
+
+class BoundedUploadRoute(APIRoute):
+    """
+    Cap the request body before FastAPI parses the multipart form.
+
+    Starlette spools the whole form to disk before the endpoint runs, so a
+    size check in the endpoint only fires after the bytes have been read. A
+    declared Content-Length over the limit is refused straight away; a
+    chunked body is counted as it arrives and cut off once it passes it.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine]:
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def bounded_handler(request: Request) -> Response:
+            limit = _body_limit(path)
+            too_large = HTTPException(
+                status_code=413,
+                detail=f"Upload too large (max {MAX_UPLOAD_BYTES} bytes per file)",
+            )
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise too_large
+
+            receive = request.receive
+            received = 0
 
-router = APIRouter(prefix="/projects/{project_id}/files", tags=["files"])
+            async def bounded_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise too_large
+                return message
 
-# Simple guardrail for MVP. (OpenAI allows much larger; tune as you prefer.)
-MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # 25 MB
+            return await handler(Request(request.scope, bounded_receive))
 
+        return bounded_handler
 
-def _verify_project_ownership(project_id: str, user_id: str, db: Session) -> Project:
-    project = (
-        db.query(Project)
-        .filter(Project.id == project_id, Project.user_id == user_id)
-        .first()
+
+router = APIRouter(prefix="/projects/{project_id}/files", tags=["files"], route_class=BoundedUploadRoute)
+
+
+async def _verify_project_ownership(project_id: str, user_id: str, db: AsyncSession) -> Project:
+    project = await db.scalar(
+        select(Project).where(Project.id == project_id, Project.user_id == user_id)
     )
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
 
+@dataclass
+class SpooledUpload:
+    size: int
+    sha256: str
+
+
+async def _spool_upload(file: UploadFile, sink: Optional[IO[bytes]] = None) -> SpooledUpload:
+    """
+    Walk the upload in fixed-size chunks, enforcing MAX_UPLOAD_BYTES and
+    hashing as we go, then rewind it for the provider upload. Chunks are also
+    copied to `sink` when given.
+
+    By now Starlette has spooled the whole part to a SpooledTemporaryFile
+    (rolled to disk past 1 MB), so this reads it back one chunk at a time.
+    BoundedUploadRoute has already capped the request body; the check here
+    is the exact per-file limit.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large (max {MAX_UPLOAD_BYTES} bytes)",
+            )
+        hasher.update(chunk)
+        if sink is not None:
+            await run_in_threadpool(sink.write, chunk)
+
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    await file.seek(0)
+    return SpooledUpload(size=size, sha256=hasher.hexdigest())
+
+
+def _copy_to_temp(source: IO[bytes]) -> str:
+    source.seek(0)
+    fd, path = tempfile.mkstemp(prefix="index-")
+    with os.fdopen(fd, "wb") as sink:
+        shutil.copyfileobj(source, sink, UPLOAD_CHUNK_BYTES)
+    return path
+
+
+async def _feed_local_index(project_id: str, file_metadata: FileMetadata, file: UploadFile) -> None:
+    """Hand a stored upload to the local retrieval index, when that backend is on."""
+    if retrieval.uses_hosted_file_search() or not retrieval.is_indexable(file.filename, file.content_type):
+        return
+    # The upload is closed when the request ends; the indexing task reads a
+    # copy, made chunk by chunk off the event loop, and deletes it when done.
+    path = await asyncio.to_thread(_copy_to_temp, file.file)
+    retrieval.schedule_index_file(
+        project_id, file_metadata.id, file_metadata.filename, file_metadata.mime_type, path, remove_after=True
+    )
+
+
+async def _record_dedup_hit(file_metadata: FileMetadata, response: Response, db: AsyncSession) -> FileUploadResponse:
+    await record_dedup_hit(db, file_metadata)
+    response.status_code = status.HTTP_200_OK
+    return FileUploadResponse.model_validate(file_metadata)
+
+
 @router.post("", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(
     project_id: str,
+    response: Response,
     file: UploadFile = File(...),
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    project = _verify_project_ownership(project_id, user_id, db)
+    """
+    Upload a file and attach it to the project's vector store, or to the
+    local retrieval index when that backend is on.
+
+    Identical content already uploaded to this project is not sent again: the
+    existing record is returned with 200 instead of 201.
+    """
+    project = await _verify_project_ownership(project_id, user_id, db)
 
-    if not project.vector_store_id:
+    # Validate size before creating anything upstream.
+    upload = await _spool_upload(file)
+
+    existing = await find_duplicate(db, project_id, upload.sha256)
+    if existing:
+        return await _record_dedup_hit(existing, response, db)
+
+    vector_store_id = None
+    if retrieval.uses_hosted_file_search():
         try:
-            vector_store = await create_vector_store(name=project.name)
+            vector_store_id = await ensure_vector_store(project)
         except Exception as e:
             raise HTTPException(status_code=502, detail=str(e))
-        project.vector_store_id = vector_store.id
-        db.commit()
-        db.refresh(project)
-
-    # Read content (MVP approach).
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
-
-    if len(content) > MAX_UPLOAD_BYTES:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large (max {MAX_UPLOAD_BYTES} bytes)",
-        )
 
     # Upload to OpenAI Files API
     purpose = "user_data"
@@ -67,7 +204,7 @@ async def upload_file(
     try:
         openai_file = await upload_file_to_openai(
             filename=file.filename or "upload",
-            content=content,
+            file=file.file,
             content_type=file.content_type,
             purpose=purpose,
         )
@@ -75,10 +212,10 @@ async def upload_file(
         raise HTTPException(status_code=502, detail=str(e))
 
     vector_store_file = None
-    if project.vector_store_id:
+    if vector_store_id:
         try:
             vector_store_file = await add_file_to_vector_store(
-                vector_store_id=project.vector_store_id,
+                vector_store_id=vector_store_id,
                 file_id=openai_file.id,
             )
         except Exception as e:
@@ -93,66 +230,267 @@ async def upload_file(
         purpose=purpose,
         openai_file_id=openai_file.id,
         vector_store_file_id=getattr(vector_store_file, "id", None),
-        size_bytes=getattr(openai_file, "bytes", len(content)),
+        vector_store_file_status=getattr(vector_store_file, "status", None),
+        size_bytes=getattr(openai_file, "bytes", upload.size),
+        sha256=upload.sha256,
     )
 
     db.add(file_metadata)
-    db.commit()
-    db.refresh(file_metadata)
-
-    return FileUploadResponse(
-        id=file_metadata.id,
-        filename=file_metadata.filename,
-        openai_file_id=file_metadata.openai_file_id,
-        vector_store_file_id=file_metadata.vector_store_file_id,
-        vector_store_file_status=getattr(vector_store_file, "status", None),
-        size_bytes=file_metadata.size_bytes,
-        mime_type=file_metadata.mime_type,
-        purpose=file_metadata.purpose,
-        created_at=file_metadata.created_at,
-    )
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same content won the insert; this
+        # request's copy would only add duplicate search results.
+        await db.rollback()
+        existing = await find_duplicate(db, project_id, upload.sha256)
+        if not existing:
+            raise
+        await discard_openai_file(openai_file.id, vector_store_id)
+        return await _record_dedup_hit(existing, response, db)
+    await db.refresh(file_metadata)
+    # New knowledge can change answers: drop cached responses for the project.
+    await invalidate_project(project_id)
+    await _feed_local_index(project_id, file_metadata, file)
+
+    return FileUploadResponse.model_validate(file_metadata)
+
+
+@router.post("/batch", response_model=BatchUploadResponse)
+async def upload_files_batch(
+    project_id: str,
+    files: List[UploadFile] = File(...),
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload many files in one request.
+
+    Files are uploaded concurrently (FILE_BATCH_UPLOAD_CONCURRENCY), attached
+    with a single vector-store file batch (hosted file search only) and
+    recorded with one bulk insert.
+    Each file gets its own result; one bad file doesn't fail the batch.
+    """
+    if len(files) > settings.FILE_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files (max {settings.FILE_BATCH_MAX_FILES} per batch)",
+        )
+
+    project = await _verify_project_ownership(project_id, user_id, db)
+    purpose = "user_data"
+
+    results: List[BatchUploadItem] = [
+        BatchUploadItem(filename=f.filename or "upload", status="failed") for f in files
+    ]
+    pending: Dict[int, SpooledUpload] = {}
+    seen_hashes: Dict[str, int] = {}
+    for index, file in enumerate(files):
+        try:
+            upload = await _spool_upload(file)
+        except HTTPException as e:
+            results[index].error = e.detail
+            continue
+        if upload.sha256 in seen_hashes:
+            results[index].status = "duplicate"
+            results[index].error = f"Same content as {results[seen_hashes[upload.sha256]].filename}"
+            continue
+        seen_hashes[upload.sha256] = index
+        pending[index] = upload
+
+    # One query for every hash already stored in this project.
+    if pending:
+        existing_rows = (
+            await db.scalars(
+                select(FileMetadata).where(
+                    FileMetadata.project_id == project_id,
+                    FileMetadata.sha256.in_([u.sha256 for u in pending.values()]),
+                )
+            )
+        ).all()
+        existing = {row.sha256: row for row in existing_rows}
+        hits = []
+        for index in list(pending):
+            row = existing.get(pending[index].sha256)
+            if row is not None:
+                hits.append(row)
+                results[index].status = "duplicate"
+                results[index].file = FileUploadResponse.model_validate(row)
+                del pending[index]
+        await record_dedup_hits(db, hits)
+
+    if not pending:
+        return BatchUploadResponse(results=results)
+
+    vector_store_id = None
+    if retrieval.uses_hosted_file_search():
+        try:
+            vector_store_id = await ensure_vector_store(project)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+    semaphore = asyncio.Semaphore(settings.FILE_BATCH_UPLOAD_CONCURRENCY)
+
+    async def upload_one(index: int):
+        file = files[index]
+        async with semaphore:
+            return await upload_file_to_openai(
+                filename=file.filename or "upload",
+                file=file.file,
+                content_type=file.content_type,
+                purpose=purpose,
+            )
+
+    indexes = list(pending)
+    outcomes = await asyncio.gather(*(upload_one(i) for i in indexes), return_exceptions=True)
+    uploaded = {}
+    for index, outcome in zip(indexes, outcomes):
+        if isinstance(outcome, Exception):
+            results[index].error = str(outcome)
+        else:
+            uploaded[index] = outcome
+
+    if not uploaded:
+        return BatchUploadResponse(results=results)
+
+    batch = None
+    if vector_store_id:
+        try:
+            batch = await create_vector_store_file_batch(
+                vector_store_id=vector_store_id,
+                file_ids=[f.id for f in uploaded.values()],
+            )
+        except Exception as e:
+            for index in uploaded:
+                results[index].error = f"Vector store attach failed: {e}"
+            return BatchUploadResponse(results=results)
+
+    # Vector store file ids are the file ids; per-file status starts with the
+    # batch's and is then kept current by the ingestion poller.
+    batch_status = getattr(batch, "status", None)
+    rows = [
+        {
+            "project_id": project_id,
+            "user_id": user_id,
+            "filename": files[index].filename or "upload",
+            "mime_type": files[index].content_type,
+            "purpose": purpose,
+            "openai_file_id": openai_file.id,
+            "vector_store_file_id": openai_file.id if batch is not None else None,
+            "vector_store_file_status": batch_status,
+            "size_bytes": getattr(openai_file, "bytes", pending[index].size),
+            "sha256": pending[index].sha256,
+        }
+        for index, openai_file in uploaded.items()
+    ]
+    # Content that a concurrent request stored first is skipped, not an error.
+    inserted = (
+        await db.scalars(
+            pg_insert(FileMetadata)
+            .on_conflict_do_nothing(index_elements=["project_id", "sha256"])
+            .returning(FileMetadata),
+            rows,
+        )
+    ).all()
+    await db.commit()
+    if inserted:
+        await invalidate_project(project_id)
+
+    by_hash = {row.sha256: row for row in inserted}
+    losers = []
+    for index, openai_file in uploaded.items():
+        row = by_hash.get(pending[index].sha256)
+        if row is None:
+            results[index].status = "duplicate"
+            results[index].error = "Stored by a concurrent upload"
+            losers.append(openai_file.id)
+        else:
+            results[index].status = "created"
+            results[index].file = FileUploadResponse.model_validate(row)
+            await _feed_local_index(project_id, row, files[index])
+    # Our copies of content stored concurrently were attached by the batch above.
+    await asyncio.gather(*(discard_openai_file(file_id, vector_store_id) for file_id in losers))
+
+    return BatchUploadResponse(results=results)
 
 
 @router.get("", response_model=List[FileUploadResponse])
 async def list_files(
     project_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    project = _verify_project_ownership(project_id, user_id, db)
+    """
+    Answered from the database alone; ingestion status is kept current by
+    the background poller in app.services.ingestion_poller.
+    """
+    await _verify_project_ownership(project_id, user_id, db)
 
     files = (
-        db.query(FileMetadata)
-        .filter(FileMetadata.project_id == project_id)
-        .order_by(FileMetadata.created_at.desc())
-        .all()
+        await db.scalars(
+            select(FileMetadata)
+            .where(FileMetadata.project_id == project_id)
+            .order_by(FileMetadata.created_at.desc())
+        )
+    ).all()
+    return files
+
+
+@router.post("/jobs", response_model=IngestionJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_file_upload(
+    project_id: str,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Store the upload and return immediately; the Files API upload and vector
+    store indexing run on the ingestion workers. Poll the returned job.
+    """
+    await _verify_project_ownership(project_id, user_id, db)
+
+    job_id = generate_uuid()
+    path = await asyncio.to_thread(ingestion_queue.storage_path, job_id)
+    try:
+        sink = await asyncio.to_thread(open, path, "wb")
+        try:
+            upload = await _spool_upload(file, sink)
+        finally:
+            await asyncio.to_thread(sink.close)
+    except BaseException:
+        await asyncio.to_thread(ingestion_queue.discard_stored_file, job_id)
+        raise
+
+    job = IngestionJob(
+        id=job_id,
+        project_id=project_id,
+        user_id=user_id,
+        filename=file.filename or "upload",
+        mime_type=file.content_type,
+        size_bytes=upload.size,
+        sha256=upload.sha256,
     )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
 
-    responses: List[FileUploadResponse] = []
-    for file_metadata in files:
-        status = None
-        if project.vector_store_id and file_metadata.vector_store_file_id:
-            try:
-                vector_store_file = await get_vector_store_file(
-                    vector_store_id=project.vector_store_id,
-                    file_id=file_metadata.vector_store_file_id,
-                )
-                status = getattr(vector_store_file, "status", None)
-            except Exception:
-                status = None
-
-        responses.append(
-            FileUploadResponse(
-                id=file_metadata.id,
-                filename=file_metadata.filename,
-                openai_file_id=file_metadata.openai_file_id,
-                vector_store_file_id=file_metadata.vector_store_file_id,
-                vector_store_file_status=status,
-                size_bytes=file_metadata.size_bytes,
-                mime_type=file_metadata.mime_type,
-                purpose=file_metadata.purpose,
-                created_at=file_metadata.created_at,
-            )
-        )
+    ingestion_queue.notify()
+    return job
 
-    return responses
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_file_upload_job(
+    project_id: str,
+    job_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    await _verify_project_ownership(project_id, user_id, db)
+    job = await db.scalar(
+        select(IngestionJob).where(
+            IngestionJob.id == job_id,
+            IngestionJob.project_id == project_id,
+        )
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,31 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from app.db.database import get_db
-from app.db.models import Conversation, Message, Project
+from app.db.models import Message
 from app.schemas.schemas import MessageResponse
 from app.core.auth import get_current_user
+from app.api.conversation_context import load_conversation_context
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/conversations/{conversation_id}/messages", tags=["messages"])
 
 @router.get("", response_model=List[MessageResponse])
-def list_messages(
+async def list_messages(
     conversation_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # Verify ownership via conversation -> project
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    project = db.query(Project).filter(
-        Project.id == conversation.project_id,
-        Project.user_id == user_id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Not authorized")
-    
-    return db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at).all()
\ No newline at end of file
+    """
+    Most recent `limit` messages, returned oldest first. X-Next-Cursor (when
+    present) fetches the page of older messages before this one.
+    """
+    # Verify ownership via conversation -> project (one joined query)
+    await load_conversation_context(conversation_id, user_id, db)
+
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    before = decode_cursor(cursor)
+    if before:
+        query = query.where(tuple_(Message.created_at, Message.id) < before)
+
+    result = await db.scalars(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    )
+    messages = result.all()
+
+    if len(messages) > limit:
+        messages = messages[:limit]
+        oldest = messages[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(oldest.created_at, oldest.id)
+    return list(reversed(messages))
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.db.database import get_db
 from app.db.models import Project
 from app.schemas.schemas import ProjectCreate, ProjectUpdate, ProjectResponse
 from app.core.auth import get_current_user
+from app.api.prompts import verify_project_ownership
+from app.services import retrieval
 from app.services.openai_service import create_vector_store
+from app.services.project_cache import invalidate_project
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -13,7 +17,7 @@ router = APIRouter(prefix="/projects", tags=["projects"])
 async def create_project(
     project: ProjectCreate,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
         vector_store = await create_vector_store(name=project.name)
@@ -26,63 +30,55 @@ async def create_project(
         vector_store_id=vector_store.id,
     )
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
     return db_project
 
 @router.get("", response_model=List[ProjectResponse])
-def list_projects(
+async def list_projects(
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    return db.query(Project).filter(Project.user_id == user_id).all()
+    result = await db.scalars(select(Project).where(Project.user_id == user_id))
+    return result.all()
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-def get_project(
+async def get_project(
     project_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == user_id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    return await verify_project_ownership(project_id, user_id, db)
 
 @router.put("/{project_id}", response_model=ProjectResponse)
-def update_project(
+async def update_project(
     project_id: str,
     project_update: ProjectUpdate,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == user_id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    project = await verify_project_ownership(project_id, user_id, db)
     
     project.name = project_update.name
-    db.commit()
-    db.refresh(project)
+    if project_update.context_token_budget is not None:
+        project.context_token_budget = project_update.context_token_budget
+    if project_update.response_cache_enabled is not None:
+        project.response_cache_enabled = project_update.response_cache_enabled
+    await db.commit()
+    await invalidate_project(project_id)
+    await db.refresh(project)
     return project
 
 @router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_project(
+async def delete_project(
     project_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == user_id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    project = await verify_project_ownership(project_id, user_id, db)
     
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
+    await invalidate_project(project_id)
+    await retrieval.drop_project(project_id)
     return None
@@ -1,110 +1,117 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.db.database import get_db
 from app.db.models import Project, Prompt
 from app.schemas.schemas import PromptCreate, PromptUpdate, PromptResponse
 from app.core.auth import get_current_user
+from app.services.project_cache import invalidate_project
 
 router = APIRouter(prefix="/projects/{project_id}/prompts", tags=["prompts"])
 
-def verify_project_ownership(project_id: str, user_id: str, db: Session) -> Project:
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == user_id
-    ).first()
+async def verify_project_ownership(project_id: str, user_id: str, db: AsyncSession) -> Project:
+    project = await db.scalar(
+        select(Project).where(
+            Project.id == project_id,
+            Project.user_id == user_id
+        )
+    )
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
+async def _get_prompt(project_id: str, prompt_id: str, db: AsyncSession) -> Prompt:
+    prompt = await db.scalar(
+        select(Prompt).where(
+            Prompt.id == prompt_id,
+            Prompt.project_id == project_id
+        )
+    )
+    if not prompt:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    return prompt
+
 @router.post("", response_model=PromptResponse, status_code=status.HTTP_201_CREATED)
-def create_prompt(
+async def create_prompt(
     project_id: str,
     prompt: PromptCreate,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
+    await verify_project_ownership(project_id, user_id, db)
     db_prompt = Prompt(project_id=project_id, name=prompt.name, content=prompt.content)
     db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
+    await db.commit()
+    await invalidate_project(project_id)
+    await db.refresh(db_prompt)
     return db_prompt
 
 @router.get("", response_model=List[PromptResponse])
-def list_prompts(
+async def list_prompts(
     project_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
-    return db.query(Prompt).filter(Prompt.project_id == project_id).all()
+    await verify_project_ownership(project_id, user_id, db)
+    result = await db.scalars(select(Prompt).where(Prompt.project_id == project_id))
+    return result.all()
 
 @router.put("/{prompt_id}", response_model=PromptResponse)
-def update_prompt(
+async def update_prompt(
     project_id: str,
     prompt_id: str,
     prompt_update: PromptUpdate,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.project_id == project_id
-    ).first()
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    await verify_project_ownership(project_id, user_id, db)
+    prompt = await _get_prompt(project_id, prompt_id, db)
     
     if prompt_update.name is not None:
         prompt.name = prompt_update.name
     if prompt_update.content is not None:
         prompt.content = prompt_update.content
     
-    db.commit()
-    db.refresh(prompt)
+    await db.commit()
+    await invalidate_project(project_id)
+    await db.refresh(prompt)
     return prompt
 
 @router.post("/{prompt_id}/activate", response_model=PromptResponse)
-def activate_prompt(
+async def activate_prompt(
     project_id: str,
     prompt_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
+    await verify_project_ownership(project_id, user_id, db)
     
     # Deactivate all prompts in project
-    db.query(Prompt).filter(Prompt.project_id == project_id).update({"is_active": False})
+    await db.execute(
+        update(Prompt).where(Prompt.project_id == project_id).values(is_active=False)
+    )
     
     # Activate target prompt
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.project_id == project_id
-    ).first()
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    prompt = await _get_prompt(project_id, prompt_id, db)
     
     prompt.is_active = True
-    db.commit()
-    db.refresh(prompt)
+    await db.commit()
+    await invalidate_project(project_id)
+    await db.refresh(prompt)
     return prompt
 
 @router.delete("/{prompt_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_prompt(
+async def delete_prompt(
     project_id: str,
     prompt_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    verify_project_ownership(project_id, user_id, db)
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.project_id == project_id
-    ).first()
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    await verify_project_ownership(project_id, user_id, db)
+    prompt = await _get_prompt(project_id, prompt_id, db)
     
-    db.delete(prompt)
-    db.commit()
-    return None
\ No newline at end of file
+    await db.delete(prompt)
+    await db.commit()
+    await invalidate_project(project_id)
+    return None
@@ -1,21 +1,92 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
 from app.core.config import settings
+from app.services import metrics, tracing
 
 security = HTTPBearer()
 
+
+@lru_cache(maxsize=1)
+def get_verification_key() -> Key:
+    """Parse the Clerk PEM once; called at startup from the app lifespan."""
+    return jwk.construct(settings.CLERK_PEM_PUBLIC_KEY, algorithm="RS256")
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already-verified tokens: sha256(token) -> (user_id, exp).
+
+    Entries are only trusted until the token's own `exp`, so a cache hit never
+    extends a token's lifetime. Raw tokens are never stored.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # get_current_user is sync, so FastAPI calls it from the threadpool.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[str]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user_id, exp = entry
+                if exp > time.time():
+                    self._entries.move_to_end(key)
+                    metrics.jwt_cache_lookups.labels("hit").inc()
+                    return user_id
+                del self._entries[key]
+        metrics.jwt_cache_lookups.labels("miss").inc()
+        return None
+
+    def put(self, token: str, user_id: str, exp: float) -> None:
+        if self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (user_id, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+token_cache = VerifiedTokenCache(maxsize=settings.JWT_CACHE_SIZE)
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """
     Verify Clerk JWT and return user_id (sub claim).
     """
-    token = credentials.credentials
-    
+    with tracing.span("auth.get_current_user"):
+        return verify_token(credentials.credentials)
+
+
+def verify_token(token: str) -> str:
+    """Return the token's user_id, or raise 401. Sync: may do an RSA verify."""
+    cached_user_id = token_cache.get(token)
+    tracing.set_attribute("auth.cache_hit", cached_user_id is not None)
+    if cached_user_id is not None:
+        return cached_user_id
+
     try:
         # Clerk uses RS256, public key from PEM
         payload = jwt.decode(
             token,
-            settings.CLERK_PEM_PUBLIC_KEY,
+            get_verification_key(),
             algorithms=["RS256"],
             options={"verify_aud": False}  # Clerk doesn't use aud claim
         )
@@ -25,9 +96,28 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token: missing sub claim"
             )
+        # Tokens without exp are verified every time rather than cached forever.
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            token_cache.put(token, user_id, float(exp))
         return user_id
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid token: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+def _admin_user_ids() -> frozenset:
+    return frozenset(uid.strip() for uid in settings.ADMIN_USER_IDS.split(",") if uid.strip())
+
+
+def is_admin(user_id: str) -> bool:
+    return user_id in _admin_user_ids()
+
+
+def require_admin(user_id: str = Depends(get_current_user)) -> str:
+    """Allow only Clerk users listed in ADMIN_USER_IDS."""
+    if not is_admin(user_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return user_id
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,8 +7,145 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     CLERK_PEM_PUBLIC_KEY: str
     ALLOWED_ORIGINS: str = "http://localhost:3000"
+    ADMIN_USER_IDS: str = ""  # comma-separated Clerk user IDs allowed on /api/admin
+
+    # Verified-JWT cache (entries expire at each token's exp)
+    JWT_CACHE_SIZE: int = 10000
+
+    # Project metadata cache (active prompt, vector store). Set the channel to
+    # broadcast invalidations to other workers via Postgres LISTEN/NOTIFY.
+    PROJECT_CACHE_TTL: float = 60.0
+    PROJECT_CACHE_SIZE: int = 5000
+    PROJECT_CACHE_NOTIFY_CHANNEL: Optional[str] = None
+
+    # Database connection pool (per worker)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_QUERY_COUNT_HEADER: bool = False  # add X-DB-Queries to responses (benchmarks/debugging)
+
+    # Shared OpenAI client (per worker)
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. the benchmark's fake provider
+    OPENAI_HTTP2: bool = False
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 60.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_CONNECT_TIMEOUT: float = 5.0
+    OPENAI_DEFAULT_TIMEOUT: float = 30.0
+    OPENAI_STATUS_TIMEOUT: float = 10.0
+    OPENAI_UPLOAD_TIMEOUT: float = 300.0
+    OPENAI_STREAM_READ_TIMEOUT: float = 120.0
+
+    # Chat SSE token coalescing: flush after N ms or M chars. 0 ms and 1 char
+    # sends one frame per model delta.
+    CHAT_STREAM_FLUSH_MS: float = 50.0
+    CHAT_STREAM_FLUSH_CHARS: int = 64
+
+    # Detached generation: replay buffer per response (in frames) and how
+    # long a finished response stays resumable via Last-Event-ID.
+    CHAT_REPLAY_BUFFER_EVENTS: int = 2000
+    CHAT_REPLAY_RETENTION_SECONDS: float = 120.0
+    CHAT_GENERATION_SHUTDOWN_TIMEOUT: float = 30.0
+
+    # Upstream LLM admission: fair queuing across users, with caps and rate limits
+    LLM_MAX_CONCURRENCY: int = 64
+    LLM_USER_MAX_CONCURRENCY: int = 4
+    LLM_PROJECT_MAX_CONCURRENCY: int = 16
+    LLM_USER_RATE_PER_MINUTE: float = 30.0  # 0 disables the token bucket
+    LLM_USER_BURST: int = 10
+    LLM_USER_MAX_QUEUED: int = 20
+    LLM_QUEUE_TIMEOUT: float = 60.0
+    LLM_TENANT_WEIGHTS: str = ""  # comma-separated user_id=weight, default weight 1
+
+    # Load shedding: refuse new chat/upload work with 503 past these thresholds (0 disables one)
+    LOAD_SHED_ENABLED: bool = True
+    LOAD_SHED_LOOP_LAG_MS: float = 250.0
+    LOAD_SHED_LAG_SAMPLE_INTERVAL: float = 0.1
+    LOAD_SHED_MAX_STREAMS: int = 500
+    LOAD_SHED_UPSTREAM_ERROR_RATE: float = 0.5
+    LOAD_SHED_UPSTREAM_LATENCY_MS: float = 15000.0
+    LOAD_SHED_UPSTREAM_MIN_SAMPLES: int = 20
+    LOAD_SHED_WINDOW_SECONDS: float = 30.0
+    LOAD_SHED_RAMP: float = 1.0  # shed probability reaches 100% at (1 + ramp) x threshold
+    LOAD_SHED_RETRY_AFTER: int = 5
+
+    # Retrieval: "openai" uses the hosted file_search tool; "local" searches a
+    # per-project NumPy index and injects the top chunks into the instructions
+    RETRIEVAL_BACKEND: Literal["openai", "local"] = "openai"
+    RETRIEVAL_EMBEDDER: Literal["hash", "openai"] = "hash"
+    RETRIEVAL_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    RETRIEVAL_EMBEDDING_DIM: int = 512
+    RETRIEVAL_INDEX_DIR: str = "/tmp/chatbot-vectors"
+    RETRIEVAL_CHUNK_CHARS: int = 1500
+    RETRIEVAL_CHUNK_OVERLAP: int = 200
+    RETRIEVAL_TOP_K: int = 5
+    RETRIEVAL_MIN_SCORE: float = 0.1
+    RETRIEVAL_IVF_MIN_VECTORS: int = 50_000  # switch a project to IVF + int8 past this size (0 = never)
+    RETRIEVAL_IVF_NPROBE: int = 8
+    RETRIEVAL_OPEN_INDEXES: int = 256
+    RETRIEVAL_SHUTDOWN_TIMEOUT: float = 30.0
+
+    # Prometheus /metrics. With a token set, scrapers must send it as a bearer token.
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None
+
+    # Request tracing: a sampled request's spans go to an in-memory ring buffer
+    # (/api/admin/debug/traces) and, with an endpoint set, to an OTLP/HTTP collector
+    TRACE_SAMPLE_RATE: float = 0.01  # 0 disables head sampling
+    TRACE_RESPECT_PARENT: bool = True  # always trace requests whose traceparent is sampled
+    TRACE_BUFFER_SIZE: int = 200
+    TRACE_MAX_SPANS: int = 500  # per trace; extra spans are counted, not kept
+    TRACE_OTLP_ENDPOINT: Optional[str] = None  # e.g. http://otel-collector:4318/v1/traces
+    TRACE_OTLP_HEADERS: str = ""  # comma-separated key=value
+    TRACE_EXPORT_INTERVAL: float = 5.0
+    TRACE_SERVICE_NAME: str = "chatbot-api"
+
+    # On-demand sampling profiler (admins only): POST /api/admin/debug/profile, or
+    # send "X-Profile: 1" with an admin token to profile that one request
+    PROFILER_ENABLED: bool = True
+    PROFILER_INTERVAL_MS: float = 5.0
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_KEEP: int = 20  # finished profiles kept for download
+
+    # Response cache for repeated identical turns (opt-in per project)
+    RESPONSE_CACHE_SIZE: int = 2000
+    RESPONSE_CACHE_TTL: float = 3600.0
+
+    # Write-behind persistence of chat messages. MESSAGE_WRITE_MODE is "ack"
+    # (wait for commit) or "fire_and_forget" (return once queued).
+    MESSAGE_WRITE_MODE: Literal["ack", "fire_and_forget"] = "ack"
+    MESSAGE_WRITE_QUEUE_SIZE: int = 1000
+    MESSAGE_WRITE_BATCH_SIZE: int = 100
+    MESSAGE_WRITE_FLUSH_MS: float = 20.0
+    MESSAGE_WRITE_SHUTDOWN_TIMEOUT: float = 10.0
+
+    # File uploads
+    MAX_UPLOAD_BYTES: int = 25 * 1024 * 1024
+    FILE_BATCH_MAX_FILES: int = 50
+    FILE_BATCH_UPLOAD_CONCURRENCY: int = 4
+
+    # Vector-store ingestion status poller
+    INGESTION_POLL_INTERVAL: float = 5.0
+    INGESTION_POLL_BATCH_SIZE: int = 100
+    INGESTION_POLL_CONCURRENCY: int = 8
+
+    # Background file ingestion jobs (POST /projects/{id}/files/jobs).
+    # The storage dir must be shared by all workers that run ingestion.
+    INGESTION_WORKERS: int = 4
+    INGESTION_STORAGE_DIR: str = "/tmp/chatbot-ingestion"
+    INGESTION_JOB_LEASE_SECONDS: int = 900
+    INGESTION_JOB_MAX_ATTEMPTS: int = 3
+    INGESTION_QUEUE_POLL_INTERVAL: float = 5.0
+
+    # Chat context window (tokens). Projects can override the budget.
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 8000
+    CHAT_CONTEXT_KEEP_RATIO: float = 0.6
+    CHAT_SUMMARY_MAX_TOKENS: int = 500
+    CHAT_SUMMARY_SHUTDOWN_TIMEOUT: float = 10.0
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,19 +1,111 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.services import metrics, tracing
+
+
+def _async_database_url(url: str) -> str:
+    # DATABASE_URL is shared with Alembic (sync psycopg2), so swap in the
+    # asyncpg driver here rather than asking for a second setting.
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+asyncpg://" + url[len("postgresql://"):]
+    elif url.startswith("postgresql+psycopg2://"):
+        url = "postgresql+asyncpg://" + url[len("postgresql+psycopg2://"):]
+    parsed = make_url(url)
+    if parsed.drivername == "postgresql+asyncpg" and "sslmode" in parsed.query:
+        # libpq's sslmode isn't an asyncpg argument; asyncpg takes the same
+        # mode names (disable/prefer/require/verify-full...) as `ssl`.
+        query = dict(parsed.query)
+        query.setdefault("ssl", query.pop("sslmode"))
+        url = parsed.set(query=query).render_as_string(hide_password=False)
+    return url
+
+
+class _TimedPool(AsyncAdaptedQueuePool):
+    # Checkout wait: time blocked on a full pool, plus connecting when the
+    # pool grows. Climbing values mean DB_POOL_SIZE/DB_MAX_OVERFLOW are too low.
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            with tracing.span("db.pool_checkout"):
+                return super()._do_get()
+        finally:
+            metrics.db_pool_checkout_wait.observe(time.perf_counter() - started)
+
 
-engine = create_engine(
-    settings.DATABASE_URL,
+engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    poolclass=_TimedPool,
     pool_pre_ping=True,
-    poolclass=NullPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
+@event.listens_for(engine.sync_engine, "connect")
+def _pool_connect(dbapi_connection, connection_record):
+    metrics.db_pool_size.inc()
+
+
+@event.listens_for(engine.sync_engine, "close")
+def _pool_close(dbapi_connection, connection_record):
+    metrics.db_pool_size.dec()
+
+
+@event.listens_for(engine.sync_engine, "close_detached")
+def _pool_close_detached(dbapi_connection):
+    metrics.db_pool_size.dec()
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.db_pool_checked_out.inc()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    metrics.db_pool_checked_out.dec()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    kind = metrics.query_kind(statement)
+    metrics.db_queries.labels(kind).inc()
+    if context is not None:
+        context._trace_span = tracing.start("db.query", **{"db.operation": kind})
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    tracing.end(getattr(context, "_trace_span", None))
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(exception_context):
+    context = exception_context.execution_context
+    tracing.end(
+        getattr(context, "_trace_span", None),
+        error=type(exception_context.original_exception).__name__,
+    )
+
+
+# expire_on_commit=False: attributes stay loaded after commit, so handlers can
+# keep returning ORM objects without triggering an implicit (async) refresh.
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
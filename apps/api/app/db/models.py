@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Boolean, Integer
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Boolean, Integer, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -16,15 +16,21 @@ class Project(Base):
     user_id = Column(String, nullable=False, index=True)  # Clerk user ID
     name = Column(String, nullable=False)
     vector_store_id = Column(String, nullable=True)
+    context_token_budget = Column(Integer, nullable=True)  # falls back to CHAT_CONTEXT_TOKEN_BUDGET
+    response_cache_enabled = Column(Boolean, nullable=False, default=False, server_default="false")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    prompts = relationship("Prompt", back_populates="project", cascade="all, delete-orphan")
-    conversations = relationship("Conversation", back_populates="project", cascade="all, delete-orphan")
-    files = relationship("FileMetadata", back_populates="project", cascade="all, delete-orphan")
+    prompts = relationship("Prompt", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    conversations = relationship("Conversation", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    files = relationship("FileMetadata", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
 
 class Prompt(Base):
     __tablename__ = "prompts"
+    __table_args__ = (
+        Index("ix_prompts_project_id", "project_id"),
+        Index("ix_prompts_project_id_active", "project_id", postgresql_where=text("is_active")),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
@@ -37,28 +43,46 @@ class Prompt(Base):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_project_id_created_at", "project_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     title = Column(String, nullable=True)
+    summary = Column(Text, nullable=True)  # rolling summary of turns older than the context window
+    summarized_through = Column(DateTime, nullable=True)  # created_at of the last summarized message
     created_at = Column(DateTime, default=datetime.utcnow)
     
     project = relationship("Project", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True)
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String, nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     conversation = relationship("Conversation", back_populates="messages")
 
 class FileMetadata(Base):
     __tablename__ = "file_metadata"
+    __table_args__ = (
+        Index("ix_file_metadata_project_id_created_at", "project_id", "created_at"),
+        Index("uq_file_metadata_project_id_sha256", "project_id", "sha256", unique=True),
+        Index(
+            "ix_file_metadata_pending_status",
+            "status_checked_at",
+            postgresql_where=text("vector_store_file_status = 'in_progress'"),
+        ),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
@@ -68,7 +92,35 @@ class FileMetadata(Base):
     purpose = Column(String, nullable=True)
     openai_file_id = Column(String, nullable=False, unique=True)
     vector_store_file_id = Column(String, nullable=True)
+    vector_store_file_status = Column(String, nullable=True)  # in_progress | completed | failed | cancelled
+    status_checked_at = Column(DateTime, nullable=True)
     size_bytes = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)  # content hash, for per-project dedup
+    dedup_hits = Column(Integer, nullable=False, default=0, server_default="0")  # re-uploads served from this row
     created_at = Column(DateTime, default=datetime.utcnow)
     
     project = relationship("Project", back_populates="files")
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_created_at", "status", "created_at"),
+    )
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    mime_type = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | completed | failed
+    stage = Column(String, nullable=False, default="stored")  # stored | uploading | indexing | done
+    progress = Column(Integer, nullable=False, default=0)  # percent
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    openai_file_id = Column(String, nullable=True)  # kept across retries so the upload isn't repeated
+    file_id = Column(String, ForeignKey("file_metadata.id", ondelete="SET NULL"), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # running jobs past this are reclaimed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from app.db.database import engine
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+
+# One mutable cell per request. Tasks spawned by the request copy the
+# context, so their queries land in the same cell, but only those run before
+# the response starts make it into the header.
+_current: ContextVar[Optional[List[int]]] = ContextVar("db_query_count", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    cell = _current.get()
+    if cell is not None:
+        cell[0] += 1
+
+
+class QueryCountMiddleware:
+    """
+    Report the number of SQL statements a request ran in X-DB-Queries.
+
+    The header is sent with the response start, so for a streamed response
+    (chat SSE) it counts only what ran before the stream opened.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cell = [0]
+        token = _current.set(cell)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(cell[0]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current.reset(token)
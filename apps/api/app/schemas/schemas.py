@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 # Projects
 class ProjectCreate(BaseModel):
@@ -8,12 +8,16 @@ class ProjectCreate(BaseModel):
 
 class ProjectUpdate(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
+    context_token_budget: Optional[int] = Field(None, ge=1000, le=400_000)
+    response_cache_enabled: Optional[bool] = None
 
 class ProjectResponse(BaseModel):
     id: str
     user_id: str
     name: str
     vector_store_id: Optional[str] = None
+    context_token_budget: Optional[int] = None
+    response_cache_enabled: bool = False
     created_at: datetime
     updated_at: datetime
     
@@ -81,3 +85,77 @@ class FileUploadResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str  # created | duplicate | failed
+    file: Optional[FileUploadResponse] = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadItem]
+
+class IngestionJobResponse(BaseModel):
+    id: str
+    project_id: str
+    filename: str
+    size_bytes: Optional[int] = None
+    status: str
+    stage: str
+    progress: int
+    attempts: int
+    error: Optional[str] = None
+    file_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Admin
+class DedupStatsResponse(BaseModel):
+    deduplicated_uploads: int
+    bytes_saved: int
+
+class LLMSchedulerStatsResponse(BaseModel):
+    running: int
+    queued: int
+    queued_users: int
+    oldest_wait_seconds: float
+    admitted: int
+    rejected: int
+    wait_p50_seconds: float
+    wait_p95_seconds: float
+    wait_max_seconds: float
+
+class TraceSpanResponse(BaseModel):
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_ms: float  # offset from the start of the trace
+    duration_ms: float
+    attributes: Dict[str, Any]
+    error: Optional[str]
+
+class TraceSummaryResponse(BaseModel):
+    trace_id: str
+    name: str
+    started_at: datetime
+    duration_ms: float
+    span_count: int
+    dropped_spans: int
+    status_code: Optional[int]
+    error: bool
+
+class TraceResponse(TraceSummaryResponse):
+    spans: List[TraceSpanResponse]
+
+class ProfileSummaryResponse(BaseModel):
+    id: str
+    mode: str  # duration | request
+    started_at: datetime
+    duration_seconds: float
+    interval_ms: float
+    samples: int
+    skipped_samples: int  # request mode: loop busy with other requests
+    distinct_stacks: int
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services import load_shedder, message_writer, metrics, response_cache, tracing
+from app.services.context_service import message_tokens
+from app.services.openai_service import stream_chat_completion
+from app.services.llm_scheduler import SchedulerRejected, scheduler
+from app.services.singleflight import Group
+from app.services.stream_events import (
+    DONE,
+    ERROR,
+    QUEUED,
+    REFUSAL,
+    RESET,
+    START,
+    TOKEN,
+    StreamEvent,
+    coalesce_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def save_messages_after_stream(
+    conversation_id: str,
+    user_message: str,
+    assistant_message: str,
+    user_message_at: datetime,
+) -> None:
+    """
+    Persist the user + assistant messages after the stream completes.
+
+    Rows go through the write-behind message writer (batched multi-row
+    inserts); whether this waits for the commit depends on MESSAGE_WRITE_MODE.
+    Timestamps are explicit so the pair keeps its order within a batch.
+    """
+    await message_writer.persist(
+        [
+            {
+                "conversation_id": conversation_id,
+                "role": "user",
+                "content": user_message,
+                "token_count": message_tokens(user_message),
+                "created_at": user_message_at,
+            },
+            {
+                "conversation_id": conversation_id,
+                "role": "assistant",
+                "content": assistant_message,
+                "token_count": message_tokens(assistant_message),
+                "created_at": max(datetime.utcnow(), user_message_at),
+            },
+        ]
+    )
+
+
+class Generation:
+    """
+    One assistant response, produced by a server-side task independent of
+    any HTTP connection. Events land in a bounded replay buffer that any
+    number of subscribers can read from, starting at any sequence number.
+    """
+
+    def __init__(self, conversation_id: str, user_id: str, turn_key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.turn_key = turn_key
+        self.done = False
+        self.next_seq = 0
+        self.text_parts: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+        self._events: Deque[Tuple[int, StreamEvent]] = deque(maxlen=settings.CHAT_REPLAY_BUFFER_EVENTS)
+        self._changed = asyncio.Event()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}:{seq}"
+
+    def publish(self, event: StreamEvent) -> None:
+        self._events.append((self.next_seq, event))
+        self.next_seq += 1
+        if event.type == TOKEN and event.content:
+            self.text_parts.append(event.content)
+        self._wake()
+
+    def finish(self) -> None:
+        self.done = True
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, after_seq: int = -1) -> AsyncIterator[Tuple[int, StreamEvent]]:
+        """
+        Yield (seq, event) for every event after `after_seq`, then follow the
+        live stream until the generation finishes. If the requested events
+        have already left the buffer, a single `reset` event carrying the
+        full text so far is sent instead, and the stream continues from there.
+        """
+        cursor = after_seq
+        while True:
+            oldest = self._events[0][0] if self._events else self.next_seq
+            if cursor + 1 < oldest:
+                cursor = self.next_seq - 1
+                yield cursor, StreamEvent(RESET, content="".join(self.text_parts))
+
+            for seq, event in list(self._events):
+                if seq > cursor:
+                    cursor = seq
+                    yield seq, event
+
+            if cursor >= self.next_seq - 1:
+                if self.done:
+                    return
+                await self._changed.wait()
+
+
+_generations: Dict[str, Generation] = {}
+
+# Duplicate turns (double-clicks, client retries) share one generation:
+# _turn_flights covers the window while the first request is still preparing
+# context, _inflight_turns the rest of the generation's life.
+_turn_flights: Group[Generation] = Group()
+_inflight_turns: Dict[str, Generation] = {}
+
+
+def turn_key(conversation_id: str, user_id: str, message: str) -> str:
+    normalized = " ".join(message.split())
+    digest = hashlib.sha256(normalized.encode()).hexdigest()
+    return f"{conversation_id}:{user_id}:{digest}"
+
+
+async def join_or_start_turn(key: str, start: Callable[[], Awaitable[Generation]]) -> Generation:
+    """
+    Return the generation already answering this exact turn, or run `start`
+    to begin one. Every caller subscribes to the same generation, so the
+    upstream call and the persisted messages happen once.
+    """
+    generation = _inflight_turns.get(key)
+    if generation is not None and not generation.done:
+        return generation
+    return await _turn_flights.do(key, start)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    if not value or ":" not in value:
+        return None
+    generation_id, _, seq = value.rpartition(":")
+    try:
+        return generation_id, int(seq)
+    except ValueError:
+        return None
+
+
+def find_generation(generation_id: str, conversation_id: str, user_id: str) -> Optional[Generation]:
+    """Look up a generation on this worker, only for its own conversation and user."""
+    generation = _generations.get(generation_id)
+    if generation is None:
+        return None
+    if generation.conversation_id != conversation_id or generation.user_id != user_id:
+        return None
+    return generation
+
+
+async def _live_events(
+    generation: Generation,
+    project_id: Optional[str],
+    messages: List[Dict[str, Any]],
+    system_prompt: Optional[str],
+    vector_store_id: Optional[str],
+) -> AsyncIterator[StreamEvent]:
+    """Stream a fresh answer once the fair scheduler grants an upstream slot."""
+
+    def on_position(position: int) -> None:
+        generation.publish(StreamEvent(QUEUED, position=position))
+
+    queued_at = time.perf_counter()
+    try:
+        async with scheduler.slot(generation.user_id, project_id, on_position=on_position):
+            tracing.record("llm.queue_wait", queued_at, time.perf_counter())
+            events = coalesce_tokens(
+                stream_chat_completion(
+                    messages,
+                    system_prompt,
+                    vector_store_id=vector_store_id,
+                ),
+                flush_ms=settings.CHAT_STREAM_FLUSH_MS,
+                flush_chars=settings.CHAT_STREAM_FLUSH_CHARS,
+            )
+            async with aclosing(events):
+                async for event in events:
+                    yield event
+    except SchedulerRejected as e:
+        yield StreamEvent(ERROR, message=str(e))
+
+
+async def _run(
+    generation: Generation,
+    messages: List[Dict[str, Any]],
+    system_prompt: Optional[str],
+    vector_store_id: Optional[str],
+    user_message: str,
+    user_message_at: datetime,
+    project_id: Optional[str],
+    cache_key: Optional[str],
+) -> None:
+    with tracing.span("chat.generation", cache_eligible=bool(cache_key)):
+        await _generate(
+            generation,
+            messages,
+            system_prompt,
+            vector_store_id,
+            user_message,
+            user_message_at,
+            project_id,
+            cache_key,
+        )
+
+
+async def _generate(
+    generation: Generation,
+    messages: List[Dict[str, Any]],
+    system_prompt: Optional[str],
+    vector_store_id: Optional[str],
+    user_message: str,
+    user_message_at: datetime,
+    project_id: Optional[str],
+    cache_key: Optional[str],
+) -> None:
+    started = time.perf_counter()
+    outcome = "error"
+    # Counted here rather than in start_generation, so a task cancelled
+    # before it ever runs can't leave the counts raised.
+    load_shedder.stream_opened()
+    metrics.chat_generations_in_flight.inc()
+    generation.publish(StreamEvent(START))
+    try:
+        cached = await response_cache.get(project_id, cache_key) if cache_key else None
+        if cached is not None:
+            events = response_cache.replay(cached)
+        else:
+            events = _live_events(generation, project_id, messages, system_prompt, vector_store_id)
+        completed = refused = first_token = False
+        async with aclosing(events):
+            async for event in events:
+                if event.type == TOKEN and not first_token:
+                    first_token = True
+                    now = time.perf_counter()
+                    source = "cache" if cached is not None else "live"
+                    metrics.chat_ttft.labels(source).observe(now - started)
+                    tracing.record("chat.first_token", started, now, source=source)
+                generation.publish(event)
+                completed = event.type == DONE
+                refused = refused or event.type == REFUSAL
+        if completed:
+            outcome = "done"
+        # Only clean, complete answers are cached; refusals and errors never are.
+        if cache_key and cached is None and completed and not refused and generation.text_parts:
+            await response_cache.store(project_id, cache_key, "".join(generation.text_parts))
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        metrics.chat_stream_duration.labels(outcome).observe(time.perf_counter() - started)
+        # Persisted whether or not anyone is still listening.
+        full_response = "".join(generation.text_parts)
+        try:
+            if full_response:
+                with tracing.span("chat.persist", mode=settings.MESSAGE_WRITE_MODE):
+                    await save_messages_after_stream(
+                        conversation_id=generation.conversation_id,
+                        user_message=user_message,
+                        assistant_message=full_response,
+                        user_message_at=user_message_at,
+                    )
+        except Exception:
+            logger.exception("Failed to persist messages for generation %s", generation.id)
+        finally:
+            load_shedder.stream_closed()
+            metrics.chat_generations_in_flight.dec()
+            if generation.turn_key and _inflight_turns.get(generation.turn_key) is generation:
+                del _inflight_turns[generation.turn_key]
+            generation.finish()
+            asyncio.get_running_loop().call_later(
+                settings.CHAT_REPLAY_RETENTION_SECONDS, _generations.pop, generation.id, None
+            )
+
+
+def start_generation(
+    *,
+    conversation_id: str,
+    user_id: str,
+    messages: List[Dict[str, Any]],
+    system_prompt: Optional[str],
+    vector_store_id: Optional[str],
+    user_message: str,
+    user_message_at: datetime,
+    project_id: Optional[str] = None,
+    cache_key: Optional[str] = None,
+    turn_key: Optional[str] = None,
+) -> Generation:
+    generation = Generation(conversation_id, user_id, turn_key)
+    _generations[generation.id] = generation
+    if turn_key:
+        _inflight_turns[turn_key] = generation
+    generation.task = asyncio.create_task(
+        _run(
+            generation,
+            messages,
+            system_prompt,
+            vector_store_id,
+            user_message,
+            user_message_at,
+            project_id,
+            cache_key,
+        )
+    )
+    return generation
+
+
+async def shutdown() -> None:
+    """Let running generations finish (bounded), so their answers are saved."""
+    tasks = [g.task for g in _generations.values() if g.task is not None and not g.task.done()]
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=settings.CHAT_GENERATION_SHUTDOWN_TIMEOUT)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Conversation, Message
+from app.services.openai_service import summarize_conversation
+from app.services.project_cache import ProjectMeta
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing cost (role markers, separators) on top of content.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken missing, or its encoding file can't be fetched (offline box):
+        # fall back to the ~4 characters per token heuristic below.
+        return None
+
+
+def warm_up() -> None:
+    """Load the tokenizer (it may download its encoding file). Run in a thread at startup."""
+    _get_encoding()
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(content: Optional[str]) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def compose_instructions(system_prompt: Optional[str], summary: Optional[str]) -> Optional[str]:
+    """Append the rolling summary to the project's system prompt."""
+    if not summary:
+        return system_prompt
+    summary_block = f"Summary of the earlier part of this conversation:\n{summary}"
+    if not system_prompt:
+        return summary_block
+    return f"{system_prompt}\n\n{summary_block}"
+
+
+@dataclass
+class SummaryRefresh:
+    """Turns that fell out of the window, to be folded into the summary off the request path."""
+
+    conversation_id: str
+    messages: List[Dict[str, Any]]
+    previous_summary: Optional[str]
+    previous_through: Optional[datetime]
+    through: datetime
+
+
+@dataclass
+class ChatContext:
+    messages: List[Dict[str, Any]]
+    summary: Optional[str]
+    # True when the conversation has no stored turns at all (used for auto-titling).
+    is_first_turn: bool
+    # Set when older turns were trimmed; pass to schedule_summary_refresh.
+    summary_refresh: Optional[SummaryRefresh] = None
+
+
+def _ensure_token_counts(messages: Sequence[Message]) -> None:
+    # Rows written before token_count existed are counted once and cached.
+    for msg in messages:
+        if msg.token_count is None:
+            msg.token_count = message_tokens(msg.content)
+
+
+def _split_for_budget(messages: Sequence[Message], budget: int) -> int:
+    """
+    Return the index of the first message to keep so that messages[index:]
+    fits in `budget` tokens. The kept window always starts on a user turn.
+    """
+    used = 0
+    index = len(messages)
+    while index > 0 and used + messages[index - 1].token_count <= budget:
+        index -= 1
+        used += messages[index].token_count
+
+    while index < len(messages) and messages[index].role != "user":
+        index += 1
+    return index
+
+
+async def load_history(db: AsyncSession, conversation: Conversation) -> List[Message]:
+    """Load the messages not yet folded into the conversation summary."""
+    query = select(Message).where(Message.conversation_id == conversation.id)
+    if conversation.summarized_through is not None:
+        query = query.where(Message.created_at > conversation.summarized_through)
+    return list((await db.scalars(query.order_by(Message.created_at))).all())
+
+
+async def build_context(
+    db: AsyncSession,
+    conversation: Conversation,
+    project: ProjectMeta,
+    user_message: str,
+    history: Optional[List[Message]] = None,
+    *,
+    instructions: Optional[str] = None,
+) -> ChatContext:
+    """
+    Build the model input for the next turn within the project's token budget.
+
+    `instructions` (system prompt plus any retrieved excerpts) and the stored
+    summary count against the budget; the newest turns that fit in the rest
+    are sent verbatim. When the unsummarized history overflows, the window is
+    trimmed to CHAT_CONTEXT_KEEP_RATIO of the budget, so the summary needs
+    refreshing every few turns rather than on every turn, and the trimmed
+    turns are returned in `summary_refresh`. This turn is answered with the
+    existing summary; nothing here waits on the model.
+
+    Backfilled token counts are left pending for the caller to commit.
+    """
+    if history is None:
+        history = await load_history(db, conversation)
+    _ensure_token_counts(history)
+
+    budget = project.context_token_budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+    fixed = message_tokens(user_message) + count_tokens(instructions)
+    available = budget - fixed - count_tokens(conversation.summary)
+    history_tokens = sum(msg.token_count for msg in history)
+
+    kept = history
+    refresh = None
+    if history_tokens > available:
+        target = int((budget - fixed - settings.CHAT_SUMMARY_MAX_TOKENS) * settings.CHAT_CONTEXT_KEEP_RATIO)
+        split = _split_for_budget(history, max(target, 0))
+        dropped = history[:split]
+        if dropped:
+            refresh = SummaryRefresh(
+                conversation_id=conversation.id,
+                messages=[{"role": msg.role, "content": msg.content} for msg in dropped],
+                previous_summary=conversation.summary,
+                previous_through=conversation.summarized_through,
+                through=dropped[-1].created_at,
+            )
+            kept = history[split:]
+
+    messages = [{"role": msg.role, "content": msg.content} for msg in kept]
+    messages.append({"role": "user", "content": user_message})
+
+    return ChatContext(
+        messages=messages,
+        summary=conversation.summary,
+        is_first_turn=not history and conversation.summarized_through is None,
+        summary_refresh=refresh,
+    )
+
+
+# Background summary refresh
+
+_refreshing: Dict[str, asyncio.Task] = {}
+
+
+async def refresh_summary(refresh: SummaryRefresh) -> None:
+    """Fold the trimmed turns into the stored summary, with a session of its own."""
+    try:
+        summary = await summarize_conversation(
+            refresh.messages,
+            refresh.previous_summary,
+            target_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+        )
+        if not summary:
+            return
+        async with SessionLocal() as db:
+            # Only advance from the state this summary was built on; a refresh
+            # that lost a race is simply dropped.
+            await db.execute(
+                update(Conversation)
+                .where(
+                    Conversation.id == refresh.conversation_id,
+                    Conversation.summarized_through.is_not_distinct_from(refresh.previous_through),
+                )
+                .values(summary=summary, summarized_through=refresh.through)
+            )
+            await db.commit()
+    except Exception:
+        # The turns stay unsummarized and are trimmed (and retried) next turn.
+        logger.exception("Failed to refresh summary for conversation %s", refresh.conversation_id)
+
+
+def schedule_summary_refresh(refresh: Optional[SummaryRefresh]) -> None:
+    """Refresh in the background, at most one refresh per conversation at a time."""
+    if refresh is None or refresh.conversation_id in _refreshing:
+        return
+    task = asyncio.create_task(refresh_summary(refresh))
+    _refreshing[refresh.conversation_id] = task
+    task.add_done_callback(lambda _: _refreshing.pop(refresh.conversation_id, None))
+
+
+async def shutdown() -> None:
+    """Give in-flight summary refreshes a bounded chance to finish."""
+    tasks = list(_refreshing.values())
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=settings.CHAT_SUMMARY_SHUTDOWN_TIMEOUT)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.db.database import SessionLocal
+from app.db.models import FileMetadata, Project
+from app.services.openai_service import (
+    create_vector_store,
+    delete_file,
+    delete_vector_store,
+    remove_file_from_vector_store,
+)
+from app.services.project_cache import invalidate_project
+from app.services.singleflight import Group
+
+logger = logging.getLogger(__name__)
+
+_vector_store_flights: Group[str] = Group()
+
+
+async def find_duplicate(db: AsyncSession, project_id: str, sha256: str) -> Optional[FileMetadata]:
+    return await db.scalar(
+        select(FileMetadata).where(
+            FileMetadata.project_id == project_id,
+            FileMetadata.sha256 == sha256,
+        )
+    )
+
+
+async def record_dedup_hit(db: AsyncSession, file_metadata: FileMetadata) -> None:
+    await record_dedup_hits(db, [file_metadata])
+
+
+async def record_dedup_hits(db: AsyncSession, rows: Sequence[FileMetadata]) -> None:
+    """Count one dedup hit for each row, in a single UPDATE and commit."""
+    if not rows:
+        return
+    await db.execute(
+        update(FileMetadata)
+        .where(FileMetadata.id.in_([row.id for row in rows]))
+        .values(dedup_hits=FileMetadata.dedup_hits + 1)
+    )
+    await db.commit()
+
+
+async def discard_openai_file(file_id: str, vector_store_id: Optional[str] = None) -> None:
+    """
+    Best-effort cleanup of an uploaded file nothing will reference: detach it
+    from the vector store (deleting a file doesn't), then delete it.
+    """
+    if vector_store_id:
+        try:
+            await remove_file_from_vector_store(vector_store_id=vector_store_id, file_id=file_id)
+        except Exception:
+            # Usually "not attached"; the delete below still matters.
+            logger.info("Could not detach %s from %s", file_id, vector_store_id, exc_info=True)
+    try:
+        await delete_file(file_id=file_id)
+    except Exception:
+        logger.warning("Could not delete orphaned OpenAI file %s", file_id, exc_info=True)
+
+
+async def ensure_vector_store(project: Project) -> str:
+    """
+    Create the project's vector store on first use and return its id.
+
+    Concurrent callers in this process share one creation. Across workers the
+    store is created with no transaction open and claimed with a conditional
+    UPDATE; a worker that loses the race deletes its store and uses the
+    winner's. Uses sessions of its own, so the caller's transaction is untouched.
+    """
+    if not project.vector_store_id:
+
+        async def create() -> str:
+            async with SessionLocal() as db:
+                existing = await db.scalar(select(Project.vector_store_id).where(Project.id == project.id))
+            if existing:
+                return existing
+            vector_store = await create_vector_store(name=project.name)
+            async with SessionLocal() as db:
+                claimed = await db.scalar(
+                    update(Project)
+                    .where(Project.id == project.id, Project.vector_store_id.is_(None))
+                    .values(vector_store_id=vector_store.id)
+                    .returning(Project.vector_store_id)
+                )
+                await db.commit()
+                if claimed is None:
+                    winner = await db.scalar(select(Project.vector_store_id).where(Project.id == project.id))
+            if claimed is None:
+                try:
+                    await delete_vector_store(vector_store_id=vector_store.id)
+                except Exception:
+                    logger.warning("Could not delete losing vector store %s", vector_store.id, exc_info=True)
+                if winner is None:
+                    raise RuntimeError("Project no longer exists")
+                return winner
+            await invalidate_project(project.id)
+            return vector_store.id
+
+        vector_store_id = await _vector_store_flights.do(project.id, create)
+        # The caller's session never wrote it; record it without dirtying the row.
+        set_committed_value(project, "vector_store_id", vector_store_id)
+    return project.vector_store_id
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import FileMetadata, Project
+from app.services.openai_service import get_vector_store_file
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUS = "in_progress"
+
+_poller_task: Optional[asyncio.Task] = None
+
+
+async def _claim_pending() -> List[Tuple[str, str, str]]:
+    """
+    Claim a batch of non-terminal files by stamping status_checked_at.
+
+    SKIP LOCKED plus the timestamp means several workers can run the poller
+    without refreshing the same file twice in one interval.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.INGESTION_POLL_INTERVAL)
+
+    due = (
+        select(FileMetadata.id)
+        .where(
+            FileMetadata.vector_store_file_status == PENDING_STATUS,
+            or_(FileMetadata.status_checked_at.is_(None), FileMetadata.status_checked_at < cutoff),
+        )
+        .order_by(FileMetadata.status_checked_at.nulls_first())
+        .limit(settings.INGESTION_POLL_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    async with SessionLocal() as db:
+        claimed = (
+            await db.execute(
+                update(FileMetadata)
+                .where(FileMetadata.id.in_(due))
+                .values(status_checked_at=now)
+                .returning(FileMetadata.id, FileMetadata.project_id, FileMetadata.vector_store_file_id)
+            )
+        ).all()
+        if not claimed:
+            await db.rollback()
+            return []
+
+        project_ids = {project_id for _, project_id, _ in claimed}
+        vector_stores = dict(
+            (
+                await db.execute(
+                    select(Project.id, Project.vector_store_id).where(Project.id.in_(project_ids))
+                )
+            ).all()
+        )
+        await db.commit()
+
+    return [
+        (file_id, vector_stores[project_id], vector_store_file_id)
+        for file_id, project_id, vector_store_file_id in claimed
+        if vector_stores.get(project_id) and vector_store_file_id
+    ]
+
+
+async def refresh_pending_statuses() -> int:
+    """Refresh every due non-terminal file once; returns how many were checked."""
+    pending = await _claim_pending()
+    if not pending:
+        return 0
+
+    semaphore = asyncio.Semaphore(settings.INGESTION_POLL_CONCURRENCY)
+
+    async def fetch(vector_store_id: str, vector_store_file_id: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                vector_store_file = await get_vector_store_file(
+                    vector_store_id=vector_store_id,
+                    file_id=vector_store_file_id,
+                )
+            except Exception:
+                logger.warning("Status check failed for vector store file %s", vector_store_file_id, exc_info=True)
+                return None
+            return getattr(vector_store_file, "status", None)
+
+    statuses = await asyncio.gather(
+        *(fetch(vector_store_id, vs_file_id) for _, vector_store_id, vs_file_id in pending)
+    )
+
+    changed = [
+        (file_id, new_status)
+        for (file_id, _, _), new_status in zip(pending, statuses)
+        if new_status and new_status != PENDING_STATUS
+    ]
+    if changed:
+        async with SessionLocal() as db:
+            for file_id, new_status in changed:
+                await db.execute(
+                    update(FileMetadata)
+                    .where(FileMetadata.id == file_id)
+                    .values(vector_store_file_status=new_status)
+                )
+            await db.commit()
+    return len(pending)
+
+
+async def _run() -> None:
+    while True:
+        try:
+            checked = await refresh_pending_statuses()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ingestion status poll failed")
+            checked = 0
+        # A full batch means there is a backlog: go again without sleeping.
+        if checked < settings.INGESTION_POLL_BATCH_SIZE:
+            await asyncio.sleep(settings.INGESTION_POLL_INTERVAL)
+
+
+def start_poller() -> None:
+    global _poller_task
+    if _poller_task is None and settings.INGESTION_POLL_INTERVAL > 0:
+        _poller_task = asyncio.create_task(_run())
+
+
+async def stop_poller() -> None:
+    global _poller_task
+    task, _poller_task = _poller_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
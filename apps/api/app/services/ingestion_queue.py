@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import FileMetadata, IngestionJob, Project
+from app.services import retrieval
+from app.services.file_service import (
+    discard_openai_file,
+    ensure_vector_store,
+    find_duplicate,
+    record_dedup_hit,
+)
+from app.services.openai_service import add_file_to_vector_store, upload_file_to_openai
+from app.services.project_cache import invalidate_project
+
+logger = logging.getLogger(__name__)
+
+PURPOSE = "user_data"
+
+_workers: List[asyncio.Task] = []
+_wakeup = asyncio.Event()
+
+
+def storage_path(job_id: str) -> str:
+    os.makedirs(settings.INGESTION_STORAGE_DIR, exist_ok=True)
+    return os.path.join(settings.INGESTION_STORAGE_DIR, job_id)
+
+
+def discard_stored_file(job_id: str) -> None:
+    try:
+        os.remove(os.path.join(settings.INGESTION_STORAGE_DIR, job_id))
+    except FileNotFoundError:
+        pass
+
+
+def _open_stored_file(job_id: str):
+    return open(storage_path(job_id), "rb")
+
+
+def notify() -> None:
+    """Wake an idle worker in this process; other workers find it on their next poll."""
+    _wakeup.set()
+
+
+async def _discard_job_upload(db, job: IngestionJob) -> None:
+    """Drop what a job that will never complete left behind: its spooled file and OpenAI upload."""
+    await asyncio.to_thread(discard_stored_file, job.id)
+    if job.openai_file_id:
+        vector_store_id = await db.scalar(select(Project.vector_store_id).where(Project.id == job.project_id))
+        await discard_openai_file(job.openai_file_id, vector_store_id)
+        job.openai_file_id = None
+
+
+async def _fail_exhausted(now: datetime) -> None:
+    """
+    Give up on jobs whose lease expired on their last attempt: the file
+    crashed or OOM-killed its worker that many times, so don't reclaim it again.
+    """
+    async with SessionLocal() as db:
+        jobs = (
+            await db.scalars(
+                select(IngestionJob)
+                .where(
+                    IngestionJob.status == "running",
+                    IngestionJob.lease_expires_at < now,
+                    IngestionJob.attempts >= settings.INGESTION_JOB_MAX_ATTEMPTS,
+                )
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        for job in jobs:
+            logger.warning("Ingestion job %s abandoned after %s attempts", job.id, job.attempts)
+            job.status = "failed"
+            job.error = job.error or f"Gave up after {job.attempts} attempts (worker crashed or timed out)"
+            job.lease_expires_at = None
+            await _discard_job_upload(db, job)
+        if jobs:
+            await db.commit()
+
+
+async def _claim_next() -> Optional[str]:
+    """
+    Lease the oldest runnable job: queued, or running with an expired lease
+    (its worker died mid-job) and attempts left. SKIP LOCKED keeps workers
+    from colliding.
+    """
+    now = datetime.utcnow()
+    await _fail_exhausted(now)
+    runnable = (
+        select(IngestionJob.id)
+        .where(
+            or_(
+                IngestionJob.status == "queued",
+                and_(IngestionJob.status == "running", IngestionJob.lease_expires_at < now),
+            ),
+            IngestionJob.attempts < settings.INGESTION_JOB_MAX_ATTEMPTS,
+        )
+        .order_by(IngestionJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with SessionLocal() as db:
+        job_id = await db.scalar(
+            update(IngestionJob)
+            .where(IngestionJob.id == runnable)
+            .values(
+                status="running",
+                attempts=IngestionJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=settings.INGESTION_JOB_LEASE_SECONDS),
+            )
+            .returning(IngestionJob.id)
+        )
+        await db.commit()
+    return job_id
+
+
+async def _complete(db, job: IngestionJob, file_metadata: FileMetadata, *, keep_stored_file: bool = False) -> None:
+    job.status = "completed"
+    job.stage = "done"
+    job.progress = 100
+    job.error = None
+    job.file_id = file_metadata.id
+    job.lease_expires_at = None
+    await db.commit()
+    if not keep_stored_file:
+        await asyncio.to_thread(discard_stored_file, job.id)
+
+
+async def _process(job_id: str) -> None:
+    async with SessionLocal() as db:
+        job = await db.get(IngestionJob, job_id)
+        if job is None:
+            return
+        try:
+            project = await db.get(Project, job.project_id)
+            if project is None:
+                raise RuntimeError("Project no longer exists")
+
+            existing = await find_duplicate(db, job.project_id, job.sha256) if job.sha256 else None
+            if existing:
+                await record_dedup_hit(db, existing)
+                await _complete(db, job, existing)
+                return
+
+            # The local retrieval backend indexes the stored copy instead.
+            hosted = retrieval.uses_hosted_file_search()
+            vector_store_id = await ensure_vector_store(project) if hosted else None
+
+            if not job.openai_file_id:
+                job.stage = "uploading"
+                job.progress = 10
+                await db.commit()
+                fh = await asyncio.to_thread(_open_stored_file, job.id)
+                try:
+                    openai_file = await upload_file_to_openai(
+                        filename=job.filename,
+                        file=fh,
+                        content_type=job.mime_type,
+                        purpose=PURPOSE,
+                    )
+                finally:
+                    await asyncio.to_thread(fh.close)
+                job.openai_file_id = openai_file.id
+
+            vector_store_file = None
+            if vector_store_id:
+                job.stage = "indexing"
+                job.progress = 60
+                await db.commit()
+                vector_store_file = await add_file_to_vector_store(
+                    vector_store_id=vector_store_id,
+                    file_id=job.openai_file_id,
+                )
+
+            file_metadata = FileMetadata(
+                project_id=job.project_id,
+                user_id=job.user_id,
+                filename=job.filename,
+                mime_type=job.mime_type,
+                purpose=PURPOSE,
+                openai_file_id=job.openai_file_id,
+                vector_store_file_id=getattr(vector_store_file, "id", None),
+                vector_store_file_status=getattr(vector_store_file, "status", None),
+                size_bytes=job.size_bytes,
+                sha256=job.sha256,
+            )
+            db.add(file_metadata)
+            index_locally = False
+            try:
+                await db.flush()
+            except IntegrityError:
+                # The same content landed through another path meanwhile;
+                # this job's own upload is then unused.
+                await db.rollback()
+                file_metadata = await find_duplicate(db, job.project_id, job.sha256)
+                if file_metadata is None:
+                    raise
+                job = await db.get(IngestionJob, job_id)
+                if job.openai_file_id and job.openai_file_id != file_metadata.openai_file_id:
+                    await discard_openai_file(job.openai_file_id, vector_store_id)
+            else:
+                index_locally = not hosted and retrieval.is_indexable(job.filename, job.mime_type)
+            await _complete(db, job, file_metadata, keep_stored_file=index_locally)
+            await invalidate_project(job.project_id)
+            if index_locally:
+                # Indexed straight from the spooled copy, which is removed afterwards.
+                await retrieval.index_file(
+                    job.project_id,
+                    file_metadata.id,
+                    job.filename,
+                    job.mime_type,
+                    os.path.join(settings.INGESTION_STORAGE_DIR, job.id),
+                    remove_after=True,
+                )
+
+        except Exception as e:
+            logger.warning("Ingestion job %s failed (attempt %s)", job_id, job.attempts, exc_info=True)
+            await db.rollback()
+            job = await db.get(IngestionJob, job_id)
+            if job is None:
+                return
+            job.error = str(e)
+            job.lease_expires_at = None
+            if job.attempts >= settings.INGESTION_JOB_MAX_ATTEMPTS:
+                job.status = "failed"
+                await _discard_job_upload(db, job)
+            else:
+                job.status = "queued"
+            await db.commit()
+
+
+async def _worker() -> None:
+    while True:
+        try:
+            job_id = await _claim_next()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Failed to claim ingestion job")
+            job_id = None
+
+        if job_id is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.INGESTION_QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        await _process(job_id)
+
+
+def start_workers() -> None:
+    if _workers:
+        return
+    for _ in range(settings.INGESTION_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers() -> None:
+    # Interrupted jobs keep status=running and are reclaimed once their lease expires.
+    tasks = list(_workers)
+    _workers.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
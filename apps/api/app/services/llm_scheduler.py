@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.services import metrics
+
+_PRUNE_THRESHOLD = 10_000
+
+
+class SchedulerRejected(Exception):
+    """The request could not be admitted (queue full or waited too long)."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1.0
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.rate <= 0 or self.tokens >= self.capacity
+
+    def seconds_until_available(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate) if self.rate > 0 else 0.0
+
+
+@dataclass
+class _Waiter:
+    user_id: str
+    project_id: Optional[str]
+    finish_tag: float
+    seq: int
+    enqueued_at: float
+    granted: asyncio.Future
+    on_position: Optional[Callable[[int], None]] = None
+    last_position: int = 0
+
+
+@dataclass
+class _Stats:
+    admitted: int = 0
+    rejected: int = 0
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+@lru_cache(maxsize=1)
+def _tenant_weights() -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for item in settings.LLM_TENANT_WEIGHTS.split(","):
+        tenant, sep, weight = item.partition("=")
+        if sep and tenant.strip():
+            weights[tenant.strip()] = max(float(weight), 0.01)
+    return weights
+
+
+class FairScheduler:
+    """
+    Admission control in front of upstream LLM calls.
+
+    A request runs once a global slot, a slot under its user's and project's
+    concurrency caps, and a token from its user's bucket are all available.
+    Among runnable waiters the one with the smallest weighted-fair-queuing
+    finish tag goes first, so a tenant with many queued requests is
+    interleaved with everyone else instead of draining first. Only touched
+    from the event loop, so no locking.
+    """
+
+    def __init__(self) -> None:
+        self._waiters: List[_Waiter] = []
+        self._running_total = 0
+        self._running_by_user: Dict[str, int] = {}
+        self._running_by_project: Dict[str, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = _Stats()
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(
+                settings.LLM_USER_RATE_PER_MINUTE, settings.LLM_USER_BURST
+            )
+        return bucket
+
+    def _has_capacity(self, waiter: _Waiter) -> bool:
+        if self._running_total >= settings.LLM_MAX_CONCURRENCY:
+            return False
+        if self._running_by_user.get(waiter.user_id, 0) >= settings.LLM_USER_MAX_CONCURRENCY:
+            return False
+        if waiter.project_id and (
+            self._running_by_project.get(waiter.project_id, 0) >= settings.LLM_PROJECT_MAX_CONCURRENCY
+        ):
+            return False
+        return True
+
+    def _grant(self, waiter: _Waiter, now: float) -> None:
+        self._bucket(waiter.user_id).take(now)
+        self._running_total += 1
+        self._running_by_user[waiter.user_id] = self._running_by_user.get(waiter.user_id, 0) + 1
+        if waiter.project_id:
+            self._running_by_project[waiter.project_id] = (
+                self._running_by_project.get(waiter.project_id, 0) + 1
+            )
+        self._virtual_time = max(self._virtual_time, waiter.finish_tag)
+        self._stats.admitted += 1
+        self._stats.recent_waits.append(now - waiter.enqueued_at)
+        metrics.llm_queue_wait.observe(now - waiter.enqueued_at)
+        waiter.granted.set_result(None)
+
+    def _release(self, user_id: str, project_id: Optional[str]) -> None:
+        self._running_total -= 1
+        self._decrement(self._running_by_user, user_id)
+        if project_id:
+            self._decrement(self._running_by_project, project_id)
+        self._dispatch()
+
+    @staticmethod
+    def _decrement(counts: Dict[str, int], key: str) -> None:
+        remaining = counts.get(key, 0) - 1
+        if remaining > 0:
+            counts[key] = remaining
+        else:
+            counts.pop(key, None)
+
+    def _prune(self, now: float) -> None:
+        # A finish tag behind virtual time and a full bucket both behave
+        # exactly like a tenant we've never seen, so they can be dropped.
+        self._last_finish = {
+            user: tag for user, tag in self._last_finish.items() if tag > self._virtual_time
+        }
+        self._buckets = {
+            user: bucket
+            for user, bucket in self._buckets.items()
+            if not bucket.is_full(now)
+        }
+
+    def _withdraw_tag(self, user_id: str, finish_tag: float, previous: Optional[float]) -> None:
+        # A request that never ran shouldn't push the tenant's next one back.
+        # If a later request already built on this tag, leave it: rewinding
+        # would hand two queued requests the same slot in line.
+        if self._last_finish.get(user_id) == finish_tag:
+            if previous is None:
+                self._last_finish.pop(user_id, None)
+            else:
+                self._last_finish[user_id] = previous
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        if len(self._buckets) > _PRUNE_THRESHOLD or len(self._last_finish) > _PRUNE_THRESHOLD:
+            self._prune(now)
+        self._waiters.sort(key=lambda w: (w.finish_tag, w.seq))
+        next_token_at: Optional[float] = None
+        still_waiting: List[_Waiter] = []
+        for waiter in self._waiters:
+            if waiter.granted.done():
+                continue  # cancelled while queued
+            bucket = self._bucket(waiter.user_id)
+            if self._has_capacity(waiter):
+                if bucket.available(now):
+                    self._grant(waiter, now)
+                    continue
+                wait = bucket.seconds_until_available(now)
+                next_token_at = wait if next_token_at is None else min(next_token_at, wait)
+            still_waiting.append(waiter)
+        self._waiters = still_waiting
+        # Every grant, release and cancellation ends here, so the gauges are
+        # set explicitly rather than read back by a callback.
+        metrics.llm_running.set(self._running_total)
+        metrics.llm_queue_depth.set(len(self._waiters))
+
+        for position, waiter in enumerate(self._waiters, start=1):
+            if waiter.on_position and position != waiter.last_position:
+                waiter.last_position = position
+                waiter.on_position(position)
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if next_token_at is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_token_at, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: str,
+        project_id: Optional[str] = None,
+        on_position: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[None]:
+        """
+        Hold one upstream slot for the duration of the block. While queued,
+        `on_position` is called with the 1-based queue position whenever it
+        changes. Raises SchedulerRejected when the user already has too many
+        queued requests or the wait exceeds LLM_QUEUE_TIMEOUT.
+        """
+        queued_for_user = sum(1 for w in self._waiters if w.user_id == user_id)
+        if queued_for_user >= settings.LLM_USER_MAX_QUEUED:
+            self._stats.rejected += 1
+            raise SchedulerRejected("Too many requests waiting; try again shortly")
+
+        weight = _tenant_weights().get(user_id, 1.0)
+        previous_finish = self._last_finish.get(user_id)
+        start_tag = max(self._virtual_time, previous_finish or 0.0)
+        finish_tag = start_tag + 1.0 / weight
+        self._last_finish[user_id] = finish_tag
+
+        waiter = _Waiter(
+            user_id=user_id,
+            project_id=project_id,
+            finish_tag=finish_tag,
+            seq=next(self._seq),
+            enqueued_at=time.monotonic(),
+            granted=asyncio.get_running_loop().create_future(),
+            on_position=on_position,
+        )
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.granted), timeout=settings.LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if not waiter.granted.done():
+                waiter.granted.cancel()
+                self._withdraw_tag(user_id, finish_tag, previous_finish)
+                self._stats.rejected += 1
+                self._dispatch()
+                raise SchedulerRejected("Timed out waiting for capacity; try again shortly")
+        except BaseException:
+            if waiter.granted.done() and not waiter.granted.cancelled():
+                self._release(user_id, project_id)
+            else:
+                waiter.granted.cancel()
+                self._withdraw_tag(user_id, finish_tag, previous_finish)
+                self._dispatch()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(user_id, project_id)
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        waits = sorted(self._stats.recent_waits)
+        queued = [w for w in self._waiters if not w.granted.done()]
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            "running": self._running_total,
+            "queued": len(queued),
+            "queued_users": len({w.user_id for w in queued}),
+            "oldest_wait_seconds": max((now - w.enqueued_at for w in queued), default=0.0),
+            "admitted": self._stats.admitted,
+            "rejected": self._stats.rejected,
+            "wait_p50_seconds": percentile(0.5),
+            "wait_p95_seconds": percentile(0.95),
+            "wait_max_seconds": waits[-1] if waits else 0.0,
+        }
+
+
+scheduler = FairScheduler()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Expensive work that is refused when the worker is overloaded. Reads, resumes
+# and health checks are always let through.
+_SHEDDABLE = (
+    ("POST", re.compile(r"^/api/conversations/[^/]+/chat/?$")),
+    ("POST", re.compile(r"^/api/projects/[^/]+/files(/batch|/jobs)?/?$")),
+)
+
+_loop_lag = 0.0  # EWMA of event-loop scheduling delay, seconds
+_lag_task: Optional[asyncio.Task] = None
+_streams_in_flight = 0
+_upstream: Deque[Tuple[float, bool, float]] = deque(maxlen=1000)  # (at, ok, latency)
+
+
+# Signals
+
+
+async def _measure_loop_lag() -> None:
+    global _loop_lag
+    interval = settings.LOAD_SHED_LAG_SAMPLE_INTERVAL
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        # Rise fast, decay slowly, so one stall is noticed but a blip doesn't linger.
+        alpha = 0.5 if lag > _loop_lag else 0.1
+        _loop_lag += alpha * (lag - _loop_lag)
+        metrics.event_loop_lag.set(_loop_lag)
+
+
+def start_monitor() -> None:
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_measure_loop_lag())
+
+
+async def stop_monitor() -> None:
+    global _lag_task
+    task, _lag_task = _lag_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def stream_opened() -> None:
+    global _streams_in_flight
+    _streams_in_flight += 1
+
+
+def stream_closed() -> None:
+    global _streams_in_flight
+    _streams_in_flight = max(0, _streams_in_flight - 1)
+
+
+def record_upstream(ok: bool, latency: float) -> None:
+    """Record one upstream call: whether it succeeded and its time to first byte."""
+    _upstream.append((time.monotonic(), ok, latency))
+
+
+def _upstream_window() -> Tuple[int, float, float]:
+    """(samples, error rate, mean latency) over the last LOAD_SHED_WINDOW_SECONDS."""
+    cutoff = time.monotonic() - settings.LOAD_SHED_WINDOW_SECONDS
+    while _upstream and _upstream[0][0] < cutoff:
+        _upstream.popleft()
+    if not _upstream:
+        return 0, 0.0, 0.0
+    errors = sum(1 for _, ok, _ in _upstream if not ok)
+    latency = sum(lat for _, _, lat in _upstream) / len(_upstream)
+    return len(_upstream), errors / len(_upstream), latency
+
+
+def snapshot() -> Dict[str, float]:
+    samples, error_rate, latency = _upstream_window()
+    return {
+        "loop_lag_seconds": _loop_lag,
+        "streams_in_flight": _streams_in_flight,
+        "upstream_samples": samples,
+        "upstream_error_rate": error_rate,
+        "upstream_latency_seconds": latency,
+    }
+
+
+# Admission decision
+
+
+def _pressure() -> Tuple[float, str]:
+    """
+    The most loaded signal as a ratio of its threshold (1.0 = at threshold),
+    and its name. Thresholds of 0 disable that signal.
+    """
+    candidates = []
+    if settings.LOAD_SHED_LOOP_LAG_MS > 0:
+        candidates.append((_loop_lag * 1000 / settings.LOAD_SHED_LOOP_LAG_MS, "event_loop_lag"))
+    if settings.LOAD_SHED_MAX_STREAMS > 0:
+        candidates.append((_streams_in_flight / settings.LOAD_SHED_MAX_STREAMS, "streams_in_flight"))
+
+    samples, error_rate, latency = _upstream_window()
+    if samples >= settings.LOAD_SHED_UPSTREAM_MIN_SAMPLES:
+        if settings.LOAD_SHED_UPSTREAM_ERROR_RATE > 0:
+            candidates.append((error_rate / settings.LOAD_SHED_UPSTREAM_ERROR_RATE, "upstream_errors"))
+        if settings.LOAD_SHED_UPSTREAM_LATENCY_MS > 0:
+            candidates.append((latency * 1000 / settings.LOAD_SHED_UPSTREAM_LATENCY_MS, "upstream_latency"))
+
+    return max(candidates, default=(0.0, ""))
+
+
+def should_shed() -> Optional[str]:
+    """
+    Return the overloaded signal's name if this request should be refused.
+
+    Below threshold nothing is shed. Above it the refusal probability grows
+    linearly, reaching 100% at (1 + LOAD_SHED_RAMP) x threshold, so admitted
+    load eases off gradually instead of flapping between all and nothing.
+    """
+    pressure, reason = _pressure()
+    if pressure < 1.0:
+        return None
+    ramp = settings.LOAD_SHED_RAMP
+    probability = 1.0 if ramp <= 0 else min(1.0, (pressure - 1.0) / ramp)
+    if probability >= 1.0 or random.random() < probability:
+        return reason
+    return None
+
+
+def is_sheddable(method: str, path: str) -> bool:
+    return any(method == m and pattern.match(path) for m, pattern in _SHEDDABLE)
+
+
+class LoadSheddingMiddleware:
+    """
+    Refuse new chat/upload work with 503 + Retry-After while this worker is
+    overloaded. Plain ASGI so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.LOAD_SHED_ENABLED
+            or not is_sheddable(scope["method"], scope["path"])
+            # A chat retry with Last-Event-ID only reattaches to an existing answer.
+            or any(name == b"last-event-id" for name, _ in scope["headers"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        reason = should_shed()
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        logger.debug("Shedding %s %s (%s)", scope["method"], scope["path"], reason)
+        metrics.load_shed_rejections.labels(reason).inc()
+        body = json.dumps({"detail": "Server is busy, please retry shortly"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(settings.LOAD_SHED_RETRY_AFTER).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
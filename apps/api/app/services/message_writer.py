@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Message
+
+logger = logging.getLogger(__name__)
+
+# Durability modes for MESSAGE_WRITE_MODE
+ACK = "ack"  # persist() returns once the rows are committed
+FIRE_AND_FORGET = "fire_and_forget"  # persist() returns once the rows are queued
+
+Rows = List[Dict[str, Any]]
+_Item = Tuple[Rows, Optional[asyncio.Future]]
+
+_queue: Optional["asyncio.Queue[_Item]"] = None
+_task: Optional[asyncio.Task] = None
+
+
+async def _insert(rows: Rows) -> None:
+    async with SessionLocal() as db:
+        await db.execute(insert(Message), rows)
+        await db.commit()
+
+
+def _resolve(future: Optional[asyncio.Future], error: Optional[BaseException] = None) -> None:
+    if future is None or future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def _fail_all(batch: List[_Item], error: BaseException) -> None:
+    for _, future in batch:
+        _resolve(future, error)
+
+
+async def _write_batch(batch: List[_Item]) -> None:
+    """
+    Insert a batch in one statement. If that fails, retry item by item so a
+    bad turn only fails its own future; every other item is still written.
+    """
+    rows = [row for item_rows, _ in batch for row in item_rows]
+    try:
+        await _insert(rows)
+    except Exception as e:
+        if len(batch) == 1:
+            logger.error("Failed to persist %d message rows", len(rows), exc_info=e)
+            _resolve(batch[0][1], e)
+            return
+        logger.warning("Batched message insert failed; retrying %d items one by one", len(batch), exc_info=True)
+        for item_rows, future in batch:
+            try:
+                await _insert(item_rows)
+            except Exception as item_error:
+                logger.error("Failed to persist %d message rows", len(item_rows), exc_info=item_error)
+                _resolve(future, item_error)
+            else:
+                _resolve(future)
+        return
+    for _, future in batch:
+        _resolve(future)
+
+
+async def _drain(queue: "asyncio.Queue[_Item]") -> None:
+    flush_delay = settings.MESSAGE_WRITE_FLUSH_MS / 1000
+    while True:
+        batch = [await queue.get()]
+        # Give concurrent turns a moment to join the same multi-row INSERT.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + flush_delay
+        while len(batch) < settings.MESSAGE_WRITE_BATCH_SIZE:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await _write_batch(batch)
+        except asyncio.CancelledError:
+            # Stopped mid-write (shutdown timeout): don't leave ACK callers waiting.
+            _fail_all(batch, RuntimeError("Message writer stopped before these rows were written"))
+            raise
+        except Exception as e:
+            logger.exception("Failed to persist %d queued message rows", sum(len(r) for r, _ in batch))
+            _fail_all(batch, e)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def persist(rows: Rows) -> None:
+    """
+    Queue Message rows for a batched multi-row insert.
+
+    In ACK mode this waits for the commit and raises if it failed. In
+    FIRE_AND_FORGET mode it returns once queued. A full queue applies
+    backpressure either way. Without a running writer (scripts, tests) the
+    rows are inserted directly.
+    """
+    if _queue is None:
+        await _insert(rows)
+        return
+
+    future: Optional[asyncio.Future] = None
+    if settings.MESSAGE_WRITE_MODE == ACK:
+        future = asyncio.get_running_loop().create_future()
+    await _queue.put((rows, future))
+    if future is not None:
+        await future
+
+
+def start_writer() -> None:
+    global _queue, _task
+    if _task is None:
+        _queue = asyncio.Queue(maxsize=settings.MESSAGE_WRITE_QUEUE_SIZE)
+        _task = asyncio.create_task(_drain(_queue))
+
+
+async def stop_writer() -> None:
+    """Flush everything still queued, then stop. Called from the app lifespan."""
+    global _queue, _task
+    queue, task = _queue, _task
+    if task is None:
+        return
+    try:
+        await asyncio.wait_for(queue.join(), timeout=settings.MESSAGE_WRITE_SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error("Message writer shutdown timed out with %d items unflushed", queue.qsize())
+    # New persist() calls now go straight to the database.
+    _queue, _task = None, None
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    # Anything still queued will never be written; release its ACK waiters.
+    unflushed: List[_Item] = []
+    while not queue.empty():
+        unflushed.append(queue.get_nowait())
+        queue.task_done()
+    if unflushed:
+        logger.error("Dropping %d unflushed message items", len(unflushed))
+        _fail_all(unflushed, RuntimeError("Message writer stopped before these rows were written"))
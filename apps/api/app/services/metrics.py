@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Labels are restricted to small closed sets (route templates, operation
+# names, status classes); never ids, users or raw paths.
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20)
+_DB_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 10)
+
+# HTTP
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte (whole stream for SSE).",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled.")
+
+# Chat pipeline
+chat_prepare_duration = Histogram(
+    "chat_prepare_seconds",
+    "Work in chat_stream before generation starts (ownership, context, commit).",
+    buckets=_LATENCY_BUCKETS,
+)
+chat_ttft = Histogram(
+    "chat_time_to_first_token_seconds",
+    "From generation start to its first token, including any queueing.",
+    ["source"],  # live | cache
+    buckets=_TTFT_BUCKETS,
+)
+chat_stream_duration = Histogram(
+    "chat_stream_duration_seconds",
+    "From generation start until it finished.",
+    ["outcome"],  # done | error | cancelled
+    buckets=_LATENCY_BUCKETS,
+)
+chat_tokens_per_second = Histogram(
+    "chat_tokens_per_second",
+    "Upstream output rate between the first and last delta.",
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500),
+)
+chat_output_tokens = Counter("chat_output_tokens_total", "Upstream output deltas received.")
+chat_generations_in_flight = Gauge("chat_generations_in_flight", "Generations currently running.")
+sse_connections = Gauge("chat_sse_connections", "Clients currently attached to a chat stream.")
+sse_bytes = Counter("chat_sse_bytes_total", "Bytes of SSE frames written to clients.")
+
+# Auth
+jwt_cache_lookups = Counter("jwt_cache_lookups_total", "Verified-token cache lookups, by result.", ["result"])
+
+# Upstream (OpenAI)
+upstream_duration = Histogram(
+    "openai_request_duration_seconds",
+    "OpenAI call latency by operation; streaming calls are timed to the first event.",
+    ["operation"],
+    buckets=_LATENCY_BUCKETS,
+)
+upstream_errors = Counter("openai_request_errors_total", "Failed OpenAI calls by operation.", ["operation"])
+
+# Database
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    buckets=_DB_WAIT_BUCKETS,
+)
+db_queries = Counter("db_queries_total", "SQL statements executed, by kind.", ["kind"])
+# Kept current from pool events (not callbacks, which multiprocess mode can't
+# export); livesum adds up the workers that are still alive.
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out", "Pooled connections currently in use.", multiprocess_mode="livesum"
+)
+db_pool_size = Gauge(
+    "db_pool_size", "Connections currently held by the pool (idle + in use).", multiprocess_mode="livesum"
+)
+
+# Admission and load
+# Set where the state changes; lag reports the worst live worker, the
+# scheduler counts add up across workers.
+event_loop_lag = Gauge(
+    "event_loop_lag_seconds", "Smoothed event-loop scheduling delay.", multiprocess_mode="livemax"
+)
+llm_queue_depth = Gauge(
+    "llm_queue_depth", "Chat turns waiting for an upstream slot.", multiprocess_mode="livesum"
+)
+llm_running = Gauge("llm_running", "Chat turns holding an upstream slot.", multiprocess_mode="livesum")
+llm_queue_wait = Histogram(
+    "llm_queue_wait_seconds",
+    "Time a chat turn waited for an upstream slot.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+load_shed_rejections = Counter("load_shed_rejections_total", "Requests refused with 503.", ["reason"])
+
+
+_QUERY_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def query_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].upper()
+    return kind if kind in _QUERY_KINDS else "OTHER"
+
+
+@contextmanager
+def upstream_call(operation: str) -> Iterator[None]:
+    """Time one non-streaming OpenAI call and count it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        upstream_errors.labels(operation).inc()
+        raise
+    finally:
+        upstream_duration.labels(operation).observe(time.perf_counter() - started)
+
+
+_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+
+class MetricsMiddleware:
+    """
+    Per-route latency histogram. The route label is the matched path template
+    (e.g. /api/conversations/{conversation_id}/chat), or "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+            http_request_duration.labels(method, route, f"{status // 100}xx").observe(
+                time.perf_counter() - started
+            )
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Exposition for /metrics. With PROMETHEUS_MULTIPROC_DIR set (several
+    uvicorn workers), values from all workers are merged.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,20 +1,75 @@
 from __future__ import annotations
 
-import json
-from typing import Any, AsyncGenerator, Dict, List, Optional
+import time
+from contextlib import contextmanager
+from typing import IO, Any, AsyncGenerator, Dict, Iterator, List, Optional, Sequence
 
+import httpx
 from openai import AsyncOpenAI
 from app.core.config import settings
+from app.services import load_shedder, metrics, tracing
+from app.services.stream_events import DONE, ERROR, REFUSAL, TOKEN, StreamEvent
 
+CHAT_MODEL = "gpt-5-mini"
 
-def _get_client() -> AsyncOpenAI:
+# One client per process: it owns the httpx connection pool, so reusing it keeps
+# TLS sessions (and HTTP/2 connections) warm across requests.
+_client: Optional[AsyncOpenAI] = None
+
+
+def _build_client() -> AsyncOpenAI:
     if not settings.OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is not set.")
-    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
+    http_client = httpx.AsyncClient(
+        http2=settings.OPENAI_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+    )
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+    )
+
+
+def _timeout(total: float) -> httpx.Timeout:
+    return httpx.Timeout(total, connect=settings.OPENAI_CONNECT_TIMEOUT)
+
+
+async def init_client() -> AsyncOpenAI:
+    """Create the shared client. Called from the app lifespan on startup."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client and its connection pool. Called on shutdown."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
 
-def _sse(payload: Dict[str, Any]) -> str:
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _get_client() -> AsyncOpenAI:
+    # Falls back to lazy creation so scripts/shells work without the lifespan hook.
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+@contextmanager
+def _upstream(operation: str) -> Iterator[None]:
+    with tracing.span(f"openai.{operation}"), metrics.upstream_call(operation):
+        yield
 
 
 def _to_responses_input(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -63,7 +118,7 @@ async def stream_chat_completion(
     temperature: Optional[float] = None,
     max_output_tokens: Optional[int] = None,
     vector_store_id: Optional[str] = None,
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[StreamEvent, None]:
     client = _get_client()
 
     merged_system_prompt = system_prompt
@@ -76,13 +131,20 @@ async def stream_chat_completion(
         filtered_messages.append(m)
 
     input_items = _to_responses_input(filtered_messages)
-    full_text = ""
+    text_parts: List[str] = []
+    started = time.monotonic()
+    trace_started = time.perf_counter()
+    connected_at: Optional[float] = None
+    first_event_at: Optional[float] = None
+    first_delta_at: Optional[float] = None
+    last_delta_at: Optional[float] = None
+    deltas = 0
 
     try:
         # Build kwargs and ONLY include supported fields.
         # gpt-5-mini currently rejects temperature -> don't send it.
         kwargs: Dict[str, Any] = {
-            "model": "gpt-5-mini",
+            "model": CHAT_MODEL,
             "input": input_items,
             "instructions": merged_system_prompt,
             "stream": True,
@@ -95,6 +157,9 @@ async def stream_chat_completion(
         if max_output_tokens is not None:
             kwargs["max_output_tokens"] = max_output_tokens
 
+        # Streaming responses: bound the wait for each chunk, not the whole answer.
+        kwargs["timeout"] = _timeout(settings.OPENAI_STREAM_READ_TIMEOUT)
+
         try:
             stream = await client.responses.create(**kwargs)
         except TypeError as exc:
@@ -106,65 +171,187 @@ async def stream_chat_completion(
                     {"type": "file_search", "vector_store_ids": [vector_store_id]}
                 ]
             stream = await client.responses.create(**kwargs)
+        connected_at = time.perf_counter()
+        tracing.record("openai.responses.connect", trace_started, connected_at)
 
         async for event in stream:
+            if first_event_at is None:
+                first_event_at = time.monotonic()
+                metrics.upstream_duration.labels("responses.stream").observe(first_event_at - started)
+                tracing.record("openai.responses.first_event", connected_at, time.perf_counter())
             event_type = getattr(event, "type", None)
 
             if event_type == "response.output_text.delta":
                 delta = getattr(event, "delta", "")
                 if delta:
-                    full_text += delta
-                    yield _sse({"type": "token", "content": delta})
+                    last_delta_at = time.monotonic()
+                    if first_delta_at is None:
+                        first_delta_at = last_delta_at
+                    deltas += 1
+                    metrics.chat_output_tokens.inc()
+                    text_parts.append(delta)
+                    yield StreamEvent(TOKEN, content=delta)
 
             elif event_type == "response.refusal.delta":
                 delta = getattr(event, "delta", "")
                 if delta:
-                    yield _sse({"type": "refusal", "content": delta})
+                    yield StreamEvent(REFUSAL, content=delta)
 
             elif event_type == "response.completed":
                 break
 
-        yield _sse({"type": "done", "content": full_text})
+        load_shedder.record_upstream(True, (first_event_at or time.monotonic()) - started)
+        if deltas > 1 and last_delta_at > first_delta_at:
+            metrics.chat_tokens_per_second.observe((deltas - 1) / (last_delta_at - first_delta_at))
+        tracing.record("openai.responses.stream", trace_started, time.perf_counter(), deltas=deltas)
+        yield StreamEvent(DONE, content="".join(text_parts))
 
     except Exception as e:
-        yield _sse({"type": "error", "message": str(e)})
+        load_shedder.record_upstream(False, time.monotonic() - started)
+        metrics.upstream_errors.labels("responses.stream").inc()
+        tracing.record(
+            "openai.responses.stream", trace_started, time.perf_counter(), error=type(e).__name__, deltas=deltas
+        )
+        yield StreamEvent(ERROR, message=str(e))
+
+
+async def summarize_conversation(
+    messages: List[Dict[str, Any]],
+    previous_summary: Optional[str] = None,
+    *,
+    target_tokens: int = 500,
+) -> str:
+    """
+    Fold `messages` into `previous_summary` and return the updated summary.
+
+    Only the newly dropped turns are sent, so the cost of each refresh stays
+    bounded no matter how long the conversation gets.
+    """
+    client = _get_client()
+
+    transcript = "\n\n".join(
+        f"{item['role']}: {item['content']}" for item in _to_responses_input(messages)
+    )
+    parts: List[str] = []
+    if previous_summary:
+        parts.append(f"Existing summary:\n{previous_summary}")
+    parts.append(f"New messages:\n{transcript}")
+
+    kwargs: Dict[str, Any] = {
+        "model": CHAT_MODEL,
+        "instructions": (
+            "You maintain a running summary of a chat between a user and an assistant. "
+            "Merge the new messages into the existing summary. Keep facts, decisions, "
+            "names, numbers and open questions; drop pleasantries. Reply with the "
+            f"updated summary only, in at most {target_tokens} tokens."
+        ),
+        "input": "\n\n".join(parts),
+        "timeout": _timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+    }
+
+    with _upstream("responses.create"):
+        response = await client.responses.create(**kwargs)
+    return (getattr(response, "output_text", "") or "").strip()
 
 
 async def upload_file_to_openai(
     *,
     filename: str,
-    content: bytes,
+    file: IO[bytes],
     content_type: Optional[str] = None,
     purpose: str = "user_data",
     expires_after_seconds: Optional[int] = None,
 ):
+    """Upload an open binary file handle; it is streamed, not read into memory first."""
     client = _get_client()
 
-    file_param = (filename, content, content_type or "application/octet-stream")
+    file_param = (filename, file, content_type or "application/octet-stream")
 
-    kwargs: Dict[str, Any] = {"file": file_param, "purpose": purpose}
+    kwargs: Dict[str, Any] = {
+        "file": file_param,
+        "purpose": purpose,
+        "timeout": _timeout(settings.OPENAI_UPLOAD_TIMEOUT),
+    }
     if expires_after_seconds is not None:
         kwargs["expires_after"] = {"anchor": "created_at", "seconds": expires_after_seconds}
 
-    return await client.files.create(**kwargs)
+    with _upstream("files.create"):
+        return await client.files.create(**kwargs)
 
 
 async def create_vector_store(*, name: str):
     client = _get_client()
-    return await client.vector_stores.create(name=name)
+    with _upstream("vector_stores.create"):
+        return await client.vector_stores.create(
+            name=name,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
+
+
+async def delete_vector_store(*, vector_store_id: str):
+    client = _get_client()
+    with _upstream("vector_stores.delete"):
+        return await client.vector_stores.delete(
+            vector_store_id,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
+
+
+async def create_embeddings(texts: Sequence[str], *, model: str, dimensions: int) -> List[List[float]]:
+    client = _get_client()
+    with _upstream("embeddings.create"):
+        response = await client.embeddings.create(
+            model=model,
+            input=list(texts),
+            dimensions=dimensions,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
+    return [item.embedding for item in response.data]
 
 
 async def add_file_to_vector_store(*, vector_store_id: str, file_id: str):
     client = _get_client()
-    return await client.vector_stores.files.create(
-        vector_store_id=vector_store_id,
-        file_id=file_id,
-    )
+    with _upstream("vector_stores.files.create"):
+        return await client.vector_stores.files.create(
+            vector_store_id=vector_store_id,
+            file_id=file_id,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
+
+
+async def create_vector_store_file_batch(*, vector_store_id: str, file_ids: List[str]):
+    """Attach many already-uploaded files with one call instead of one per file."""
+    client = _get_client()
+    with _upstream("vector_stores.file_batches.create"):
+        return await client.vector_stores.file_batches.create(
+            vector_store_id=vector_store_id,
+            file_ids=file_ids,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
 
 
 async def get_vector_store_file(*, vector_store_id: str, file_id: str):
     client = _get_client()
-    return await client.vector_stores.files.retrieve(
-        vector_store_id=vector_store_id,
-        file_id=file_id,
-    )
+    with _upstream("vector_stores.files.retrieve"):
+        return await client.vector_stores.files.retrieve(
+            vector_store_id=vector_store_id,
+            file_id=file_id,
+            timeout=_timeout(settings.OPENAI_STATUS_TIMEOUT),
+        )
+
+
+async def delete_file(*, file_id: str):
+    client = _get_client()
+    with _upstream("files.delete"):
+        return await client.files.delete(file_id, timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT))
+
+
+async def remove_file_from_vector_store(*, vector_store_id: str, file_id: str):
+    """Detach a file from a vector store (the file itself is kept)."""
+    client = _get_client()
+    with _upstream("vector_stores.files.delete"):
+        return await client.vector_stores.files.delete(
+            file_id,
+            vector_store_id=vector_store_id,
+            timeout=_timeout(settings.OPENAI_DEFAULT_TIMEOUT),
+        )
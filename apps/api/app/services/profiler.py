@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Task running on each event loop; read from the sampler thread to attribute
+# a sample to a request. Private in asyncio, so request mode degrades to
+# whole-loop sampling if it ever goes away.
+_current_tasks: Optional[Dict] = getattr(asyncio.tasks, "_current_tasks", None)
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running on this worker."""
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    short = filename[len(best):].lstrip("/\\") if best else filename
+    # ';' separates frames in the collapsed format.
+    return short.replace(";", ":")
+
+
+class ProfileSession:
+    """
+    Statistical profiler: a daemon thread reads the event loop thread's
+    stack every `interval` seconds via sys._current_frames() and counts
+    collapsed stacks. Nothing is hooked into the interpreter, so requests
+    (and open SSE streams) run unchanged; each sample holds the GIL for
+    about as long as it takes to walk one stack. CPU-bound code is only
+    interrupted at GIL switches (sys.getswitchinterval(), 5 ms by default),
+    so finer intervals don't buy more resolution there.
+
+    With `request_tasks`, only samples taken while one of those tasks is
+    running on the loop are kept (single-request mode).
+
+    The session is finished (recorded, and the worker freed for the next
+    profile) either when stopped or when the sampler reaches `max_seconds`,
+    whichever comes first; a long SSE stream doesn't hold it open.
+    """
+
+    def __init__(
+        self,
+        *,
+        mode: str,
+        interval: float,
+        max_seconds: float,
+        all_threads: bool = False,
+        lines: bool = False,
+        request_tasks: Optional[weakref.WeakSet] = None,
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.all_threads = all_threads
+        self.lines = lines
+        self.request_tasks = request_tasks
+        self.started_at = datetime.utcnow()
+        self.duration = 0.0
+        self.samples = 0
+        self.skipped = 0
+        self.counts: Counter = Counter()
+        self.finished = False
+        self.on_finish: List[Callable[[], None]] = []
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        line = frame.f_lineno if self.lines else code.co_firstlineno
+        return f"{code.co_name} ({_short_path(code.co_filename)}:{line})"
+
+    def _collapse(self, frame, thread_name: Optional[str]) -> str:
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(self._label(frame))
+            frame = frame.f_back
+        if thread_name:
+            stack.append(thread_name.replace(";", ":"))
+        stack.reverse()
+        return ";".join(stack)
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        deadline = started + self.max_seconds
+        own = threading.get_ident()
+        try:
+            while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+                if self.request_tasks is not None and _current_tasks is not None:
+                    task = _current_tasks.get(self._loop)
+                    if task is None or task not in self.request_tasks:
+                        self.skipped += 1
+                        continue
+                frames = sys._current_frames()
+                if self.all_threads:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                    for ident, frame in frames.items():
+                        if ident != own:
+                            self.counts[self._collapse(frame, names.get(ident, str(ident)))] += 1
+                else:
+                    frame = frames.get(self._loop_thread)
+                    if frame is not None:
+                        self.counts[self._collapse(frame, None)] += 1
+                self.samples += 1
+                del frames
+        except Exception:
+            logger.exception("Profiler %s stopped", self.id)
+        finally:
+            self.duration = time.perf_counter() - started
+            if not self._stop.is_set():
+                # Deadline (or error): finish now rather than when the request ends.
+                try:
+                    self._loop.call_soon_threadsafe(_finish, self)
+                except RuntimeError:
+                    pass  # loop already closed
+
+    def collapsed(self) -> str:
+        """Collapsed stacks ("a;b;c count" per line): flamegraph.pl / speedscope input."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "skipped_samples": self.skipped,
+            "distinct_stacks": len(self.counts),
+        }
+
+
+_active: Optional[ProfileSession] = None
+_finished: Deque[ProfileSession] = deque(maxlen=settings.PROFILER_KEEP)
+
+
+def _begin(session: ProfileSession) -> None:
+    global _active
+    if _active is not None:
+        raise ProfilerBusy(f"Profile {_active.id} is already running")
+    _active = session
+    session.start()
+
+
+def _finish(session: ProfileSession) -> None:
+    """Record the session and free the worker. Runs on the loop; idempotent."""
+    global _active
+    if session.finished:
+        return
+    session.finished = True
+    for callback in session.on_finish:
+        try:
+            callback()
+        except Exception:
+            logger.exception("Profiler %s cleanup failed", session.id)
+    if _active is session:
+        _active = None
+    _finished.append(session)
+
+
+async def _end(session: ProfileSession) -> None:
+    try:
+        # The sampler wakes within one interval; don't block the loop on it.
+        await asyncio.to_thread(session.stop)
+    finally:
+        _finish(session)
+
+
+async def profile_for(
+    seconds: float,
+    *,
+    interval_ms: Optional[float] = None,
+    all_threads: bool = False,
+    lines: bool = False,
+) -> ProfileSession:
+    """Sample the whole worker for `seconds`, then return the finished session."""
+    session = ProfileSession(
+        mode="duration",
+        interval=(interval_ms or settings.PROFILER_INTERVAL_MS) / 1000,
+        max_seconds=seconds,
+        all_threads=all_threads,
+        lines=lines,
+    )
+    _begin(session)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await _end(session)
+    return session
+
+
+def recent() -> List[ProfileSession]:
+    return list(reversed(_finished))
+
+
+def find(profile_id: str) -> Optional[ProfileSession]:
+    for session in list(_finished):
+        if session.id == profile_id:
+            return session
+    return None
+
+
+# Single-request mode
+
+
+_marker: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop, session: ProfileSession) -> None:
+    """
+    While a request is profiled, remember tasks created from its context
+    (the detached chat generation, streaming body, token reads) so their
+    samples count too. Removed as soon as the session finishes.
+    """
+    previous = loop.get_task_factory()
+
+    def factory(loop, coro, context=None):
+        if previous is not None:
+            task = previous(loop, coro) if context is None else previous(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        marked = context.get(_marker) if context is not None else _marker.get()
+        if marked is session:
+            session.request_tasks.add(task)
+        return task
+
+    def uninstall() -> None:
+        if loop.get_task_factory() is factory:
+            loop.set_task_factory(previous)
+
+    loop.set_task_factory(factory)
+    session.on_finish.append(uninstall)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _is_admin_request(scope) -> bool:
+    from app.core.auth import is_admin, verify_token
+
+    authorization = _header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user_id = await asyncio.to_thread(verify_token, token.strip())
+    except Exception:
+        return False
+    return is_admin(user_id)
+
+
+class ProfileRequestMiddleware:
+    """
+    Profile one request when an admin sends `X-Profile: 1`. The response
+    carries X-Profile-Id; the collapsed stacks are then available from
+    GET /api/admin/debug/profiles/{id}. Requests without the header only
+    pay for the header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _header(scope, PROFILE_HEADER.lower().encode()) not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+        # Checked again after the auth await: only one profile runs at a time.
+        if _active is not None or not await _is_admin_request(scope) or _active is not None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(
+            mode="request",
+            interval=settings.PROFILER_INTERVAL_MS / 1000,
+            max_seconds=settings.PROFILER_MAX_SECONDS,
+            request_tasks=weakref.WeakSet(),
+        )
+        session.request_tasks.add(asyncio.current_task())
+        _install_task_factory(asyncio.get_running_loop(), session)
+        token = _marker.set(session)
+        _begin(session)
+        logger.info("Profiling %s %s as %s", scope["method"], scope["path"], session.id)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode(), session.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _marker.reset(token)
+            await _end(session)
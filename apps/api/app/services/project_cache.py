@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Optional, Set, TypeVar
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.database import engine
+from app.services import response_cache
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class ProjectMeta:
+    """The per-project fields every chat turn needs, detached from any session."""
+
+    id: str
+    user_id: str
+    vector_store_id: Optional[str]
+    context_token_budget: Optional[int]
+    response_cache_enabled: bool
+    system_prompt: Optional[str]
+
+
+class TTLCache(Generic[K, V]):
+    """Small LRU + TTL map. Only touched from the event loop, so no locking."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[K, tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+project_meta_cache: TTLCache[str, ProjectMeta] = TTLCache(
+    maxsize=settings.PROJECT_CACHE_SIZE, ttl=settings.PROJECT_CACHE_TTL
+)
+
+# conversation_id -> project_id never changes, so it can outlive the metadata
+# entries; it just lets a chat turn find the right cache entry before querying.
+conversation_project_cache: TTLCache[str, str] = TTLCache(
+    maxsize=settings.PROJECT_CACHE_SIZE * 10, ttl=24 * 3600
+)
+
+
+async def invalidate_project(project_id: str) -> None:
+    """
+    Drop cached metadata and cached answers for a project. Call after the
+    write has committed.
+
+    With PROJECT_CACHE_NOTIFY_CHANNEL set, the other workers are told via
+    Postgres NOTIFY and drop their copies too; without it they keep serving
+    theirs until the TTLs run out.
+    """
+    project_meta_cache.pop(project_id)
+    await response_cache.invalidate_project(project_id)
+
+    channel = settings.PROJECT_CACHE_NOTIFY_CHANNEL
+    if not channel:
+        return
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": channel, "payload": project_id},
+            )
+            await conn.commit()
+    except Exception:
+        # Other workers fall back to the TTL; don't fail the write over it.
+        logger.exception("Failed to publish cache invalidation for project %s", project_id)
+
+
+# Cross-worker invalidation listener
+
+_listener_task: Optional[asyncio.Task] = None
+_pending_drops: Set[asyncio.Task] = set()
+
+
+def _listen_dsn() -> str:
+    url = settings.DATABASE_URL
+    for prefix in ("postgresql+asyncpg://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            return "postgresql://" + url[len(prefix):]
+    return url
+
+
+async def _listen(channel: str) -> None:
+    import asyncpg
+
+    def on_notify(connection, pid, channel, payload):
+        project_meta_cache.pop(payload)
+        task = asyncio.create_task(response_cache.invalidate_project(payload))
+        _pending_drops.add(task)
+        task.add_done_callback(_pending_drops.discard)
+
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(_listen_dsn())
+            closed = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: closed.set())
+            await conn.add_listener(channel, on_notify)
+            backoff = 1.0
+            await closed.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Project cache listener failed; retrying in %.0fs", backoff)
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        # Invalidations may have been missed while disconnected.
+        project_meta_cache.clear()
+        await response_cache.forget_local()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
+
+
+def start_invalidation_listener() -> None:
+    global _listener_task
+    channel = settings.PROJECT_CACHE_NOTIFY_CHANNEL
+    if channel and _listener_task is None:
+        _listener_task = asyncio.create_task(_listen(channel))
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener_task
+    task, _listener_task = _listener_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol, Set, Tuple
+
+from app.core.config import settings
+from app.services.stream_events import DONE, TOKEN, StreamEvent
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ResponseCacheBackend(Protocol):
+    """
+    Storage for cached answers. Keys are already project-scoped hashes; a
+    shared store (Redis, memcached, ...) only needs these three operations.
+    """
+
+    async def get(self, project_id: str, key: str) -> Optional[str]: ...
+
+    async def set(self, project_id: str, key: str, value: str, ttl: float) -> None: ...
+
+    async def invalidate_project(self, project_id: str) -> None: ...
+
+
+class InMemoryResponseCache:
+    """Per-process LRU + TTL backend. Only touched from the event loop."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._by_project: Dict[str, Set[str]] = {}
+
+    async def get(self, project_id: str, key: str) -> Optional[str]:
+        entry = self._entries.get((project_id, key))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove((project_id, key))
+            return None
+        self._entries.move_to_end((project_id, key))
+        return value
+
+    async def set(self, project_id: str, key: str, value: str, ttl: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[(project_id, key)] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end((project_id, key))
+        self._by_project.setdefault(project_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest, _ = self._entries.popitem(last=False)
+            self._forget(oldest)
+
+    async def invalidate_project(self, project_id: str) -> None:
+        for key in self._by_project.pop(project_id, set()):
+            self._entries.pop((project_id, key), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_project.clear()
+
+    def _remove(self, entry_key: Tuple[str, str]) -> None:
+        self._entries.pop(entry_key, None)
+        self._forget(entry_key)
+
+    def _forget(self, entry_key: Tuple[str, str]) -> None:
+        project_id, key = entry_key
+        keys = self._by_project.get(project_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_project[project_id]
+
+
+backend: ResponseCacheBackend = InMemoryResponseCache(maxsize=settings.RESPONSE_CACHE_SIZE)
+
+
+def set_backend(new_backend: ResponseCacheBackend) -> None:
+    global backend
+    backend = new_backend
+
+
+def _normalize(text: Any) -> str:
+    return _WHITESPACE.sub(" ", str(text)).strip()
+
+
+def make_key(
+    *,
+    instructions: Optional[str],
+    messages: List[Dict[str, Any]],
+    vector_store_id: Optional[str],
+    model: str,
+) -> str:
+    """Hash of everything that determines the answer, with whitespace normalized."""
+    material = {
+        "instructions": _normalize(instructions or ""),
+        "input": [[m.get("role"), _normalize(m.get("content", ""))] for m in messages],
+        "vector_store_id": vector_store_id,
+        "model": model,
+    }
+    encoded = json.dumps(material, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+async def get(project_id: str, key: str) -> Optional[str]:
+    return await backend.get(project_id, key)
+
+
+async def store(project_id: str, key: str, text: str) -> None:
+    await backend.set(project_id, key, text, settings.RESPONSE_CACHE_TTL)
+
+
+async def invalidate_project(project_id: str) -> None:
+    """
+    Drop a project's cached answers from this worker's backend. Writes go
+    through project_cache.invalidate_project, which calls this and tells the
+    other workers to do the same.
+    """
+    await backend.invalidate_project(project_id)
+
+
+async def forget_local() -> None:
+    """Drop every answer held in this process, after invalidations may have been missed."""
+    if isinstance(backend, InMemoryResponseCache):
+        backend.clear()
+
+
+def _chunks(text: str, size: int) -> List[str]:
+    # Break after whitespace near `size` characters, like coalesced live frames.
+    chunks: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + 1, end)
+            if space > start:
+                end = space + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+async def replay(text: str) -> AsyncIterator[StreamEvent]:
+    """
+    Emit a cached answer as the same token/done events a live stream produces.
+
+    There is no pacing: frames go out as fast as the client reads them, since
+    holding a finished answer back would only tie up the connection longer.
+    """
+    for chunk in _chunks(text, max(settings.CHAT_STREAM_FLUSH_CHARS, 16)):
+        yield StreamEvent(TOKEN, content=chunk)
+    yield StreamEvent(DONE, content=text)
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Set
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_index import ProjectIndex, drop
+
+logger = logging.getLogger(__name__)
+
+_TEXT_MIME_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/x-yaml",
+    "application/yaml",
+    "application/markdown",
+    "application/x-ndjson",
+}
+_TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".jsonl",
+    ".yaml", ".yml", ".xml", ".html", ".htm", ".log", ".ini", ".toml",
+    ".py", ".js", ".ts", ".tsx", ".java", ".go", ".rs", ".c", ".h", ".cpp", ".sql",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+_READ_CHARS = 1024 * 1024
+_EMBED_BATCH = 256
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    file_id: str
+    text: str
+    score: float
+
+
+# Chunking
+
+
+def iter_chunks(blocks: Iterable[str], *, max_chars: int, overlap: int) -> Iterator[str]:
+    """
+    Split text into chunks of at most `max_chars`, preferring paragraph, then
+    line, then sentence, then word boundaries. Consecutive chunks share up to
+    `overlap` characters so an answer straddling a boundary is still found.
+
+    The text arrives as consecutive `blocks`; only the unchunked tail plus
+    one block is held at a time.
+    """
+    pending = iter(blocks)
+    text = ""
+    start = 0
+    exhausted = False
+    while True:
+        # Buffer a full window past `start` so boundaries are found the same
+        # way as if the whole text were in memory.
+        while not exhausted and len(text) - start <= max_chars:
+            block = next(pending, None)
+            if block is None:
+                exhausted = True
+            else:
+                text = text[start:] + block
+                start = 0
+        if start >= len(text):
+            return
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for sep in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(sep)
+                if cut > max_chars // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        if end >= len(text):
+            return
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary rather than mid-word.
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+
+def chunk_text(text: str, *, max_chars: int, overlap: int) -> List[str]:
+    return list(iter_chunks([text.strip()], max_chars=max_chars, overlap=overlap))
+
+
+def _read_text(path: str) -> Iterator[str]:
+    # Incremental decoding: a multi-byte character split across reads is kept whole.
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        while block := fh.read(_READ_CHARS):
+            yield block
+
+
+def _next_batch(chunks: Iterator[str], size: int) -> List[str]:
+    batch: List[str] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            break
+    return batch
+
+
+def is_indexable(filename: Optional[str], mime_type: Optional[str]) -> bool:
+    if mime_type and (mime_type.startswith("text/") or mime_type in _TEXT_MIME_TYPES):
+        return True
+    return os.path.splitext(filename or "")[1].lower() in _TEXT_EXTENSIONS
+
+
+# Embedders
+
+
+class Embedder(Protocol):
+    dim: int
+    name: str
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+class HashingEmbedder:
+    """
+    Deterministic embedder: signed feature hashing of word unigrams and
+    bigrams, L2-normalized. Weaker than a learned model, but needs no model
+    or network and is stable across runs, which is what tests need.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = [w.lower() for w in _WORD.findall(text)]
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._embed_one(t) for t in texts])
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+        self.name = f"{model}-{dim}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from app.services.openai_service import create_embeddings
+
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), 256):
+            rows.extend(await create_embeddings(texts[start:start + 256], model=self.model, dimensions=self.dim))
+        vectors = np.asarray(rows, dtype=np.float32).reshape(len(rows), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+# Backends
+
+
+class RetrievalBackend(Protocol):
+    """
+    Where project knowledge is searched. The hosted OpenAI file_search tool
+    needs no backend here (it runs inside the model call); anything else
+    indexes uploads itself and has its results injected into the prompt.
+    """
+
+    async def index_file(self, project_id: str, file_id: str, path: str) -> int: ...
+
+    async def remove_file(self, project_id: str, file_id: str) -> None: ...
+
+    async def drop_project(self, project_id: str) -> None: ...
+
+    async def search(self, project_id: str, query: str, top_k: int) -> List[RetrievedChunk]: ...
+
+
+class LocalRetrievalBackend:
+    """
+    Chunk + embed + NumPy index, one memory-mapped index per project under
+    RETRIEVAL_INDEX_DIR. Writes for a project are serialized (an asyncio lock
+    here, a file lock across workers); opening, reading and searching an
+    index run in a worker thread so disk I/O never blocks the event loop.
+    """
+
+    def __init__(self, embedder: Embedder, root: str):
+        self.embedder = embedder
+        # Indexes built with another embedder are not comparable; keep them apart.
+        self.root = os.path.join(root, embedder.name)
+        self._indexes: "OrderedDict[str, ProjectIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _index(self, project_id: str) -> ProjectIndex:
+        index = self._indexes.get(project_id)
+        if index is None:
+            opened = await asyncio.to_thread(ProjectIndex, os.path.join(self.root, project_id), self.embedder.dim)
+            # Another caller may have opened it while we were in the thread.
+            index = self._indexes.setdefault(project_id, opened)
+            # Bound open memmaps; an evicted index is simply reopened from disk.
+            while len(self._indexes) > settings.RETRIEVAL_OPEN_INDEXES:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(project_id)
+            # Other workers append to the same files.
+            await asyncio.to_thread(index.refresh)
+        return index
+
+    def _lock(self, project_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(project_id, asyncio.Lock())
+
+    async def index_file(self, project_id: str, file_id: str, path: str) -> int:
+        """Read, chunk and embed the file at `path` a batch at a time, in a worker thread."""
+        chunks = iter_chunks(
+            _read_text(path),
+            max_chars=settings.RETRIEVAL_CHUNK_CHARS,
+            overlap=settings.RETRIEVAL_CHUNK_OVERLAP,
+        )
+        count = 0
+        try:
+            while batch := await asyncio.to_thread(_next_batch, chunks, _EMBED_BATCH):
+                vectors = await self.embedder.embed(batch)
+                async with self._lock(project_id):
+                    index = await self._index(project_id)
+                    await asyncio.to_thread(index.add, file_id, batch, vectors, count)
+                count += len(batch)
+        except BaseException:
+            if count:
+                # Don't serve half a file.
+                await self.remove_file(project_id, file_id)
+            raise
+        finally:
+            await asyncio.to_thread(chunks.close)
+        if not count:
+            return 0
+        async with self._lock(project_id):
+            index = await self._index(project_id)
+            # Large projects move to IVF + int8; rebuild once enough new
+            # vectors have piled up past the indexed prefix.
+            size, covered = len(index), index.ivf_count
+            threshold = settings.RETRIEVAL_IVF_MIN_VECTORS
+            if threshold > 0 and size >= threshold and size - covered >= max(covered // 5, 1):
+                nlist = max(16, int(size ** 0.5))
+                await asyncio.to_thread(index.build_ivf, nlist)
+        return count
+
+    async def remove_file(self, project_id: str, file_id: str) -> None:
+        async with self._lock(project_id):
+            index = await self._index(project_id)
+            await asyncio.to_thread(index.remove_file, file_id)
+
+    async def drop_project(self, project_id: str) -> None:
+        async with self._lock(project_id):
+            self._indexes.pop(project_id, None)
+            await asyncio.to_thread(drop, os.path.join(self.root, project_id))
+        self._locks.pop(project_id, None)
+
+    async def search(self, project_id: str, query: str, top_k: int) -> List[RetrievedChunk]:
+        index = await self._index(project_id)
+        if not len(index):
+            return []
+        vector = (await self.embedder.embed([query]))[0]
+        hits = await asyncio.to_thread(
+            index.search, vector, top_k, nprobe=settings.RETRIEVAL_IVF_NPROBE
+        )
+        return [
+            RetrievedChunk(file_id=hit.file_id, text=hit.text, score=hit.score)
+            for hit in hits
+            if hit.score >= settings.RETRIEVAL_MIN_SCORE
+        ]
+
+
+def _default_backend() -> Optional[RetrievalBackend]:
+    if settings.RETRIEVAL_BACKEND != "local":
+        return None
+    if settings.RETRIEVAL_EMBEDDER == "openai":
+        embedder: Embedder = OpenAIEmbedder(settings.RETRIEVAL_EMBEDDING_MODEL, settings.RETRIEVAL_EMBEDDING_DIM)
+    else:
+        embedder = HashingEmbedder(settings.RETRIEVAL_EMBEDDING_DIM)
+    return LocalRetrievalBackend(embedder, settings.RETRIEVAL_INDEX_DIR)
+
+
+backend: Optional[RetrievalBackend] = _default_backend()
+
+
+def set_backend(new_backend: Optional[RetrievalBackend]) -> None:
+    global backend
+    backend = new_backend
+
+
+def uses_hosted_file_search() -> bool:
+    return backend is None
+
+
+# Entry points used by the upload paths and the chat turn
+
+_indexing_tasks: Set[asyncio.Task] = set()
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def index_file(
+    project_id: str,
+    file_id: str,
+    filename: Optional[str],
+    mime_type: Optional[str],
+    path: str,
+    *,
+    remove_after: bool = False,
+) -> None:
+    """
+    Feed an uploaded file, read from `path`, to the local index (no-op for the
+    hosted backend). With `remove_after`, `path` is deleted once done.
+    """
+    try:
+        if backend is None:
+            return
+        if not is_indexable(filename, mime_type):
+            logger.info("Not indexing %s locally: unsupported type %s", filename, mime_type)
+            return
+        try:
+            count = await backend.index_file(project_id, file_id, path)
+            logger.info("Indexed %s chunks of %s for project %s", count, filename, project_id)
+        except Exception:
+            logger.exception("Local indexing failed for file %s", file_id)
+    finally:
+        if remove_after:
+            await asyncio.to_thread(_remove_quietly, path)
+
+
+def schedule_index_file(
+    project_id: str,
+    file_id: str,
+    filename: Optional[str],
+    mime_type: Optional[str],
+    path: str,
+    *,
+    remove_after: bool = False,
+) -> None:
+    """Index in the background so an upload request doesn't wait on embedding."""
+    if backend is None:
+        if remove_after:
+            _remove_quietly(path)
+        return
+    task = asyncio.create_task(
+        index_file(project_id, file_id, filename, mime_type, path, remove_after=remove_after)
+    )
+    _indexing_tasks.add(task)
+    task.add_done_callback(_indexing_tasks.discard)
+
+
+async def shutdown() -> None:
+    """Give in-flight background indexing a bounded chance to finish."""
+    tasks = list(_indexing_tasks)
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=settings.RETRIEVAL_SHUTDOWN_TIMEOUT)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def drop_project(project_id: str) -> None:
+    if backend is None:
+        return
+    try:
+        await backend.drop_project(project_id)
+    except Exception:
+        logger.exception("Failed to drop local index for project %s", project_id)
+
+
+async def retrieve(project_id: str, query: str) -> List[RetrievedChunk]:
+    if backend is None:
+        return []
+    try:
+        return await backend.search(project_id, query, settings.RETRIEVAL_TOP_K)
+    except Exception:
+        # Answer without context rather than failing the turn.
+        logger.exception("Local retrieval failed for project %s", project_id)
+        return []
+
+
+def augment_instructions(instructions: Optional[str], chunks: List[RetrievedChunk]) -> Optional[str]:
+    """Append retrieved excerpts to the instructions, the way file_search results would be used."""
+    if not chunks:
+        return instructions
+    excerpts = "\n\n".join(f"[{i}] {chunk.text}" for i, chunk in enumerate(chunks, start=1))
+    context = (
+        "Relevant excerpts from the project's files (use them when they help "
+        "answer; say so if they don't contain the answer):\n\n" + excerpts
+    )
+    return f"{instructions}\n\n{context}" if instructions else context
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class Group(Generic[T]):
+    """
+    Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs `fn`; callers arriving while it is in
+    flight await the same result (or exception). Nothing is remembered once
+    the call finishes, so this de-duplicates overlap, not repeats. Only
+    touched from the event loop, so no locking.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            call = self._calls.get(key)
+            if call is None:
+                break
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+                # The leader was cancelled (e.g. its client went away);
+                # loop around and take over instead of failing too.
+
+        call = asyncio.get_running_loop().create_future()
+        # Mark the exception retrieved even when nobody else was waiting.
+        call.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = call
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is call:
+                del self._calls[key]
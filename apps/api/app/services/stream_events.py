@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Chat stream event types, as seen by the web client.
+START = "start"
+TOKEN = "token"
+REFUSAL = "refusal"
+DONE = "done"
+ERROR = "error"
+RESET = "reset"  # resumed stream lost its place: content is the full text so far
+QUEUED = "queued"  # waiting for an upstream slot: position is the 1-based queue position
+
+
+@dataclass(frozen=True, slots=True)
+class StreamEvent:
+    """
+    One event in the chat pipeline. Services yield these; they are turned
+    into SSE frames exactly once, at the HTTP edge, by `encode_sse`.
+    """
+
+    type: str
+    content: Optional[str] = None
+    message: Optional[str] = None
+    position: Optional[int] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"type": self.type}
+        if self.content is not None:
+            payload["content"] = self.content
+        if self.message is not None:
+            payload["message"] = self.message
+        if self.position is not None:
+            payload["position"] = self.position
+        return payload
+
+
+def encode_sse(event: StreamEvent, event_id: Optional[str] = None) -> str:
+    data = f"data: {json.dumps(event.to_payload(), ensure_ascii=False)}\n\n"
+    if event_id is None:
+        return data
+    return f"id: {event_id}\n{data}"
+
+
+async def coalesce_tokens(
+    events: AsyncIterator[StreamEvent],
+    *,
+    flush_ms: float,
+    flush_chars: int,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Merge consecutive token events into one, flushing after `flush_ms`
+    milliseconds or `flush_chars` characters, whichever comes first.
+
+    The first token is passed through immediately so time-to-first-token is
+    unchanged, and any non-token event flushes the buffer before it. The
+    timer fires even while upstream is silent: the pending read is awaited
+    with a timeout (never cancelled, so the generator isn't disturbed).
+    """
+    if flush_ms <= 0 and flush_chars <= 1:
+        async for event in events:
+            yield event
+        return
+
+    iterator = events.__aiter__()
+    buffer: List[str] = []
+    buffered_chars = 0
+    deadline: Optional[float] = None
+    first_token = True
+    pending: Optional[asyncio.Task] = None
+    loop = asyncio.get_running_loop()
+
+    def flush() -> StreamEvent:
+        nonlocal buffered_chars, deadline
+        event = StreamEvent(TOKEN, content="".join(buffer))
+        buffer.clear()
+        buffered_chars = 0
+        deadline = None
+        return event
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            if deadline is not None:
+                timeout = max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    yield flush()
+                    continue
+
+            try:
+                event = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                if pending.done():
+                    pending = None
+
+            if event.type != TOKEN:
+                if buffer:
+                    yield flush()
+                yield event
+                continue
+
+            if first_token:
+                first_token = False
+                yield event
+                continue
+
+            buffer.append(event.content or "")
+            buffered_chars += len(event.content or "")
+            if deadline is None:
+                deadline = loop.time() + flush_ms / 1000
+            if buffered_chars >= flush_chars:
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
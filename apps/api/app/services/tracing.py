@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_UNTRACED = frozenset({"/health", "/metrics"})
+_NOOP = nullcontext()
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attributes", "error")
+
+    def __init__(self, span_id: str, parent_id: Optional[str], name: str, start: float, attributes: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """
+    Spans of one sampled request, including work it hands to background
+    tasks (the chat generation). The trace is complete once every span,
+    root included, has ended; only then is it published.
+    """
+
+    def __init__(self, trace_id: str, name: str, remote_parent_id: Optional[str] = None):
+        self.trace_id = trace_id
+        self.name = name
+        self.remote_parent_id = remote_parent_id
+        self.started_at_ns = time.time_ns()
+        self.t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.root: Optional[Span] = None
+        self._open = 0
+        self._published = False
+        # Sync dependencies (get_current_user) run in the threadpool.
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Span:
+        span = Span(_new_id(8), parent_id, name, time.perf_counter(), attributes)
+        with self._lock:
+            self._open += 1
+            if len(self.spans) < settings.TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+        return span
+
+    def end_span(self, span: Span, at: Optional[float] = None) -> None:
+        span.end = time.perf_counter() if at is None else at
+        with self._lock:
+            self._open -= 1
+            complete = (
+                self._open == 0 and not self._published and self.root is not None and self.root.end is not None
+            )
+            self._published = self._published or complete
+        if complete:
+            _publish(self)
+
+    @property
+    def duration(self) -> float:
+        ends = [s.end for s in self.spans if s.end is not None]
+        return (max(ends) if ends else time.perf_counter()) - self.t0
+
+    def to_dict(self, *, spans: bool = True) -> Dict[str, Any]:
+        root = self.root
+        data: Dict[str, Any] = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 3),
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped_spans,
+            "status_code": root.attributes.get("http.status_code") if root else None,
+            "error": any(s.error for s in self.spans),
+        }
+        if spans:
+            data["spans"] = [
+                {
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "start_ms": round((s.start - self.t0) * 1000, 3),
+                    "duration_ms": round(((s.end or s.start) - s.start) * 1000, 3),
+                    "attributes": s.attributes,
+                    "error": s.error,
+                }
+                for s in sorted(self.spans, key=lambda s: s.start)
+            ]
+        return data
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+_current: ContextVar[Optional[Tuple[Trace, Span]]] = ContextVar("trace_span", default=None)
+_buffer: Deque[Trace] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+_export_pending: Deque[Trace] = deque(maxlen=max(settings.TRACE_BUFFER_SIZE, 1000))
+_exporter_task: Optional[asyncio.Task] = None
+
+
+def _publish(trace: Trace) -> None:
+    _buffer.append(trace)
+    if settings.TRACE_OTLP_ENDPOINT:
+        _export_pending.append(trace)
+
+
+# Instrumentation API. Everything is a no-op unless the current request was
+# sampled, so unsampled requests pay one ContextVar lookup per call site.
+
+
+def span(name: str, **attributes: Any):
+    """Context manager timing a child of the current span."""
+    current = _current.get()
+    if current is None:
+        return _NOOP
+    return _child(current[0], current[1], name, attributes)
+
+
+@contextmanager
+def _child(trace: Trace, parent: Span, name: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+    child = trace.start_span(name, parent.span_id, attributes)
+    token = _current.set((trace, child))
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        trace.end_span(child)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    current = _current.get()
+    if current is not None:
+        current[1].attributes[key] = value
+
+
+def start(name: str, **attributes: Any) -> Optional[Tuple[Trace, Span]]:
+    """
+    Open a leaf span without making it current, for intervals that don't map
+    to a `with` block (SQLAlchemy cursor events). Close it with `end`.
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    trace, parent = current
+    return trace, trace.start_span(name, parent.span_id, attributes)
+
+
+def end(handle: Optional[Tuple[Trace, Span]], error: Optional[str] = None) -> None:
+    if handle is None:
+        return
+    trace, leaf = handle
+    leaf.error = error
+    trace.end_span(leaf)
+
+
+def record(name: str, started: float, ended: float, error: Optional[str] = None, **attributes: Any) -> None:
+    """
+    Add an already-finished span from perf_counter timestamps. Used inside
+    async generators, where a `with` block would span yields and outlive
+    the context it was entered in.
+    """
+    current = _current.get()
+    if current is None:
+        return
+    trace, parent = current
+    leaf = trace.start_span(name, parent.span_id, attributes)
+    leaf.start = started
+    leaf.error = error
+    trace.end_span(leaf, at=ended)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current[0].trace_id if current else None
+
+
+# Sampling and the request root span
+
+
+def _sample(headers: List[Tuple[bytes, bytes]]) -> Optional[Tuple[str, Optional[str]]]:
+    """(trace_id, remote parent span id) if this request should be traced."""
+    if settings.TRACE_RESPECT_PARENT:
+        for name, value in headers:
+            if name == b"traceparent":
+                match = _TRACEPARENT.match(value.decode("latin-1").strip())
+                if match and int(match.group(3), 16) & 1:
+                    return match.group(1), match.group(2)
+                break
+    rate = settings.TRACE_SAMPLE_RATE
+    if rate > 0 and (rate >= 1 or random.random() < rate):
+        return _new_id(16), None
+    return None
+
+
+class TracingMiddleware:
+    """
+    Head-sample requests and open their root span. A sampled response
+    carries X-Trace-Id, which looks the trace up in /api/admin/debug/traces.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in _UNTRACED:
+            await self.app(scope, receive, send)
+            return
+        sampled = _sample(scope["headers"])
+        if sampled is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, remote_parent = sampled
+        method = scope["method"]
+        trace = Trace(trace_id, f"{method} {scope['path']}", remote_parent)
+        root = trace.start_span(trace.name, remote_parent, {"http.method": method})
+        trace.root = root
+        token = _current.set((trace, root))
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((TRACE_ID_HEADER.lower().encode(), trace_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as exc:
+            root.error = type(exc).__name__
+            raise
+        finally:
+            _current.reset(token)
+            # Name by route template so traces group like the metrics do.
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                trace.name = root.name = f"{method} {route}"
+                root.attributes["http.route"] = route
+            trace.end_span(root)
+
+
+# Ring buffer queries (admin)
+
+
+def recent(limit: int, min_duration_ms: float = 0.0, name: Optional[str] = None) -> List[Trace]:
+    traces = list(_buffer)
+    traces.reverse()
+    out = []
+    for trace in traces:
+        if trace.duration * 1000 < min_duration_ms:
+            continue
+        if name and name not in trace.name:
+            continue
+        out.append(trace)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def find(trace_id: str) -> Optional[Trace]:
+    for trace in list(_buffer):
+        if trace.trace_id == trace_id:
+            return trace
+    return None
+
+
+# OTLP/HTTP (JSON) export, for any OpenTelemetry collector
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    spans = []
+    for trace in traces:
+        for s in trace.spans:
+            start_ns = trace.started_at_ns + int((s.start - trace.t0) * 1e9)
+            end_ns = trace.started_at_ns + int(((s.end or s.start) - trace.t0) * 1e9)
+            otlp_span: Dict[str, Any] = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s is trace.root else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": _otlp_attributes(s.attributes),
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+            }
+            if s.parent_id:
+                otlp_span["parentSpanId"] = s.parent_id
+            spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": settings.TRACE_SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def _otlp_headers() -> Dict[str, str]:
+    headers = {"Content-Type": "application/json"}
+    for pair in settings.TRACE_OTLP_HEADERS.split(","):
+        key, sep, value = pair.partition("=")
+        if sep and key.strip():
+            headers[key.strip()] = value.strip()
+    return headers
+
+
+async def _export_loop() -> None:
+    async with httpx.AsyncClient(timeout=10.0, headers=_otlp_headers()) as client:
+        while True:
+            await asyncio.sleep(settings.TRACE_EXPORT_INTERVAL)
+            await _flush(client)
+
+
+async def _flush(client: httpx.AsyncClient) -> None:
+    batch = []
+    while _export_pending and len(batch) < 100:
+        batch.append(_export_pending.popleft())
+    if not batch:
+        return
+    try:
+        response = await client.post(settings.TRACE_OTLP_ENDPOINT, json=to_otlp(batch))
+        response.raise_for_status()
+    except Exception as exc:
+        # Tracing must never take the API down; the traces stay in the ring buffer.
+        logger.warning("Dropped %s traces: OTLP export failed: %s", len(batch), exc)
+
+
+def start_exporter() -> None:
+    global _exporter_task
+    if settings.TRACE_OTLP_ENDPOINT and _exporter_task is None:
+        _exporter_task = asyncio.create_task(_export_loop())
+
+
+async def stop_exporter() -> None:
+    global _exporter_task
+    task, _exporter_task = _exporter_task, None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    if _export_pending:
+        async with httpx.AsyncClient(timeout=5.0, headers=_otlp_headers()) as client:
+            await _flush(client)
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows; single-process use only
+    fcntl = None
+
+# On-disk layout, one directory per project:
+#   vectors.f32    N x dim float32, L2-normalized, append-only
+#   chunks.jsonl   one JSON object per vector (file_id, ordinal, text)
+#   offsets.i64    byte offset of each vector's line in chunks.jsonl
+#   deleted.json   tombstones: file id -> vector count when it was removed; that
+#                  file's vectors below the count are ignored, so a re-added file
+#                  only serves its new rows
+#   ivf.npz        optional IVF + int8 index over the first `count` vectors
+#   .lock          flock()ed by writers, so uvicorn workers sharing the directory
+#                  don't interleave appends
+VECTORS = "vectors.f32"
+CHUNKS = "chunks.jsonl"
+OFFSETS = "offsets.i64"
+DELETED = "deleted.json"
+IVF = "ivf.npz"
+LOCK = ".lock"
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    score: float
+    file_id: str
+    ordinal: int
+    text: str
+
+
+class _IVF:
+    """
+    Inverted-file index: vectors grouped by nearest k-means centroid, stored as
+    int8 with a per-vector scale. A query scans only the `nprobe` closest
+    lists with the int8 codes, then reranks the best candidates exactly.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, list_offsets: np.ndarray,
+                 codes: np.ndarray, scales: np.ndarray, count: int):
+        self.centroids = centroids
+        self.order = order  # vector ids grouped by list
+        self.list_offsets = list_offsets  # list i spans order[list_offsets[i]:list_offsets[i + 1]]
+        self.codes = codes  # int8 codes, aligned with `order`
+        self.scales = scales
+        self.count = count  # vectors covered; anything after is searched exactly
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "_IVF":
+        count = vectors.shape[0]
+        nlist = max(1, min(nlist, count))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, size=min(count, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assign = np.empty(count, dtype=np.int32)
+        for start in range(0, count, 65536):
+            block = np.asarray(vectors[start:start + 65536])
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+
+        ordered = np.asarray(vectors)[order]
+        scales = np.abs(ordered).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(ordered / scales[:, None]).astype(np.int8)
+        return cls(centroids.astype(np.float32), order, list_offsets, codes, scales.astype(np.float32), count)
+
+    def candidates(self, query: np.ndarray, nprobe: int, limit: int) -> np.ndarray:
+        probes = np.argsort(-(self.centroids @ query))[:nprobe]
+        spans = [np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probes]
+        positions = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+        if positions.size == 0:
+            return positions
+        approx = (self.codes[positions].astype(np.float32) @ query) * self.scales[positions]
+        if positions.size > limit:
+            approx_top = np.argpartition(-approx, limit)[:limit]
+            positions = positions[approx_top]
+        return self.order[positions]
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, order=self.order, list_offsets=self.list_offsets,
+                 codes=self.codes, scales=self.scales, count=np.array(self.count))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "_IVF":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["order"], data["list_offsets"],
+                       data["codes"], data["scales"], int(data["count"]))
+
+
+class ProjectIndex:
+    """
+    Append-only vector index for one project, backed by memory-mapped files
+    so a large project isn't loaded into RAM to be searched.
+
+    Not thread-safe for writers: callers serialize `add`/`remove_file`/
+    `build_ivf` per project within a process, and each write holds an
+    exclusive flock across processes. Searches may run concurrently with
+    each other; `refresh` picks up what other processes wrote.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._vectors: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+        self._deleted: Dict[str, int] = {}
+        self._ivf: Optional[_IVF] = None
+        self._stamp: Tuple[int, int, int] = (0, 0, 0)
+        self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK), "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            # Another process may have appended since we last looked.
+            self.refresh()
+            yield
+
+    def _current_stamp(self) -> Tuple[int, int, int]:
+        def stat(name: str, attr: str) -> int:
+            try:
+                return getattr(os.stat(self._path(name)), attr)
+            except FileNotFoundError:
+                return 0
+
+        return (stat(VECTORS, "st_size"), stat(DELETED, "st_mtime_ns"), stat(IVF, "st_mtime_ns"))
+
+    def refresh(self) -> None:
+        """Reopen if another process appended vectors, tombstoned a file or rebuilt the IVF."""
+        if self._current_stamp() != self._stamp:
+            self._open()
+
+    def _open(self) -> None:
+        self._stamp = self._current_stamp()
+        self._vectors = self._offsets = None
+        self._deleted = {}
+        vectors_path = self._path(VECTORS)
+        if os.path.exists(vectors_path):
+            count = os.path.getsize(vectors_path) // (4 * self.dim)
+            if count:
+                self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+                self._offsets = np.memmap(self._path(OFFSETS), dtype=np.int64, mode="r", shape=(count,))
+        if os.path.exists(self._path(DELETED)):
+            with open(self._path(DELETED)) as fh:
+                deleted = json.load(fh)
+            if isinstance(deleted, list):
+                # Older plain list of ids: everything written so far is gone.
+                deleted = dict.fromkeys(deleted, len(self))
+            self._deleted = deleted
+        self._ivf = _IVF.load(self._path(IVF)) if os.path.exists(self._path(IVF)) else None
+
+    def __len__(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    @property
+    def ivf_count(self) -> int:
+        return self._ivf.count if self._ivf is not None else 0
+
+    def add(self, file_id: str, texts: Sequence[str], vectors: np.ndarray, first_ordinal: int = 0) -> None:
+        if not len(texts):
+            return
+        with self._write_lock():
+            self._append(file_id, texts, vectors, first_ordinal)
+
+    def _append(self, file_id: str, texts: Sequence[str], vectors: np.ndarray, first_ordinal: int) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._truncate_partial_writes()
+        chunks_path = self._path(CHUNKS)
+        position = os.path.getsize(chunks_path) if os.path.exists(chunks_path) else 0
+        offsets = []
+        with open(chunks_path, "ab") as fh:
+            for ordinal, text in enumerate(texts, start=first_ordinal):
+                line = json.dumps({"file_id": file_id, "ordinal": ordinal, "text": text},
+                                  ensure_ascii=False).encode() + b"\n"
+                offsets.append(position)
+                fh.write(line)
+                position += len(line)
+        # Offsets before vectors: the vector file's length defines the count,
+        # so a crash in between leaves unreferenced text, never a dangling vector.
+        with open(self._path(OFFSETS), "ab") as fh:
+            fh.write(np.asarray(offsets, dtype=np.int64).tobytes())
+        with open(self._path(VECTORS), "ab") as fh:
+            fh.write(vectors.tobytes())
+        self._open()
+
+    def _truncate_partial_writes(self) -> None:
+        # The vector file defines the count; drop anything an interrupted
+        # append left beyond it so new rows stay aligned.
+        count = len(self)
+        for name, size in ((VECTORS, count * 4 * self.dim), (OFFSETS, count * 8)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def remove_file(self, file_id: str) -> None:
+        with self._write_lock():
+            self._deleted[file_id] = len(self)
+            self._write_deleted()
+
+    def _write_deleted(self) -> None:
+        tmp = self._path(DELETED) + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._deleted, fh, sort_keys=True)
+        os.replace(tmp, self._path(DELETED))
+        self._stamp = self._current_stamp()
+
+    def build_ivf(self, nlist: int) -> None:
+        with self._write_lock():
+            if self._vectors is None:
+                return
+            ivf = _IVF.build(self._vectors, nlist)
+            ivf.save(self._path(IVF))
+            self._ivf = ivf
+            self._stamp = self._current_stamp()
+
+    @staticmethod
+    def _chunk(fh: IO[bytes], offsets: np.ndarray, vector_id: int) -> Dict[str, object]:
+        fh.seek(int(offsets[vector_id]))
+        return json.loads(fh.readline())
+
+    def search(self, query: np.ndarray, top_k: int, *, nprobe: int = 8, rerank: int = 4) -> List[SearchHit]:
+        # Work on a consistent snapshot; a concurrent `add` swaps these out.
+        vectors, offsets, ivf, deleted = self._vectors, self._offsets, self._ivf, self._deleted
+        if vectors is None or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        count = vectors.shape[0]
+
+        if ivf is not None:
+            # Approximate over the indexed prefix, exact over what was added since.
+            ids = np.concatenate([
+                ivf.candidates(query, nprobe, top_k * rerank),
+                np.arange(ivf.count, count, dtype=np.int64),
+            ])
+            ids = np.sort(ids)  # memmap fancy indexing reads sequentially
+            scores = vectors[ids] @ query if ids.size else np.empty(0, dtype=np.float32)
+        else:
+            ids = np.arange(count, dtype=np.int64)
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, 65536):
+                scores[start:start + 65536] = vectors[start:start + 65536] @ query
+
+        hits: List[SearchHit] = []
+        if ids.size == 0:
+            return hits
+        # Over-fetch so tombstoned files can be dropped without a second pass.
+        want = min(ids.size, top_k + 32 if deleted else top_k)
+        best = np.argpartition(-scores, want - 1)[:want] if want < ids.size else np.arange(ids.size)
+        with open(self._path(CHUNKS), "rb") as fh:
+            for i in best[np.argsort(-scores[best])]:
+                vector_id = int(ids[i])
+                chunk = self._chunk(fh, offsets, vector_id)
+                if vector_id < deleted.get(chunk["file_id"], 0):
+                    continue
+                hits.append(SearchHit(float(scores[i]), chunk["file_id"], chunk["ordinal"], chunk["text"]))
+                if len(hits) == top_k:
+                    break
+        return hits
+
+
+def drop(directory: str) -> None:
+    shutil.rmtree(directory, ignore_errors=True)
+
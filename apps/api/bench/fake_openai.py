@@ -0,0 +1,260 @@
+"""
+A fake OpenAI-compatible provider for benchmarks.
+
+Implements just the endpoints openai_service uses: streaming and
+non-streaming Responses, Files, Vector Stores (+ files and file batches) and
+Embeddings. Chat answers are streamed word by word at a configurable rate
+after a configurable time-to-first-token, so the API can be load-tested
+without paying for completions.
+
+    python -m bench.fake_openai --port 8100 --first-token-ms 300 --tokens-per-second 60
+
+then start the API with OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import UploadFile
+
+_WORDS = (
+    "the quick brown fox jumps over a lazy dog while several distant engines "
+    "hum quietly and bright lanterns sway above narrow stone streets at dusk"
+).split()
+
+
+@dataclass
+class FakeProviderConfig:
+    first_token_ms: float = 300.0
+    tokens_per_second: float = 60.0
+    tokens: int = 200
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0
+    upload_latency_ms: float = 50.0
+    vector_store_latency_ms: float = 20.0
+    seed: int = 0
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _answer(count: int, rng: random.Random) -> List[str]:
+    return [rng.choice(_WORDS) + " " for _ in range(count)]
+
+
+def _response_object(response_id: str, text: str, status: str = "completed") -> Dict[str, Any]:
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": _now(),
+        "status": status,
+        "model": "fake",
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{response_id}",
+                "role": "assistant",
+                "status": status,
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+def create_app(config: FakeProviderConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI provider")
+    rng = random.Random(config.seed)
+    app.state.config = config
+
+    async def pause(ms: float) -> None:
+        delay = max(0.0, ms + rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+    def failed() -> bool:
+        return config.error_rate > 0 and rng.random() < config.error_rate
+
+    def server_error() -> JSONResponse:
+        return JSONResponse(
+            {"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500
+        )
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        if failed():
+            return server_error()
+        response_id = f"resp_{uuid.uuid4().hex[:12]}"
+        parts = _answer(config.tokens, rng)
+
+        if not body.get("stream"):
+            await pause(config.first_token_ms + 1000 * len(parts) / max(config.tokens_per_second, 1e-9))
+            return _response_object(response_id, "".join(parts))
+
+        async def events() -> AsyncIterator[bytes]:
+            def frame(payload: Dict[str, Any]) -> bytes:
+                return f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode()
+
+            seq = 0
+            yield frame({"type": "response.created", "sequence_number": seq,
+                         "response": _response_object(response_id, "", "in_progress")})
+            await pause(config.first_token_ms)
+            interval_ms = 1000 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+            for part in parts:
+                seq += 1
+                yield frame({"type": "response.output_text.delta", "sequence_number": seq,
+                             "item_id": f"msg_{response_id}", "output_index": 0,
+                             "content_index": 0, "delta": part, "logprobs": []})
+                if interval_ms:
+                    await pause(interval_ms)
+            yield frame({"type": "response.completed", "sequence_number": seq + 1,
+                         "response": _response_object(response_id, "".join(parts))})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/files")
+    async def create_file(request: Request):
+        form = await request.form()
+        upload = form.get("file")
+        size = 0
+        if isinstance(upload, UploadFile):
+            size = len(await upload.read())
+        await pause(config.upload_latency_ms)
+        if failed():
+            return server_error()
+        return {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": size,
+            "created_at": _now(),
+            "filename": getattr(upload, "filename", None) or "upload",
+            "purpose": form.get("purpose") or "user_data",
+            "status": "processed",
+        }
+
+    @app.delete("/v1/files/{file_id}")
+    async def delete_file(file_id: str):
+        return {"id": file_id, "object": "file", "deleted": True}
+
+    def vector_store(vector_store_id: str, name: str = "") -> Dict[str, Any]:
+        return {
+            "id": vector_store_id,
+            "object": "vector_store",
+            "created_at": _now(),
+            "name": name,
+            "status": "completed",
+            "usage_bytes": 0,
+            "last_active_at": _now(),
+            "metadata": {},
+            "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+        }
+
+    def vector_store_file(vector_store_id: str, file_id: str) -> Dict[str, Any]:
+        return {
+            "id": file_id,
+            "object": "vector_store.file",
+            "created_at": _now(),
+            "vector_store_id": vector_store_id,
+            "status": "completed",
+            "usage_bytes": 0,
+            "last_error": None,
+        }
+
+    @app.post("/v1/vector_stores")
+    async def create_vector_store(request: Request):
+        body = await request.json()
+        await pause(config.vector_store_latency_ms)
+        return vector_store(f"vs_{uuid.uuid4().hex[:24]}", body.get("name", ""))
+
+    @app.delete("/v1/vector_stores/{vector_store_id}")
+    async def delete_vector_store(vector_store_id: str):
+        return {"id": vector_store_id, "object": "vector_store.deleted", "deleted": True}
+
+    @app.post("/v1/vector_stores/{vector_store_id}/files")
+    async def attach_file(vector_store_id: str, request: Request):
+        body = await request.json()
+        await pause(config.vector_store_latency_ms)
+        return vector_store_file(vector_store_id, body["file_id"])
+
+    @app.get("/v1/vector_stores/{vector_store_id}/files/{file_id}")
+    async def get_file(vector_store_id: str, file_id: str):
+        return vector_store_file(vector_store_id, file_id)
+
+    @app.delete("/v1/vector_stores/{vector_store_id}/files/{file_id}")
+    async def detach_file(vector_store_id: str, file_id: str):
+        return {"id": file_id, "object": "vector_store.file.deleted", "deleted": True}
+
+    @app.post("/v1/vector_stores/{vector_store_id}/file_batches")
+    async def attach_batch(vector_store_id: str, request: Request):
+        body = await request.json()
+        await pause(config.vector_store_latency_ms)
+        count = len(body.get("file_ids", []))
+        return {
+            "id": f"vsfb_{uuid.uuid4().hex[:24]}",
+            "object": "vector_store.files_batch",
+            "created_at": _now(),
+            "vector_store_id": vector_store_id,
+            "status": "completed",
+            "file_counts": {"in_progress": 0, "completed": count, "failed": 0, "cancelled": 0, "total": count},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = int(body.get("dimensions") or 256)
+        data = []
+        for i, text in enumerate(inputs):
+            # Deterministic pseudo-embedding per input text.
+            seed = int.from_bytes(hashlib.sha256(str(text).encode()).digest()[:8], "little")
+            local = random.Random(seed)
+            data.append({"object": "embedding", "index": i,
+                         "embedding": [local.uniform(-1, 1) for _ in range(dim)]})
+        return {"object": "list", "data": data, "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "config": asdict(config)}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser, prefix: str = "") -> None:
+    defaults = FakeProviderConfig()
+    for name, value in asdict(defaults).items():
+        flag = "--" + prefix + name.replace("_", "-")
+        parser.add_argument(flag, type=type(value), default=value, dest=name)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeProviderConfig:
+    return FakeProviderConfig(**{name: getattr(args, name) for name in asdict(FakeProviderConfig())})
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,529 @@
+"""
+Benchmark harness for the API, against a fake streaming provider.
+
+Starts the fake provider and the API (uvicorn) as subprocesses, creates a
+bench user/project through the API, runs the selected scenarios and writes
+machine-readable results:
+
+    cd apps/api
+    DATABASE_URL=postgresql://... python -m bench.run --scenarios chat,messages,upload \\
+        --concurrency 50 --requests 200 --output bench-results.json
+
+    # later, fail (exit 1) if any tracked percentile regressed by more than 15%
+    python -m bench.run ... --compare bench-results.json --tolerance 0.15
+
+Scenarios:
+    chat      N concurrent POST /conversations/{id}/chat streams
+              (TTFT, inter-token latency, stream duration, tokens/s)
+    messages  list_messages on a conversation seeded with --history messages,
+              following X-Next-Cursor for --pages pages
+    upload    files.upload_file with unique random payloads
+
+Every scenario reports p50/p95/p99 latencies, throughput, error counts and
+SQL statements per request (from X-DB-Queries; the spawned API runs with
+DB_QUERY_COUNT_HEADER=true). The header goes out with the response start, so
+for chat it only covers the statements before the stream opened and is
+reported as db_queries_pre_stream. Point --api-url at an already running API to
+skip spawning; its CLERK_PEM_PUBLIC_KEY must match --private-key.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.fake_openai import add_arguments as add_provider_arguments
+from bench.fake_openai import config_from_args
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upstream admission limits are per user and the harness is one user, so the
+# spawned API gets them lifted; override with --api-env to measure them.
+SPAWNED_API_ENV = {
+    "DB_QUERY_COUNT_HEADER": "true",
+    "LLM_USER_MAX_CONCURRENCY": "100000",
+    "LLM_PROJECT_MAX_CONCURRENCY": "100000",
+    "LLM_MAX_CONCURRENCY": "100000",
+    "LLM_USER_RATE_PER_MINUTE": "0",
+    "LLM_USER_MAX_QUEUED": "100000",
+    "LOAD_SHED_ENABLED": "false",
+    "ALLOWED_ORIGINS": "http://localhost",
+}
+
+# (scenario, metric, stat) triples compared by --compare; higher is worse.
+TRACKED = [
+    ("chat", "ttft_ms", "p50"), ("chat", "ttft_ms", "p95"), ("chat", "ttft_ms", "p99"),
+    ("chat", "inter_token_ms", "p95"), ("chat", "duration_ms", "p95"),
+    ("messages", "latency_ms", "p50"), ("messages", "latency_ms", "p95"), ("messages", "latency_ms", "p99"),
+    ("upload", "latency_ms", "p50"), ("upload", "latency_ms", "p95"), ("upload", "latency_ms", "p99"),
+]
+
+
+# Statistics
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = p / 100 * (len(sorted_values) - 1)
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(percentile(ordered, 50), 3),
+        "p95": round(percentile(ordered, 95), 3),
+        "p99": round(percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.requests = 0
+
+    def add(self, metric: str, value: float) -> None:
+        self.samples.setdefault(metric, []).append(value)
+
+    def extend(self, metric: str, values: List[float]) -> None:
+        self.samples.setdefault(metric, []).extend(values)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def result(self, wall_seconds: float, **extra: Any) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput_rps": round(self.requests / wall_seconds, 3) if wall_seconds else 0.0,
+            **{metric: summarize(values) for metric, values in sorted(self.samples.items())},
+            **extra,
+        }
+
+
+def record_queries(recorder: Recorder, response: httpx.Response, metric: str = "db_queries") -> None:
+    count = response.headers.get("x-db-queries")
+    if count is not None:
+        recorder.add(metric, float(count))
+
+
+async def run_concurrently(concurrency: int, total: int, job: Callable[[int], Any]) -> float:
+    """Run `job(i)` for i in range(total) with at most `concurrency` in flight; return wall time."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker() -> None:
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await job(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    return time.perf_counter() - started
+
+
+# Auth
+
+
+def generate_keypair() -> Tuple[str, str]:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return private_pem, public_pem
+
+
+def issue_token(private_pem: str, user_id: str) -> str:
+    from jose import jwt
+
+    now = int(time.time())
+    return jwt.encode({"sub": user_id, "iat": now, "exp": now + 6 * 3600}, private_pem, algorithm="RS256")
+
+
+# Processes
+
+
+def spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(args, cwd=API_DIR, env={**os.environ, **env}, start_new_session=True)
+
+
+def stop(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+async def wait_healthy(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with {process.returncode} during startup")
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not become healthy in {timeout:.0f}s")
+
+
+# Setup
+
+
+async def create_project(client: httpx.AsyncClient) -> str:
+    response = await client.post("/api/projects", json={"name": f"bench-{uuid.uuid4().hex[:8]}"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def create_conversation(client: httpx.AsyncClient, project_id: str) -> str:
+    response = await client.post(f"/api/projects/{project_id}/conversations", json={"title": "bench"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def seed_history(conversation_id: str, count: int) -> None:
+    """Insert `count` messages straight into the database (much faster than chatting)."""
+    from sqlalchemy import insert
+
+    from app.db.database import SessionLocal, engine
+    from app.db.models import Message
+
+    rng = random.Random(0)
+    start = datetime.utcnow() - timedelta(seconds=count)
+    rows = [
+        {
+            "conversation_id": conversation_id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(("alpha", "beta", "gamma", "delta")) for _ in range(40)),
+            "token_count": 44,
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    async with SessionLocal() as db:
+        for offset in range(0, len(rows), 1000):
+            await db.execute(insert(Message), rows[offset:offset + 1000])
+        await db.commit()
+    await engine.dispose()
+
+
+# Scenarios
+
+
+async def scenario_chat(client: httpx.AsyncClient, project_id: str, args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    conversations = await asyncio.gather(
+        *(create_conversation(client, project_id) for _ in range(args.concurrency))
+    )
+
+    async def one_turn(i: int) -> None:
+        conversation_id = conversations[i % len(conversations)]
+        recorder.requests += 1
+        frames: List[float] = []
+        tokens = 0
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        try:
+            async with client.stream(
+                "POST",
+                f"/api/conversations/{conversation_id}/chat",
+                json={"message": f"bench turn {i} {uuid.uuid4().hex[:6]}"},
+                timeout=httpx.Timeout(args.timeout),
+            ) as response:
+                if response.status_code != 200:
+                    recorder.error(f"http_{response.status_code}")
+                    return
+                # Persistence happens after the headers are sent; not counted.
+                record_queries(recorder, response, "db_queries_pre_stream")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    now = time.perf_counter()
+                    if event["type"] == "token":
+                        if first_token is None:
+                            first_token = now
+                        frames.append(now)
+                        tokens += len(event.get("content", "").split())
+                    elif event["type"] == "queued":
+                        recorder.add("queued_position", float(event.get("position", 0)))
+                    elif event["type"] == "error":
+                        recorder.error("stream_error")
+                        return
+                    elif event["type"] == "done":
+                        break
+        except httpx.HTTPError as e:
+            recorder.error(type(e).__name__)
+            return
+
+        finished = time.perf_counter()
+        if first_token is None:
+            recorder.error("no_tokens")
+            return
+        recorder.add("ttft_ms", (first_token - started) * 1000)
+        recorder.add("duration_ms", (finished - started) * 1000)
+        recorder.extend("inter_frame_ms", [(b - a) * 1000 for a, b in zip(frames, frames[1:])])
+        if tokens > 1 and frames[-1] > first_token:
+            recorder.add("inter_token_ms", (frames[-1] - first_token) * 1000 / (tokens - 1))
+            recorder.add("tokens_per_second", tokens / (frames[-1] - first_token))
+
+    wall = await run_concurrently(args.concurrency, args.requests, one_turn)
+    return recorder.result(wall, concurrency=args.concurrency)
+
+
+async def scenario_messages(client: httpx.AsyncClient, project_id: str, args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    conversation_id = await create_conversation(client, project_id)
+    await seed_history(conversation_id, args.history)
+
+    async def one_walk(i: int) -> None:
+        cursor: Optional[str] = None
+        for _ in range(args.pages):
+            params: Dict[str, Any] = {"limit": args.page_size}
+            if cursor:
+                params["cursor"] = cursor
+            recorder.requests += 1
+            started = time.perf_counter()
+            try:
+                response = await client.get(f"/api/conversations/{conversation_id}/messages", params=params)
+            except httpx.HTTPError as e:
+                recorder.error(type(e).__name__)
+                return
+            recorder.add("latency_ms", (time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                recorder.error(f"http_{response.status_code}")
+                return
+            record_queries(recorder, response)
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                return
+
+    wall = await run_concurrently(args.concurrency, args.requests, one_walk)
+    return recorder.result(wall, history=args.history, page_size=args.page_size, pages=args.pages)
+
+
+async def scenario_upload(client: httpx.AsyncClient, project_id: str, args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+
+    async def one_upload(i: int) -> None:
+        payload = os.urandom(args.upload_bytes)  # unique content, so dedup never short-circuits
+        recorder.requests += 1
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                f"/api/projects/{project_id}/files",
+                files={"file": (f"bench-{i}.bin", payload, "application/octet-stream")},
+                timeout=httpx.Timeout(args.timeout),
+            )
+        except httpx.HTTPError as e:
+            recorder.error(type(e).__name__)
+            return
+        recorder.add("latency_ms", (time.perf_counter() - started) * 1000)
+        if response.status_code != 201:
+            recorder.error(f"http_{response.status_code}")
+            return
+        record_queries(recorder, response)
+
+    concurrency = min(args.concurrency, args.upload_concurrency)
+    wall = await run_concurrently(concurrency, args.upload_requests, one_upload)
+    return recorder.result(wall, concurrency=concurrency, upload_bytes=args.upload_bytes)
+
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "messages": scenario_messages,
+    "upload": scenario_upload,
+}
+
+
+# Comparison
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    regressions = []
+    for scenario, metric, stat in TRACKED:
+        current = results["scenarios"].get(scenario, {}).get(metric, {}).get(stat)
+        previous = baseline.get("scenarios", {}).get(scenario, {}).get(metric, {}).get(stat)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        if change > tolerance:
+            regressions.append({
+                "scenario": scenario, "metric": metric, "stat": stat,
+                "baseline": previous, "current": current, "change": round(change, 4),
+            })
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=API_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Main
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="chat,messages,upload")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="chat turns / message-list walks")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--history", type=int, default=5000, help="messages seeded for the messages scenario")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--upload-requests", type=int, default=50)
+    parser.add_argument("--upload-concurrency", type=int, default=10)
+    parser.add_argument("--upload-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--api-url", help="use a running API instead of spawning one")
+    parser.add_argument("--api-port", type=int, default=8200)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--api-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra settings for the spawned API (repeatable)")
+    parser.add_argument("--provider-port", type=int, default=8100)
+    parser.add_argument("--private-key", help="PEM used to sign bench tokens (required with --api-url)")
+    parser.add_argument("--user-id", default="user_bench")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline results JSON; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    add_provider_arguments(parser, prefix="provider-")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    provider_config = config_from_args(args)
+    provider = api = None
+    if args.api_url:
+        if not args.private_key:
+            raise SystemExit("--private-key is required with --api-url")
+        with open(args.private_key) as fh:
+            private_pem = fh.read()
+        base_url = args.api_url.rstrip("/")
+    else:
+        if not os.environ.get("DATABASE_URL"):
+            raise SystemExit("DATABASE_URL must point at a migrated database")
+        private_pem, public_pem = generate_keypair()
+        provider_args = [sys.executable, "-m", "bench.fake_openai", "--port", str(args.provider_port)]
+        for name, value in vars(provider_config).items():
+            provider_args += ["--" + name.replace("_", "-"), str(value)]
+        provider = spawn(provider_args, {})
+        api_env = {
+            **SPAWNED_API_ENV,
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.provider_port}/v1",
+            "CLERK_PEM_PUBLIC_KEY": public_pem,
+            **dict(item.split("=", 1) for item in args.api_env),
+        }
+        api = spawn(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port),
+             "--workers", str(args.api_workers), "--log-level", "warning"],
+            api_env,
+        )
+        base_url = f"http://127.0.0.1:{args.api_port}"
+
+    # The seeding helper imports app settings in this process.
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("CLERK_PEM_PUBLIC_KEY", "unused")
+
+    try:
+        if provider is not None:
+            await wait_healthy(f"http://127.0.0.1:{args.provider_port}/health", provider)
+            await wait_healthy(f"{base_url}/health", api)
+
+        token = issue_token(private_pem, args.user_id)
+        limits = httpx.Limits(max_connections=args.concurrency + 10, max_keepalive_connections=args.concurrency + 10)
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token}"},
+            limits=limits,
+            timeout=httpx.Timeout(30.0),
+        ) as client:
+            project_id = await create_project(client)
+            results: Dict[str, Any] = {
+                "meta": {
+                    "timestamp": datetime.utcnow().isoformat() + "Z",
+                    "git_revision": git_revision(),
+                    "python": platform.python_version(),
+                    "api_url": base_url,
+                    "api_workers": None if args.api_url else args.api_workers,
+                    "provider": vars(provider_config),
+                },
+                "scenarios": {},
+            }
+            for name in scenarios:
+                print(f"running {name}...", file=sys.stderr)
+                results["scenarios"][name] = await SCENARIOS[name](client, project_id, args)
+            await client.delete(f"/api/projects/{project_id}")
+    finally:
+        stop(api)
+        stop(provider)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        results["regressions"] = compare(results, baseline, args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,15 +1,86 @@
-from fastapi import FastAPI
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import projects, prompts, conversations, messages, chat, files
+from app.api import projects, prompts, conversations, messages, chat, files, admin
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.core.auth import get_verification_key
+from app.db.database import engine
+from app.services import (
+    chat_generation,
+    context_service,
+    ingestion_poller,
+    ingestion_queue,
+    load_shedder,
+    message_writer,
+    metrics,
+    openai_service,
+    profiler,
+    project_cache,
+    retrieval,
+    tracing,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_verification_key()
+    await asyncio.to_thread(context_service.warm_up)
+    load_shedder.start_monitor()
+    await openai_service.init_client()
+    project_cache.start_invalidation_listener()
+    ingestion_poller.start_poller()
+    ingestion_queue.start_workers()
+    message_writer.start_writer()
+    tracing.start_exporter()
+    try:
+        yield
+    finally:
+        await chat_generation.shutdown()
+        await context_service.shutdown()
+        await message_writer.stop_writer()
+        await retrieval.shutdown()
+        await ingestion_queue.stop_workers()
+        await ingestion_poller.stop_poller()
+        await project_cache.stop_invalidation_listener()
+        await openai_service.close_client()
+        await load_shedder.stop_monitor()
+        await tracing.stop_exporter()
+        await engine.dispose()
+
 
 app = FastAPI(
     title="Chatbot Platform API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+# Response headers the browser client may read
+expose_headers = [NEXT_CURSOR_HEADER, "Retry-After", tracing.TRACE_ID_HEADER, profiler.PROFILE_ID_HEADER]
+
+# Per-request SQL statement counts, for benchmarks (off by default)
+if settings.DB_QUERY_COUNT_HEADER:
+    from app.db.query_count import QUERY_COUNT_HEADER, QueryCountMiddleware
+
+    app.add_middleware(QueryCountMiddleware)
+    expose_headers.append(QUERY_COUNT_HEADER)
+
+# Load shedding: refuse new chat/upload work early when this worker is overloaded.
+# Added before CORS so the 503 still carries CORS headers.
+app.add_middleware(load_shedder.LoadSheddingMiddleware)
+
+# Sampled request traces (see /api/admin/debug/traces)
+app.add_middleware(tracing.TracingMiddleware)
+
+# Admin-only per-request profiling via the X-Profile header
+if settings.PROFILER_ENABLED:
+    app.add_middleware(profiler.ProfileRequestMiddleware)
+
 # CORS
 origins = settings.ALLOWED_ORIGINS.split(",")
 app.add_middleware(
@@ -18,8 +89,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=expose_headers,
 )
 
+# Prometheus request metrics; outermost, so shed and CORS-rejected requests count too
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(projects.router, prefix="/api")
 app.include_router(prompts.router, prefix="/api")
@@ -27,6 +103,7 @@ app.include_router(conversations.router, prefix="/api")
 app.include_router(messages.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
 app.include_router(files.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.get("/")
 def root():
@@ -34,4 +111,16 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(authorization: str | None = Header(None)):
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
\ No newline at end of file
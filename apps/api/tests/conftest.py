@@ -0,0 +1,6 @@
+import os
+
+# Settings are read at import time; the tests never reach these services.
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CLERK_PEM_PUBLIC_KEY", "test")
@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime
+
+from app.services import chat_generation, load_shedder
+
+
+def test_generation_cancelled_before_it_runs_leaves_no_stream_counted():
+    async def run():
+        generation = chat_generation.start_generation(
+            conversation_id="c1",
+            user_id="u1",
+            messages=[],
+            system_prompt=None,
+            vector_store_id=None,
+            user_message="hi",
+            user_message_at=datetime(2024, 1, 1),
+        )
+        generation.task.cancel()
+        await asyncio.gather(generation.task, return_exceptions=True)
+        return load_shedder._streams_in_flight
+
+    before = load_shedder._streams_in_flight
+    assert asyncio.run(run()) == before
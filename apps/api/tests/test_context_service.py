@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.db.models import Conversation, Message
+from app.services import context_service
+from app.services.project_cache import ProjectMeta
+
+
+def _history(turns):
+    start = datetime(2024, 1, 1)
+    return [
+        Message(
+            conversation_id="c1",
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"message {i} " + "word " * 50,
+            created_at=start + timedelta(seconds=i),
+        )
+        for i in range(turns)
+    ]
+
+
+def _project(budget):
+    return ProjectMeta(
+        id="p1",
+        user_id="u1",
+        vector_store_id=None,
+        context_token_budget=budget,
+        response_cache_enabled=False,
+        system_prompt=None,
+    )
+
+
+def _build(history, budget, instructions=None):
+    conversation = Conversation(id="c1", summary="Earlier: the user likes tea.")
+    return asyncio.run(
+        context_service.build_context(
+            None, conversation, _project(budget), "next question", history, instructions=instructions
+        )
+    )
+
+
+def test_overflow_is_answered_without_waiting_for_a_summary(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("summarized on the request path")
+
+    monkeypatch.setattr(context_service, "summarize_conversation", fail)
+    history = _history(20)
+    context = _build(history, budget=600)
+
+    assert context.summary == "Earlier: the user likes tea."
+    refresh = context.summary_refresh
+    assert refresh is not None
+    assert refresh.through == history[len(refresh.messages) - 1].created_at
+    assert len(context.messages) - 1 == len(history) - len(refresh.messages)
+
+
+def test_instructions_count_against_the_budget():
+    history = _history(20)
+    plain = _build(history, budget=2000)
+    with_excerpts = _build(history, budget=2000, instructions="excerpt " * 600)
+
+    assert len(with_excerpts.messages) < len(plain.messages)
@@ -0,0 +1,37 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import files
+from app.core.auth import get_current_user
+
+
+def _client(monkeypatch, limit):
+    monkeypatch.setattr(files, "MAX_UPLOAD_BYTES", limit)
+    app = FastAPI()
+    app.include_router(files.router)
+
+    def never(*args, **kwargs):
+        raise AssertionError("endpoint ran for an oversized upload")
+
+    app.dependency_overrides[get_current_user] = never
+    return TestClient(app)
+
+
+def test_oversized_upload_is_refused_before_the_form_is_parsed(monkeypatch):
+    client = _client(monkeypatch, limit=1024)
+    body = b"x" * (1024 + files.MULTIPART_OVERHEAD_BYTES + 1)
+
+    declared = client.post("/projects/p/files", files={"file": ("a.txt", body)})
+
+    def chunked():
+        for i in range(0, len(body), 4096):
+            yield body[i:i + 4096]
+
+    streamed = client.post(
+        "/projects/p/files",
+        content=chunked(),
+        headers={"content-type": "multipart/form-data; boundary=b"},
+    )
+
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.services import llm_scheduler
+from app.services.llm_scheduler import FairScheduler, SchedulerRejected
+
+
+@pytest.fixture(autouse=True)
+def one_slot(monkeypatch):
+    monkeypatch.setattr(llm_scheduler.settings, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_scheduler.settings, "LLM_USER_RATE_PER_MINUTE", 0)
+    monkeypatch.setattr(llm_scheduler.settings, "LLM_USER_MAX_QUEUED", 10)
+    monkeypatch.setattr(llm_scheduler.settings, "LLM_QUEUE_TIMEOUT", 5.0)
+
+
+async def _turn(scheduler, user_id, order):
+    async with scheduler.slot(user_id):
+        order.append(user_id)
+        await asyncio.sleep(0)
+
+
+async def _queue(scheduler, users, order, before_release=None):
+    """Queue `users` in order behind a held slot, then release it and wait for all."""
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("holder"):
+            await release.wait()
+
+    holding = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    if before_release is not None:
+        await before_release()
+    turns = []
+    for user_id in users:
+        turns.append(asyncio.create_task(_turn(scheduler, user_id, order)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holding, *turns)
+
+
+def test_a_tenant_with_a_backlog_is_interleaved_with_others():
+    scheduler = FairScheduler()
+    order = []
+    asyncio.run(_queue(scheduler, ["a", "a", "a", "b"], order))
+    assert order == ["a", "b", "a", "a"]
+
+
+def test_a_timed_out_request_does_not_push_the_tenant_back(monkeypatch):
+    scheduler = FairScheduler()
+    order = []
+
+    async def time_out_one():
+        monkeypatch.setattr(llm_scheduler.settings, "LLM_QUEUE_TIMEOUT", 0.01)
+        with pytest.raises(SchedulerRejected):
+            async with scheduler.slot("a"):
+                pass
+        monkeypatch.setattr(llm_scheduler.settings, "LLM_QUEUE_TIMEOUT", 5.0)
+
+    asyncio.run(_queue(scheduler, ["a", "b"], order, before_release=time_out_one))
+    assert order == ["a", "b"]
+    assert scheduler.stats()["rejected"] == 1
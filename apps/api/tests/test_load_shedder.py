@@ -0,0 +1,73 @@
+import asyncio
+from collections import deque
+
+import pytest
+
+from app.services import load_shedder
+
+
+@pytest.fixture(autouse=True)
+def quiet_worker(monkeypatch):
+    monkeypatch.setattr(load_shedder, "_loop_lag", 0.0)
+    monkeypatch.setattr(load_shedder, "_streams_in_flight", 0)
+    monkeypatch.setattr(load_shedder, "_upstream", deque(maxlen=1000))
+    monkeypatch.setattr(load_shedder.settings, "LOAD_SHED_MAX_STREAMS", 10)
+    monkeypatch.setattr(load_shedder.settings, "LOAD_SHED_RAMP", 1.0)
+
+
+def test_streams_below_the_threshold_are_never_shed(monkeypatch):
+    monkeypatch.setattr(load_shedder, "_streams_in_flight", 9)
+    monkeypatch.setattr(load_shedder.random, "random", lambda: 0.0)
+    assert load_shedder.should_shed() is None
+
+
+def test_shedding_ramps_from_the_threshold_to_everything(monkeypatch):
+    monkeypatch.setattr(load_shedder, "_streams_in_flight", 15)  # halfway up the ramp
+    monkeypatch.setattr(load_shedder.random, "random", lambda: 0.49)
+    assert load_shedder.should_shed() == "streams_in_flight"
+    monkeypatch.setattr(load_shedder.random, "random", lambda: 0.51)
+    assert load_shedder.should_shed() is None
+
+    monkeypatch.setattr(load_shedder, "_streams_in_flight", 20)
+    monkeypatch.setattr(load_shedder.random, "random", lambda: 0.99)
+    assert load_shedder.should_shed() == "streams_in_flight"
+
+
+def test_upstream_errors_count_only_with_enough_samples(monkeypatch):
+    monkeypatch.setattr(load_shedder.settings, "LOAD_SHED_UPSTREAM_MIN_SAMPLES", 5)
+    for _ in range(4):
+        load_shedder.record_upstream(False, 0.1)
+    assert load_shedder.should_shed() is None
+    load_shedder.record_upstream(False, 0.1)
+    assert load_shedder.should_shed() == "upstream_errors"
+
+
+def _call(method, path, headers=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def run():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+        await load_shedder.LoadSheddingMiddleware(app)(scope, None, send)
+        return sent[0]
+
+    return asyncio.run(run())
+
+
+def test_overloaded_worker_refuses_new_chats_but_not_reads_or_resumes(monkeypatch):
+    monkeypatch.setattr(load_shedder.settings, "LOAD_SHED_ENABLED", True)
+    monkeypatch.setattr(load_shedder, "_streams_in_flight", 50)
+
+    refused = _call("POST", "/api/conversations/c1/chat")
+    assert refused["status"] == 503
+    assert (b"retry-after", str(load_shedder.settings.LOAD_SHED_RETRY_AFTER).encode()) in refused["headers"]
+
+    assert _call("GET", "/api/conversations/c1/messages")["status"] == 200
+    resumed = _call("POST", "/api/conversations/c1/chat", headers=[(b"last-event-id", b"g1:3")])
+    assert resumed["status"] == 200
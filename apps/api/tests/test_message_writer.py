@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services import message_writer
+
+
+class _FakeInsert:
+    """Records inserted rows; any batch containing a row marked bad fails."""
+
+    def __init__(self):
+        self.rows = []
+
+    async def __call__(self, rows):
+        if any(row.get("bad") for row in rows):
+            raise ValueError("bad row")
+        self.rows.extend(rows)
+
+
+@pytest.fixture
+def fake_insert(monkeypatch):
+    fake = _FakeInsert()
+    monkeypatch.setattr(message_writer, "_insert", fake)
+    return fake
+
+
+def test_one_bad_item_does_not_lose_its_neighbours(fake_insert):
+    async def run():
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(3)]
+        batch = [
+            ([{"id": 0}], futures[0]),
+            ([{"id": 1, "bad": True}], futures[1]),
+            ([{"id": 2}], futures[2]),
+            ([{"id": 3}], None),  # fire-and-forget item
+        ]
+        await message_writer._write_batch(batch)
+        return futures
+
+    futures = asyncio.run(run())
+    assert [row["id"] for row in fake_insert.rows] == [0, 2, 3]
+    assert futures[0].result() is None
+    assert isinstance(futures[1].exception(), ValueError)
+    assert futures[2].result() is None
+
+
+def test_single_failing_item_fails_only_its_future(fake_insert):
+    async def run():
+        future = asyncio.get_running_loop().create_future()
+        await message_writer._write_batch([([{"bad": True}], future)])
+        return future
+
+    assert isinstance(asyncio.run(run()).exception(), ValueError)
+
+
+def test_stop_writer_timeout_releases_ack_waiters(monkeypatch):
+    monkeypatch.setattr(message_writer.settings, "MESSAGE_WRITE_MODE", message_writer.ACK)
+    monkeypatch.setattr(message_writer.settings, "MESSAGE_WRITE_SHUTDOWN_TIMEOUT", 0.05)
+    monkeypatch.setattr(message_writer.settings, "MESSAGE_WRITE_BATCH_SIZE", 1)
+
+    async def hang(rows):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(message_writer, "_insert", hang)
+
+    async def run():
+        message_writer.start_writer()
+        waiters = [asyncio.create_task(message_writer.persist([{"id": i}])) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await message_writer.stop_writer()
+        return await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), timeout=1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,41 @@
+import asyncio
+
+from app.services import profiler
+
+
+def test_request_profile_is_finished_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(profiler.settings, "PROFILER_INTERVAL_MS", 5)
+    monkeypatch.setattr(profiler.settings, "PROFILER_MAX_SECONDS", 0.05)
+
+    async def is_admin(scope):
+        return True
+
+    monkeypatch.setattr(profiler, "_is_admin_request", is_admin)
+
+    seen = {}
+
+    async def long_stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(0.3)
+        # Still streaming, but the profile is over and the worker is free.
+        seen["active"] = profiler._active
+        seen["factory"] = asyncio.get_running_loop().get_task_factory()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def run():
+        middleware = profiler.ProfileRequestMiddleware(long_stream)
+        scope = {"type": "http", "method": "GET", "path": "/chat", "headers": [(b"x-profile", b"1")]}
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware(scope, None, send)
+        return sent
+
+    sent = asyncio.run(run())
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    assert seen == {"active": None, "factory": None}
+    session = profiler.find(profile_id)
+    assert session is not None and session.finished
+    assert [s.id for s in profiler.recent()].count(profile_id) == 1
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.services import retrieval
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_streamed_chunks_match_whole_text():
+    text = " ".join(f"Sentence {i} about item {i % 7}." + ("\n\n" if i % 5 == 0 else "") for i in range(400))
+    whole = retrieval.chunk_text(text, max_chars=200, overlap=40)
+    blocks = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(retrieval.iter_chunks(blocks, max_chars=200, overlap=40)) == whole
+
+
+def test_workers_sharing_an_index_see_each_others_writes(tmp_path):
+    embedder = retrieval.HashingEmbedder(256)
+    first = retrieval.LocalRetrievalBackend(embedder, str(tmp_path / "indexes"))
+    second = retrieval.LocalRetrievalBackend(embedder, str(tmp_path / "indexes"))
+
+    async def run():
+        # `second` opens the (still empty) index before `first` writes to it.
+        assert await second.search("p", "bananas", 3) == []
+        await first.index_file("p", "f1", _write(tmp_path / "a.txt", "Bananas are yellow and long."))
+        found = [hit.file_id for hit in await second.search("p", "bananas yellow long", 3)]
+        await first.remove_file("p", "f1")
+        removed = [hit.file_id for hit in await second.search("p", "bananas yellow long", 3)]
+        return found, removed
+
+    found, removed = asyncio.run(run())
+    assert found == ["f1"]
+    assert removed == []
+
+
+def test_re_adding_a_removed_file_serves_only_its_new_rows(tmp_path):
+    backend = retrieval.LocalRetrievalBackend(retrieval.HashingEmbedder(256), str(tmp_path / "indexes"))
+
+    async def run():
+        await backend.index_file("p", "f1", _write(tmp_path / "old.txt", "Bananas are yellow and long."))
+        await backend.remove_file("p", "f1")
+        await backend.index_file("p", "f1", _write(tmp_path / "new.txt", "Cherries are red and round."))
+        return await backend.search("p", "bananas cherries", 5)
+
+    hits = asyncio.run(run())
+    assert [hit.text for hit in hits] == ["Cherries are red and round."]
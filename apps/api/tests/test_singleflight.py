@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import Group
+
+
+def test_concurrent_callers_share_one_execution():
+    group = Group()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        results = await asyncio.gather(*(group.do("k", fetch) for _ in range(5)))
+        # Nothing is remembered afterwards: the next call runs again.
+        again = await group.do("k", fetch)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert results == ["value"] * 5
+    assert again == "value"
+    assert len(calls) == 2
+
+
+def test_followers_see_the_leaders_exception():
+    group = Group()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def run():
+        return await asyncio.gather(group.do("k", fail), group.do("k", fail), return_exceptions=True)
+
+    outcomes = asyncio.run(run())
+    assert [type(o) for o in outcomes] == [ValueError, ValueError]
+
+
+def test_a_follower_takes_over_when_the_leader_is_cancelled():
+    group = Group()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def run():
+        leader = asyncio.create_task(group.do("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.do("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == 2
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from app.services.stream_events import DONE, QUEUED, TOKEN, StreamEvent, coalesce_tokens, encode_sse
+
+
+def _frame_payload(frame):
+    data = [line for line in frame.split("\n") if line.startswith("data: ")]
+    return json.loads(data[0][len("data: "):])
+
+
+def test_events_encode_only_the_fields_they_carry():
+    assert _frame_payload(encode_sse(StreamEvent(TOKEN, content="héllo"))) == {"type": "token", "content": "héllo"}
+    assert _frame_payload(encode_sse(StreamEvent(QUEUED, position=3))) == {"type": "queued", "position": 3}
+
+    frame = encode_sse(StreamEvent(DONE, content=""), event_id="g1:7")
+    assert frame.startswith("id: g1:7\ndata: ")
+    assert frame.endswith("\n\n")
+    assert _frame_payload(frame) == {"type": "done", "content": ""}
+
+
+def _coalesce(script, **policy):
+    """Run `script` (events, or float pauses in seconds) through coalesce_tokens."""
+
+    async def upstream():
+        for item in script:
+            if isinstance(item, float):
+                await asyncio.sleep(item)
+            else:
+                yield item
+
+    async def run():
+        return [(e.type, e.content) async for e in coalesce_tokens(upstream(), **policy)]
+
+    return asyncio.run(run())
+
+
+def test_tokens_are_merged_up_to_the_character_limit():
+    tokens = [StreamEvent(TOKEN, content=c) for c in "abcdefg"]
+    frames = _coalesce(tokens + [StreamEvent(DONE, content="abcdefg")], flush_ms=10_000, flush_chars=3)
+
+    # First token straight through; then 3-char frames; the rest flushed before done.
+    assert frames == [
+        (TOKEN, "a"),
+        (TOKEN, "bcd"),
+        (TOKEN, "efg"),
+        (DONE, "abcdefg"),
+    ]
+
+
+def test_buffered_tokens_are_flushed_while_upstream_is_silent():
+    script = [
+        StreamEvent(TOKEN, content="a"),
+        StreamEvent(TOKEN, content="b"),
+        0.2,
+        StreamEvent(TOKEN, content="c"),
+        StreamEvent(DONE, content="abc"),
+    ]
+    frames = _coalesce(script, flush_ms=20, flush_chars=1000)
+    assert frames == [(TOKEN, "a"), (TOKEN, "b"), (TOKEN, "c"), (DONE, "abc")]
@@ -0,0 +1,73 @@
+import asyncio
+from collections import deque
+
+import pytest
+
+from app.services import tracing
+
+PARENT_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture(autouse=True)
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(tracing, "_buffer", deque(maxlen=3))
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing.settings, "TRACE_OTLP_ENDPOINT", None)
+
+
+def _request(path="/api/things", headers=(), work=None):
+    """Run one request through TracingMiddleware; returns the X-Trace-Id it sent, if any."""
+
+    async def app(scope, receive, send):
+        with tracing.span("handler"):
+            if work is not None:
+                await work()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def run():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+        await tracing.TracingMiddleware(app)(scope, None, send)
+        return dict(sent[0]["headers"]).get(b"x-trace-id", b"").decode() or None
+
+    return asyncio.run(run())
+
+
+def test_ring_buffer_keeps_only_the_newest_traces():
+    ids = [_request() for _ in range(5)]
+    assert [t.trace_id for t in tracing.recent(10)] == ids[:1:-1]
+    assert tracing.find(ids[0]) is None
+    assert [s.name for s in tracing.find(ids[-1]).spans] == ["GET /api/things", "handler"]
+
+
+def test_unsampled_requests_leave_no_trace(monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 0.0)
+    assert _request() is None
+    unsampled_parent = (b"traceparent", f"00-{PARENT_TRACE_ID}-00f067aa0ba902b7-00".encode())
+    assert _request(headers=[unsampled_parent]) is None
+    assert tracing.recent(10) == []
+
+
+def test_a_sampled_parent_is_followed_even_at_rate_zero(monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 0.0)
+    parent = (b"traceparent", f"00-{PARENT_TRACE_ID}-00f067aa0ba902b7-01".encode())
+    assert _request(headers=[parent]) == PARENT_TRACE_ID
+    assert tracing.find(PARENT_TRACE_ID).remote_parent_id == "00f067aa0ba902b7"
+
+
+def test_spans_past_the_cap_are_counted_not_kept(monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_MAX_SPANS", 3)
+
+    async def chatty():
+        for _ in range(5):
+            with tracing.span("query"):
+                pass
+
+    trace = tracing.find(_request(work=chatty))
+    assert len(trace.spans) == 3
+    assert trace.dropped_spans == 4  # root + handler + 5 queries, 3 kept
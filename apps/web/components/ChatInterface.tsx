@@ -5,7 +5,11 @@ import { useApiClient } from '@/lib/api-client'
 import type { Message } from '@/types'
 
 type SsePayload =
+  | { type: 'start' }
+  | { type: 'queued'; position: number }
   | { type: 'token'; content: string }
+  | { type: 'refusal'; content: string }
+  | { type: 'reset'; content: string }
   | { type: 'done'; content: string }
   | { type: 'error'; message: string }
 
@@ -21,6 +25,59 @@ function isSsePayload(x: unknown): x is SsePayload {
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api'
 
+// Reattach attempts after the connection drops mid-answer (the server keeps
+// generating and replays what was missed from the last event id).
+const MAX_RESUMES = 3
+
+// Reads SSE frames, handing each payload and its event id (if any) to onEvent.
+// Resolves true if the stream finished (done/error), false if it was cut off.
+async function readSse(
+  response: Response,
+  onEvent: (payload: SsePayload, id: string | null) => void
+): Promise<boolean> {
+  const reader = response.body!.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  try {
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) return false
+
+      buffer += decoder.decode(value, { stream: true })
+
+      // SSE events are separated by blank line "\n\n"
+      const events = buffer.split('\n\n')
+      buffer = events.pop() || ''
+
+      for (const evt of events) {
+        let id: string | null = null
+        let data = ''
+        for (const line of evt.split('\n')) {
+          if (line.startsWith('id:')) id = line.slice(3).trim()
+          else if (line.startsWith('data:')) data += line.slice(5).trim()
+        }
+        if (!data) continue
+
+        let parsed: unknown
+        try {
+          parsed = JSON.parse(data)
+        } catch {
+          continue
+        }
+        if (!isSsePayload(parsed)) continue
+
+        onEvent(parsed, id)
+        if (parsed.type === 'done' || parsed.type === 'error') return true
+      }
+    }
+  } catch (err: any) {
+    if (err?.name === 'AbortError') throw err
+    // Network drop: let the caller resume from the last event id.
+    return false
+  }
+}
+
 export default function ChatInterface({
   projectId,
   initialConversationId,
@@ -28,12 +85,15 @@ export default function ChatInterface({
   projectId: string
   initialConversationId?: string | null
 }) {
-  const { fetchApi, getToken } = useApiClient()
+  const { fetchApi, fetchPage, getToken } = useApiClient()
 
   const [conversationId, setConversationId] = useState<string | null>(
     initialConversationId ?? null
   )
   const [messages, setMessages] = useState<Message[]>([])
+  // Cursor for the page of messages before the oldest one shown, if any.
+  const [olderCursor, setOlderCursor] = useState<string | null>(null)
+  const [loadingOlder, setLoadingOlder] = useState(false)
   const [input, setInput] = useState('')
   const [streaming, setStreaming] = useState(false)
   const [streamingMessage, setStreamingMessage] = useState('')
@@ -49,15 +109,39 @@ export default function ChatInterface({
   // Prevent state updates after unmount
   const mountedRef = useRef(true)
 
+  // Prepending older messages shouldn't scroll the view to the bottom.
+  const skipNextScrollRef = useRef(false)
+
   const canSend = useMemo(
     () => !streaming && input.trim().length > 0,
     [streaming, input]
   )
 
+  // Latest page of messages (oldest first within the page).
   async function loadMessages(convId: string) {
-    const msgs = await fetchApi(`/conversations/${convId}/messages`)
+    const page = await fetchPage<Message>(`/conversations/${convId}/messages`)
     if (!mountedRef.current) return
-    setMessages(msgs as Message[])
+    setMessages(page.items)
+    setOlderCursor(page.nextCursor)
+  }
+
+  async function loadOlderMessages() {
+    if (!conversationId || !olderCursor || loadingOlder) return
+    setLoadingOlder(true)
+    try {
+      const page = await fetchPage<Message>(
+        `/conversations/${conversationId}/messages`,
+        olderCursor
+      )
+      if (!mountedRef.current) return
+      skipNextScrollRef.current = true
+      setMessages((prev) => [...page.items, ...prev])
+      setOlderCursor(page.nextCursor)
+    } catch (err: any) {
+      if (mountedRef.current) setUiError(err?.message || 'Failed to load messages')
+    } finally {
+      if (mountedRef.current) setLoadingOlder(false)
+    }
   }
 
   function appendOptimisticUserMessage(convId: string, text: string) {
@@ -110,67 +194,54 @@ export default function ChatInterface({
     const abortController = new AbortController()
 
     try {
-      const token = await getToken()
-
-      const response = await fetch(`${API_URL}/conversations/${convId}/chat`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          ...(token ? { Authorization: `Bearer ${token}` } : {}),
-        },
-        body: JSON.stringify({ message: userText }),
-        signal: abortController.signal,
-      })
-
-      if (!response.ok || !response.body) {
-        const text = await response.text().catch(() => '')
-        throw new Error(text || `Stream failed (HTTP ${response.status})`)
+      let full = ''
+      // Written from onEvent; declared this way so TS doesn't narrow them to null.
+      let lastEventId = null as string | null
+      let streamError = null as string | null
+
+      const onEvent = (payload: SsePayload, id: string | null) => {
+        if (id) lastEventId = id
+        if (payload.type === 'token') {
+          full += payload.content ?? ''
+        } else if (payload.type === 'reset' || payload.type === 'done') {
+          // reset: the replay buffer moved past our position; this is the full text so far
+          full = payload.content ?? full
+        } else if (payload.type === 'error') {
+          streamError = payload.message || 'Streaming error'
+          return
+        } else {
+          return
+        }
+        if (mountedRef.current) setStreamingMessage(full)
       }
 
-      const reader = response.body.getReader()
-      const decoder = new TextDecoder()
-
-      let buffer = ''
-      let full = ''
+      for (let attempt = 0; ; attempt++) {
+        const token = await getToken()
+        const auth = token ? { Authorization: `Bearer ${token}` } : {}
+        const response =
+          attempt === 0
+            ? await fetch(`${API_URL}/conversations/${convId}/chat`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', ...auth },
+                body: JSON.stringify({ message: userText }),
+                signal: abortController.signal,
+              })
+            : await fetch(`${API_URL}/conversations/${convId}/chat/resume`, {
+                headers: { ...auth, 'Last-Event-ID': lastEventId ?? '' },
+                signal: abortController.signal,
+              })
+
+        if (!response.ok || !response.body) {
+          const text = await response.text().catch(() => '')
+          throw new Error(text || `Stream failed (HTTP ${response.status})`)
+        }
 
-      while (true) {
-        const { done, value } = await reader.read()
-        if (done) break
-
-        buffer += decoder.decode(value, { stream: true })
-
-        // SSE events are separated by blank line "\n\n"
-        const events = buffer.split('\n\n')
-        buffer = events.pop() || ''
-
-        for (const evt of events) {
-          // Each event can have multiple lines; we only care about "data:"
-          const lines = evt.split('\n')
-          for (const line of lines) {
-            if (!line.startsWith('data:')) continue
-
-            const jsonText = line.slice(5).trim()
-            if (!jsonText) continue
-
-            let parsed: unknown
-            try {
-              parsed = JSON.parse(jsonText)
-            } catch {
-              continue
-            }
-
-            if (!isSsePayload(parsed)) continue
-
-            if (parsed.type === 'token') {
-              full += parsed.content ?? ''
-              if (mountedRef.current) setStreamingMessage(full)
-            } else if (parsed.type === 'done') {
-              full = parsed.content ?? full
-              if (mountedRef.current) setStreamingMessage(full)
-            } else if (parsed.type === 'error') {
-              throw new Error(parsed.message || 'Streaming error')
-            }
-          }
+        const finished = await readSse(response, onEvent)
+        if (streamError) throw new Error(streamError)
+        if (finished) break
+        // Cut off mid-answer: reattach if we know where we were.
+        if (!lastEventId || attempt >= MAX_RESUMES) {
+          throw new Error('Connection lost before the answer finished')
         }
       }
 
@@ -192,6 +263,10 @@ export default function ChatInterface({
 
   // Auto-scroll
   useEffect(() => {
+    if (skipNextScrollRef.current) {
+      skipNextScrollRef.current = false
+      return
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [messages, streamingMessage])
 
@@ -245,6 +320,19 @@ export default function ChatInterface({
           </div>
         )}
 
+        {olderCursor && (
+          <div className="flex justify-center">
+            <button
+              type="button"
+              onClick={loadOlderMessages}
+              disabled={loadingOlder}
+              className="text-xs px-3 py-1 rounded-lg border border-zinc-800 text-zinc-300 hover:bg-zinc-900 disabled:opacity-50"
+            >
+              {loadingOlder ? 'Loading…' : 'Load earlier messages'}
+            </button>
+          </div>
+        )}
+
         {uiError && (
           <div className="rounded-xl border border-red-900/60 bg-red-950/30 px-4 py-3 text-sm text-red-200">
             {uiError}
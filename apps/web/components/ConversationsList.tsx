@@ -1,5 +1,6 @@
 'use client'
 
+import { useState } from 'react'
 import { Conversation } from '@/types'
 
 export default function ConversationsList({
@@ -7,12 +8,27 @@ export default function ConversationsList({
   selectedConversationId,
   onSelectConversation,
   onNewConversation,
+  onLoadMore,
 }: {
   initialConversations: Conversation[]
   selectedConversationId?: string | null
   onSelectConversation?: (conversationId: string) => void
   onNewConversation?: () => void
+  // Present while older conversations remain on the server.
+  onLoadMore?: () => Promise<void>
 }) {
+  const [loadingMore, setLoadingMore] = useState(false)
+
+  async function loadMore() {
+    if (!onLoadMore || loadingMore) return
+    setLoadingMore(true)
+    try {
+      await onLoadMore()
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   return (
     <div className="rounded-2xl border border-zinc-800 bg-zinc-950 p-4">
       <div className="flex items-center justify-between mb-3">
@@ -53,6 +69,17 @@ export default function ConversationsList({
             </button>
           )
         })}
+
+        {onLoadMore && (
+          <button
+            type="button"
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="w-full text-xs px-3 py-2 rounded-lg border border-zinc-800 text-zinc-300 hover:bg-zinc-900 disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading…' : 'Load older conversations'}
+          </button>
+        )}
       </div>
     </div>
   )
@@ -8,10 +8,11 @@ import ProjectShell from '@/components/ProjectShell'
 import type { Project, Conversation, Prompt } from '@/types'
 
 export default function ProjectClientPage({ projectId }: { projectId: string }) {
-  const { fetchApi } = useApiClient()
+  const { fetchApi, fetchPage } = useApiClient()
 
   const [project, setProject] = useState<Project | null>(null)
   const [conversations, setConversations] = useState<Conversation[]>([])
+  const [conversationsCursor, setConversationsCursor] = useState<string | null>(null)
   const [prompts, setPrompts] = useState<Prompt[]>([])
   const [error, setError] = useState<string | null>(null)
   const [loading, setLoading] = useState(true)
@@ -22,12 +23,13 @@ export default function ProjectClientPage({ projectId }: { projectId: string })
     try {
       const [p, c, pr] = await Promise.all([
         fetchApi(`/projects/${projectId}`),
-        fetchApi(`/projects/${projectId}/conversations`),
+        fetchPage<Conversation>(`/projects/${projectId}/conversations`),
         fetchApi(`/projects/${projectId}/prompts`),
       ])
 
       setProject(p as Project)
-      setConversations(c as Conversation[])
+      setConversations(c.items)
+      setConversationsCursor(c.nextCursor)
       setPrompts(pr as Prompt[])
     } catch (e) {
       setError((e as Error).message)
@@ -36,6 +38,17 @@ export default function ProjectClientPage({ projectId }: { projectId: string })
     }
   }
 
+  // Older conversations, one page at a time (the API returns newest first).
+  async function loadMoreConversations() {
+    if (!conversationsCursor) return
+    const page = await fetchPage<Conversation>(
+      `/projects/${projectId}/conversations`,
+      conversationsCursor
+    )
+    setConversations((prev) => [...prev, ...page.items])
+    setConversationsCursor(page.nextCursor)
+  }
+
   useEffect(() => {
     load()
   }, [projectId])
@@ -78,6 +91,9 @@ export default function ProjectClientPage({ projectId }: { projectId: string })
               projectId={projectId}
               conversations={conversations}
               prompts={prompts}
+              onLoadMoreConversations={
+                conversationsCursor ? loadMoreConversations : undefined
+              }
             />
           </>
         )}
@@ -11,10 +11,12 @@ export default function ProjectShell({
   projectId,
   conversations,
   prompts,
+  onLoadMoreConversations,
 }: {
   projectId: string
   conversations: Conversation[]
   prompts: Prompt[]
+  onLoadMoreConversations?: () => Promise<void>
 }) {
   const [selectedConversationId, setSelectedConversationId] = useState<string | null>(
     conversations[0]?.id ?? null
@@ -31,6 +33,7 @@ export default function ProjectShell({
           initialConversations={conversations}
           selectedConversationId={selectedConversationId}
           onSelectConversation={setSelectedConversationId}
+          onLoadMore={onLoadMoreConversations}
           onNewConversation={() => {
             // Let ChatInterface create a new conversation on next send
             setSelectedConversationId(null)
@@ -4,6 +4,9 @@ import { useAuth } from '@clerk/nextjs'
 import { useCallback, useMemo, useRef } from 'react'
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api'
+// Keyset pagination: list endpoints return a page and, if there is more, the
+// cursor for the next page in this header.
+const NEXT_CURSOR_HEADER = 'X-Next-Cursor'
 const TOKEN_RETRY_DELAY_MS = 200
 const TOKEN_RETRY_ATTEMPTS = 3
 
@@ -37,6 +40,11 @@ function errorMessageFromPayload(payload: unknown, fallback: string) {
   return fallback
 }
 
+export type Page<T> = {
+  items: T[]
+  nextCursor: string | null
+}
+
 export function useApiClient() {
   const { getToken, isLoaded, isSignedIn } = useAuth()
   const inFlightTokenRef = useRef<Promise<string | null> | null>(null)
@@ -66,7 +74,7 @@ export function useApiClient() {
     }
   }, [getToken, isLoaded, isSignedIn])
 
-  const fetchApi = useCallback(
+  const send = useCallback(
     async (endpoint: string, options: RequestInit = {}) => {
       const token = await getAuthToken()
 
@@ -98,18 +106,40 @@ export function useApiClient() {
         throw new Error(message)
       }
 
-      return parseResponse(response)
+      return response
     },
     [getAuthToken]
   )
 
+  const fetchApi = useCallback(
+    async (endpoint: string, options: RequestInit = {}) =>
+      parseResponse(await send(endpoint, options)),
+    [send]
+  )
+
+  // One page of a list endpoint; pass the previous page's nextCursor to continue.
+  const fetchPage = useCallback(
+    async <T>(endpoint: string, cursor?: string | null): Promise<Page<T>> => {
+      const url = cursor
+        ? `${endpoint}${endpoint.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`
+        : endpoint
+      const response = await send(url)
+      return {
+        items: ((await parseResponse(response)) ?? []) as T[],
+        nextCursor: response.headers.get(NEXT_CURSOR_HEADER),
+      }
+    },
+    [send]
+  )
+
   return useMemo(
     () => ({
       fetchApi,
+      fetchPage,
       getToken: getAuthToken,
       isLoaded,
       isSignedIn,
     }),
-    [fetchApi, getAuthToken, isLoaded, isSignedIn]
+    [fetchApi, fetchPage, getAuthToken, isLoaded, isSignedIn]
   )
 }
@@ -3,6 +3,8 @@ export interface Project {
     user_id: string
     name: string
     vector_store_id?: string | null
+    context_token_budget?: number | null
+    response_cache_enabled?: boolean
     created_at: string
     updated_at: string
   }